@@ -4,17 +4,30 @@ Sistema para registro de asistencia de alumnos de escuela media superior
 Usa WebAuthn API para leer huellas desde dispositivos móviles
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from webauthn_handler import WebAuthnHandler, WebAuthnDatabase
+from checkin_index import CheckinIndex
+from challenge_store import ChallengeStore, SQLiteChallengeStore
 import base64
+import csv
+import gzip
+import io
 import os
 import json
+import math
+import atexit
+import threading
+import time
+import unicodedata
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-import tempfile
+from typing import Optional
+from urllib.parse import quote
+from attendance_log import asistencia_dict, fin_de_fecha, inicio_de_fecha, instante_de
+from excel_stream import MIMETYPE_XLSX, hoja_asistencias, stream_xlsx
+from export_cache import ExportCache, clave_exportacion
+from export_jobs import ExportJobs, ExportQueueFull
+from roll_call import RollCallSessions, SesionesLlenas
 
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para React
@@ -22,48 +35,428 @@ CORS(app)  # Permitir CORS para React
 # Configuración
 DB_FILE = "alumnos.json"
 GRUPOS_FILE = "grupos.json"
+JOURNAL_FILE = "alumnos.json.journal"  # Bitácora append-only de asistencias
+JOURNAL_COMPACT_EVERY = 500  # Asistencias en bitácora antes de reescribir el snapshot
+# Motor de almacenamiento: "json" (alumnos.json + grupos.json) o "sqlite".
+# Para migrar una instalación existente: python sqlite_storage.py asistencia.db alumnos.json grupos.json
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+SQLITE_FILE = "asistencia.db"
+# Escritura diferida: los cambios se agrupan y se escriben en segundo plano como máximo
+# cada FLUSH_INTERVAL_MS milisegundos o al juntar FLUSH_MAX_MUTATIONS cambios (0 = inmediata).
+# Una petición puede esperar a que su cambio esté en disco enviando "durable": true (o ?durable=1).
+FLUSH_INTERVAL_MS = 200
+FLUSH_MAX_MUTATIONS = 50
+GRUPOS_CHECK_INTERVAL = 2.0  # Segundos entre comprobaciones de cambios externos en grupos.json
+# Caché en disco de los Excel exportados, por grupo y generación de sus datos
+# (las generaciones cambian al reiniciar, así que el directorio se vacía al iniciar)
+EXPORT_CACHE_DIR = "exportaciones_cache"
+EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Exportaciones en segundo plano (POST /api/exportaciones): una hoja por grupo generada en
+# un pool de procesos; el archivo se conserva EXPORT_JOBS_TTL segundos para descargarlo
+EXPORT_JOBS_DIR = "exportaciones_trabajos"
+EXPORT_PROCESOS = None  # None = un proceso por núcleo
+EXPORT_JOBS_TTL = 3600
+EXPORT_MAX_PENDIENTES = 4  # Exportaciones sin terminar admitidas a la vez (después, 503)
+# Paginación por cursor (?limite=&cursor=) de listas de alumnos e historiales de asistencia
+MAX_LIMITE_PAGINA = 1000
+# Respuestas JSON de más de GZIP_MIN_BYTES se comprimen si el cliente acepta gzip
+GZIP_MIN_BYTES = 1024
+GZIP_NIVEL = 6
+# Verificación por lotes (POST /api/asistencia/verificar/lote)
+MAX_LOTE_VERIFICACIONES = 500
+MAX_ADELANTO_RELOJ = 300  # Segundos que la hora del cliente puede ir adelantada
+MAX_ATRASO_LOTE_DIAS = 30  # Antigüedad máxima (en días) de una huella encolada sin conexión
+# Toques repetidos del mismo alumno: "ninguna", "diaria" (una asistencia por día),
+# "periodo" (una por periodo de clase de PERIODOS_CLASE) o "intervalo" (una cada
+# DEDUPE_INTERVALO segundos). Un toque repetido no escribe nada en disco.
+# La política también se aplica a las asistencias manuales del profesor; con
+# "ninguna" (por defecto) toda asistencia se registra.
+DEDUPE_POLITICA = "ninguna"
+PERIODOS_CLASE = [("07:00", "07:50"), ("07:50", "08:40"), ("08:40", "09:30"), ("10:00", "10:50"),
+                  ("10:50", "11:40"), ("11:40", "12:30"), ("12:30", "13:20")]
+DEDUPE_INTERVALO = 600
+# Tipos que acepta el registro manual de asistencia (POST /api/alumnos/<id>/asistencias)
+TIPOS_ASISTENCIA = ("manual", "huella", "webauthn")
+# Challenges WebAuthn: de un solo uso y válidos CHALLENGE_TTL segundos. Con varios procesos
+# del servidor usar CHALLENGE_BACKEND=sqlite para compartirlos en CHALLENGES_FILE.
+# Con EXIGIR_CHALLENGE (por defecto) los registros y verificaciones sin client_data_json
+# se rechazan. EXIGIR_CHALLENGE=0 en el entorno solo sirve para migrar: deja pasar a los
+# clientes antiguos que aún no lo envían y debe retirarse en cuanto se actualicen.
+CHALLENGE_BACKEND = os.environ.get("CHALLENGE_BACKEND", "memoria")
+CHALLENGES_FILE = "challenges.db"
+CHALLENGE_TTL = 120
+MAX_CHALLENGES = 20000
+EXIGIR_CHALLENGE = os.environ.get("EXIGIR_CHALLENGE", "1") != "0"
+# Sesiones de pase de lista (POST /api/sesiones): se descartan tras SESION_TTL segundos sin actividad
+# o SESION_DURACION_MAX desde que se abrieron; con MAX_SESIONES abiertas, abrir otra responde 503.
+# Sus challenges se emiten en el mismo almacén que los demás (límite MAX_CHALLENGES)
+SESION_TTL = 3 * 3600
+SESION_DURACION_MAX = 12 * 3600
+MAX_SESIONES = 50
+MAX_CHALLENGES_SESION = 200
 
-# Instancia global del manejador WebAuthn
+# Instancia global del manejador WebAuthn y de la base de datos (una sola copia compartida)
 webauthn_handler = None
 webauthn_db = None
+export_cache = None
+export_jobs = None
+sesiones = None
+_instancias_lock = threading.Lock()
+
+# Catálogo de grupos en memoria (solo motor JSON)
+_grupos_cache = None
+_grupos_firma = None  # (mtime_ns, tamaño) de grupos.json cuando se cargó el catálogo
+_grupos_verificado = 0.0  # Última comprobación de la firma (time.monotonic)
+_grupos_version = 0  # Cambia cada vez que se reemplaza el catálogo en memoria
+_grupos_lock = threading.Lock()
 
 
 def get_webauthn_handler():
-    """Obtiene o crea la instancia del manejador WebAuthn"""
+    """Obtiene o crea la instancia del manejador WebAuthn (usa la base de datos compartida)"""
     global webauthn_handler
     if webauthn_handler is None:
-        webauthn_handler = WebAuthnHandler(db_file=DB_FILE)
+        db = get_webauthn_db()
+        with _instancias_lock:
+            if webauthn_handler is None:
+                if CHALLENGE_BACKEND == "sqlite":
+                    challenges = SQLiteChallengeStore(CHALLENGES_FILE, CHALLENGE_TTL, MAX_CHALLENGES)
+                    atexit.register(challenges.close)
+                else:
+                    challenges = ChallengeStore(CHALLENGE_TTL, MAX_CHALLENGES)
+                webauthn_handler = WebAuthnHandler(db=db, challenges=challenges)
     return webauthn_handler
 
 
 def get_webauthn_db():
-    """Obtiene o crea la instancia de la base de datos"""
+    """Obtiene o crea la instancia compartida de la base de datos"""
     global webauthn_db
     if webauthn_db is None:
-        webauthn_db = WebAuthnDatabase(db_file=DB_FILE)
+        with _instancias_lock:
+            if webauthn_db is None:
+                if STORAGE_BACKEND == "sqlite":
+                    from sqlite_storage import SQLiteWebAuthnDatabase
+                    webauthn_db = SQLiteWebAuthnDatabase(db_file=SQLITE_FILE, dedupe=crear_dedupe())
+                else:
+                    webauthn_db = WebAuthnDatabase(
+                        db_file=DB_FILE,
+                        journal_file=JOURNAL_FILE,
+                        compact_every=JOURNAL_COMPACT_EVERY,
+                        flush_interval_ms=FLUSH_INTERVAL_MS,
+                        flush_max_mutations=FLUSH_MAX_MUTATIONS,
+                        dedupe=crear_dedupe()
+                    )
+                # Escribir lo pendiente al detener el servidor (solo quien la crea)
+                atexit.register(webauthn_db.close)
+    return webauthn_db
+    with _instancias_lock:
+        if webauthn_db is not None:
+            # Otro hilo la creó mientras se esperaba el candado
+            return webauthn_db
+        if STORAGE_BACKEND == "sqlite":
+            from sqlite_storage import SQLiteWebAuthnDatabase
+            webauthn_db = SQLiteWebAuthnDatabase(db_file=SQLITE_FILE, dedupe=crear_dedupe())
+        else:
+            webauthn_db = WebAuthnDatabase(
+                db_file=DB_FILE,
+                journal_file=JOURNAL_FILE,
+                compact_every=JOURNAL_COMPACT_EVERY,
+                flush_interval_ms=FLUSH_INTERVAL_MS,
+                flush_max_mutations=FLUSH_MAX_MUTATIONS,
+                dedupe=crear_dedupe()
+            )
+        # Escribir lo pendiente al detener el servidor (una sola vez, al crearla)
+        atexit.register(webauthn_db.close)
     return webauthn_db
 
 
-def load_grupos():
-    """Carga los grupos desde el archivo"""
-    if os.path.exists(GRUPOS_FILE):
+def crear_dedupe():
+    """Crea el índice de deduplicación de asistencias según la configuración"""
+    return CheckinIndex(DEDUPE_POLITICA, PERIODOS_CLASE, DEDUPE_INTERVALO)
+
+
+def get_export_cache():
+    """Obtiene o crea la caché de archivos exportados"""
+    global export_cache
+    if export_cache is None:
+        with _instancias_lock:
+            if export_cache is None:
+                export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES)
+    return export_cache
+
+
+def get_export_jobs():
+    """Obtiene o crea el registro de trabajos de exportación"""
+    global export_jobs
+    if export_jobs is None:
+        with _instancias_lock:
+            if export_jobs is None:
+                export_jobs = ExportJobs(EXPORT_JOBS_DIR, EXPORT_PROCESOS, EXPORT_JOBS_TTL, EXPORT_MAX_PENDIENTES)
+                atexit.register(export_jobs.close)
+    return export_jobs
+
+
+def get_sesiones():
+    """Obtiene o crea el registro de sesiones de pase de lista"""
+    global sesiones
+    if sesiones is None:
+        handler = get_webauthn_handler()
+        with _instancias_lock:
+            if sesiones is None:
+                sesiones = RollCallSessions(SESION_TTL, MAX_CHALLENGES_SESION, handler.challenges,
+                                            MAX_SESIONES, SESION_DURACION_MAX)
+    return sesiones
+
+
+def esperar_durable():
+    """Indica si la petición pidió esperar a que su cambio esté escrito en disco"""
+    if request.args.get('durable', '').lower() in ('1', 'true'):
+        return True
+    data = request.get_json(silent=True) or {}
+    return data.get('durable') is True
+
+
+def confirmar_durable(db):
+    """
+    Espera a que los cambios estén en disco si la petición lo pidió
+    
+    Se llama después de soltar el candado de escritura, para no bloquear
+    al hilo escritor mientras se espera.
+    """
+    if esperar_durable():
+        db.flush()
+
+
+def validar_challenge(data, contexto: str):
+    """
+    Consume el challenge firmado por el navegador (dentro de client_data_json)
+    
+    Returns:
+        None si es válido (o si no se envió y no se exige); si no, la respuesta de error
+    """
+    client_data_json = data.get('client_data_json')
+    if not client_data_json:
+        if EXIGIR_CHALLENGE:
+            return jsonify({'error': 'Se requiere client_data_json con el challenge'}), 400
+        return None
+    handler = get_webauthn_handler()
+    challenge = handler.challenge_de_client_data(client_data_json)
+    if not handler.verify_challenge(challenge, contexto):
+        return jsonify({'error': 'Challenge inválido, expirado o ya usado. Intenta de nuevo.'}), 400
+    return None
+
+
+def filtros_rango():
+    """
+    Lee los filtros de rango de fechas de la petición
+    
+    desde / hasta: fechas YYYY-MM-DD (ambas incluidas)
+    since: instante ISO o epoch; solo asistencias con hora del evento posterior.
+        Compara contra la hora en que ocurrió la asistencia (la del cliente en
+        los lotes sin conexión), no contra cuándo llegó al servidor: un lote
+        sincronizado tarde con horas anteriores a `since` no aparece en una
+        consulta incremental. Para ponerse al día sin perder registros hay que
+        consultar desde/hasta cubriendo el periodo sin conexión.
+    
+    Returns:
+        (desde, hasta, despues_de) en segundos epoch; None si no se indicó
+        
+    Raises:
+        ValueError: si algún filtro no tiene un formato válido
+    """
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    since = request.args.get('since')
+    return (
+        inicio_de_fecha(desde) if desde else None,
+        # Excluir desde el inicio del día siguiente para incluir todo `hasta`
+        fin_de_fecha(hasta) if hasta else None,
+        instante_de(since) if since else None
+    )
+
+
+# Tipos de los elementos del cursor de cada lista paginada
+CURSOR_ROSTER = (str, str)  # (NOMBRE, user_id)
+CURSOR_ASISTENCIAS = ((int, float), int)  # (ts, asistencias entregadas con ese ts)
+
+
+def leer_paginacion(tipos: tuple):
+    """
+    Lee los parámetros de paginación de la petición
+    
+    limite: máximo de elementos por página (sin límite si no se indica)
+    cursor: valor `siguiente` devuelto por la página anterior
+    
+    Args:
+        tipos: Tipos de los elementos del cursor del endpoint (CURSOR_ROSTER, ...)
+    
+    Returns:
+        (limite, cursor) ya decodificados; None si no se indicó
+        
+    Raises:
+        ValueError: si el límite o el cursor no son válidos
+    """
+    limite = request.args.get('limite')
+    cursor = request.args.get('cursor')
+    if limite is not None:
+        limite = int(limite)
+        if limite < 1 or limite > MAX_LIMITE_PAGINA:
+            raise ValueError(f"limite debe estar entre 1 y {MAX_LIMITE_PAGINA}")
+    if cursor:
         try:
-            with open(GRUPOS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+            cursor = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except Exception:
+            raise ValueError("cursor inválido")
+        if (not isinstance(cursor, list) or len(cursor) != len(tipos)
+                or not all(_valor_de_cursor(valor, tipo) for valor, tipo in zip(cursor, tipos))):
+            raise ValueError("cursor inválido")
+    return limite, cursor or None
 
 
-def save_grupos(grupos):
-    """Guarda los grupos en el archivo"""
+def _valor_de_cursor(valor, tipo) -> bool:
+    """Indica si un elemento decodificado del cursor es del tipo esperado"""
+    # En JSON true/false se decodifican como bool, que también es int
+    if isinstance(valor, bool) or not isinstance(valor, tipo):
+        return False
+    return not isinstance(valor, float) or math.isfinite(valor)
+
+
+def codificar_cursor(cursor):
+    """Convierte un cursor de la base de datos en una cadena opaca para la URL (None si no hay más)"""
+    if cursor is None:
+        return None
+    texto = json.dumps(list(cursor), separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def content_disposition(nombre_archivo: str) -> str:
+    """Encabezado Content-Disposition de descarga, con nombre UTF-8 y alternativa ASCII"""
+    ascii_nombre = unicodedata.normalize('NFKD', nombre_archivo).encode('ascii', 'ignore').decode('ascii')
+    ascii_nombre = ascii_nombre.replace('"', '').replace('\\', '')
+    return f"attachment; filename=\"{ascii_nombre}\"; filename*=UTF-8''{quote(nombre_archivo, safe='')}"
+
+
+def _firma_grupos():
+    """Devuelve (mtime_ns, tamaño) de grupos.json, o None si no existe"""
     try:
-        with open(GRUPOS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(grupos, f, indent=2, ensure_ascii=False)
+        st = os.stat(GRUPOS_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def load_grupos():
+    """
+    Carga los grupos desde el catálogo en memoria
+    
+    El archivo solo se vuelve a leer si cambió su mtime/tamaño (edición externa),
+    y esa comprobación se hace como máximo cada GRUPOS_CHECK_INTERVAL segundos.
+    Devuelve una copia que el llamador puede modificar antes de save_grupos().
+    """
+    global _grupos_cache, _grupos_firma, _grupos_verificado, _grupos_version
+    if STORAGE_BACKEND == "sqlite":
+        return get_webauthn_db().load_grupos()
+    
+    with _grupos_lock:
+        ahora = time.monotonic()
+        if _grupos_cache is not None and ahora - _grupos_verificado < GRUPOS_CHECK_INTERVAL:
+            return dict(_grupos_cache)
+        
+        firma = _firma_grupos()
+        _grupos_verificado = ahora
+        if _grupos_cache is not None and firma == _grupos_firma:
+            return dict(_grupos_cache)
+        
+        grupos = {}
+        if firma is not None:
+            try:
+                with open(GRUPOS_FILE, 'r', encoding='utf-8') as f:
+                    grupos = json.load(f)
+            except:
+                grupos = {}
+        _grupos_cache = grupos
+        _grupos_firma = firma
+        _grupos_version += 1
+        return dict(grupos)
+
+
+def save_grupos(grupos):
+    """Guarda los grupos en el archivo y actualiza el catálogo en memoria"""
+    global _grupos_cache, _grupos_firma, _grupos_verificado, _grupos_version
+    if STORAGE_BACKEND == "sqlite":
+        return get_webauthn_db().save_grupos(grupos)
+    
+    with _grupos_lock:
+        try:
+            with open(GRUPOS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(grupos, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Error al guardar grupos: {e}")
+            # Forzar una relectura del archivo en la siguiente consulta
+            _grupos_cache = None
+            return False
+        _grupos_cache = dict(grupos)
+        _grupos_firma = _firma_grupos()
+        _grupos_verificado = time.monotonic()
+        _grupos_version += 1
         return True
-    except Exception as e:
-        print(f"Error al guardar grupos: {e}")
-        return False
+
+
+def version_grupos() -> str:
+    """Versión del catálogo de grupos (cambia al guardarlo o al editarse grupos.json)"""
+    if STORAGE_BACKEND == "sqlite":
+        return str(get_webauthn_db().version_grupos())
+    # Revisa la firma del archivo igual que una consulta normal
+    load_grupos()
+    return str(_grupos_version)
+
+
+# ==================== RESPUESTAS CONDICIONALES ====================
+
+def etag_de(recurso: str, *versiones: str) -> str:
+    """
+    ETag de una lectura a partir del recurso, sus versiones y los parámetros de la URL
+    
+    Se calcula sin generar la respuesta, así que un `If-None-Match` que
+    coincide se contesta con 304 antes de cualquier consulta.
+    """
+    return clave_exportacion(recurso, request.query_string.decode('utf-8', 'replace'), *versiones)
+
+
+def no_modificado(etag: str) -> Optional[Response]:
+    """Respuesta 304 si el cliente ya tiene la versión `etag`; None si hay que generarla"""
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304)
+    return None
+
+
+def con_etag(respuesta: Response, etag: str) -> Response:
+    """
+    Agrega el ETag (débil, porque el cuerpo puede ir comprimido) a una respuesta
+    
+    El navegador conserva la respuesta pero la revalida siempre con el ETag.
+    """
+    respuesta.set_etag(etag, weak=True)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+@app.after_request
+def comprimir_respuesta(respuesta: Response) -> Response:
+    """Comprime con gzip las respuestas JSON grandes si el cliente lo acepta"""
+    respuesta.vary.add('Accept-Encoding')
+    if (respuesta.status_code != 200
+            or respuesta.direct_passthrough
+            or respuesta.is_streamed
+            or respuesta.mimetype != 'application/json'
+            or 'Content-Encoding' in respuesta.headers
+            or 'gzip' not in request.accept_encodings):
+        return respuesta
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < GZIP_MIN_BYTES:
+        return respuesta
+    respuesta.set_data(gzip.compress(cuerpo, compresslevel=GZIP_NIVEL))
+    respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
 
 
 @app.route('/api/health', methods=['GET'])
@@ -98,15 +491,19 @@ def dispositivo_estado():
 @app.route('/api/grupos', methods=['GET'])
 def listar_grupos():
     """Lista todos los grupos registrados"""
+    db = get_webauthn_db()
+    etag = etag_de('grupos', version_grupos(), db.generacion())
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
     grupos = load_grupos()
     
     # Agregar información adicional de cada grupo
+    alumnos_por_grupo = db.group_counts()
     grupos_list = []
     for grupo_id, grupo_data in grupos.items():
         # Contar alumnos en este grupo
-        db = get_webauthn_db()
-        alumnos_en_grupo = sum(1 for a in db.fingerprints.values() 
-                              if a.get('grupo_id') == grupo_id)
+        alumnos_en_grupo = alumnos_por_grupo.get(grupo_id, 0)
         
         grupos_list.append({
             'grupo_id': grupo_id,
@@ -116,10 +513,10 @@ def listar_grupos():
             'total_alumnos': alumnos_en_grupo
         })
     
-    return jsonify({
+    return con_etag(jsonify({
         'total': len(grupos_list),
         'grupos': grupos_list
-    })
+    }), etag)
 
 
 @app.route('/api/grupos', methods=['POST'])
@@ -166,37 +563,38 @@ def crear_grupo():
 @app.route('/api/grupos/<grupo_id>', methods=['GET'])
 def obtener_grupo(grupo_id):
     """Obtiene información de un grupo específico"""
+    db = get_webauthn_db()
+    etag = etag_de('grupo', grupo_id, version_grupos(), db.generacion(grupo_id))
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
     grupos = load_grupos()
     
     if grupo_id not in grupos:
         return jsonify({'error': 'Grupo no encontrado'}), 404
     
     grupo_data = grupos[grupo_id]
-    db = get_webauthn_db()
     
-    # Obtener alumnos del grupo
-    alumnos = [
-        {
-            'user_id': uid,
-            'name': data.get('name', ''),
-            'tiene_huella': len(data.get('credentials', [])) > 0,
-            'registered_at': data.get('registered_at', '')
-        }
-        for uid, data in db.fingerprints.items()
-        if data.get('grupo_id') == grupo_id
-    ]
-    
-    # Ordenar alfabéticamente por nombre
-    alumnos.sort(key=lambda x: x['name'].upper())
+    # Obtener alumnos del grupo (ya ordenados alfabéticamente por nombre)
+    alumnos = []
+    with db.read_lock():
+        for uid in db.get_roster(grupo_id)[0]:
+            data = db.fingerprints[uid]
+            alumnos.append({
+                'user_id': uid,
+                'name': data.get('name', ''),
+                'tiene_huella': len(data.get('credentials', [])) > 0,
+                'registered_at': data.get('registered_at', '')
+            })
     
-    return jsonify({
+    return con_etag(jsonify({
         'grupo_id': grupo_id,
         'nombre': grupo_data.get('nombre', ''),
         'carrera_tecnica': grupo_data.get('carrera_tecnica', ''),
         'created_at': grupo_data.get('created_at', ''),
         'total_alumnos': len(alumnos),
         'alumnos': alumnos
-    })
+    }), etag)
 
 
 @app.route('/api/grupos/<grupo_id>', methods=['DELETE'])
@@ -209,8 +607,7 @@ def eliminar_grupo(grupo_id):
     
     # Verificar si tiene alumnos
     db = get_webauthn_db()
-    alumnos_en_grupo = sum(1 for a in db.fingerprints.values() 
-                          if a.get('grupo_id') == grupo_id)
+    alumnos_en_grupo = db.count_group_students(grupo_id)
     
     if alumnos_en_grupo > 0:
         return jsonify({
@@ -229,17 +626,33 @@ def eliminar_grupo(grupo_id):
 
 @app.route('/api/grupos/<grupo_id>/alumnos', methods=['GET'])
 def listar_alumnos_grupo(grupo_id):
-    """Lista todos los alumnos de un grupo específico"""
+    """
+    Lista los alumnos de un grupo ordenados por nombre
+    
+    Con ?limite=N devuelve una página y en `siguiente` el cursor para pedir
+    la próxima (?cursor=...); el orden ya se mantiene en el índice del grupo.
+    """
+    db = get_webauthn_db()
+    etag = etag_de('grupo-alumnos', grupo_id, version_grupos(), db.generacion(grupo_id))
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
     grupos = load_grupos()
     
     if grupo_id not in grupos:
         return jsonify({'error': 'Grupo no encontrado'}), 404
+    try:
+        limite, cursor = leer_paginacion(CURSOR_ROSTER)
+    except ValueError as e:
+        return jsonify({'error': f'Paginación inválida: {e}'}), 400
     
-    db = get_webauthn_db()
     alumnos = []
     
-    for user_id, user_data in db.fingerprints.items():
-        if user_data.get('grupo_id') == grupo_id:
+    with db.read_lock():
+        user_ids, siguiente = db.get_roster(grupo_id, cursor, limite)
+        total = db.count_group_students(grupo_id)
+        for user_id in user_ids:
+            user_data = db.fingerprints[user_id]
             alumnos.append({
                 'user_id': user_id,
                 'name': user_data.get('name', 'Sin nombre'),
@@ -248,15 +661,13 @@ def listar_alumnos_grupo(grupo_id):
                 'huella_registrada_at': user_data.get('credentials', [{}])[-1].get('registered_at', '') if user_data.get('credentials') else ''
             })
     
-    # Ordenar alfabéticamente por nombre
-    alumnos.sort(key=lambda x: x['name'].upper())
-    
-    return jsonify({
+    return con_etag(jsonify({
         'grupo_id': grupo_id,
         'grupo_nombre': grupos[grupo_id].get('nombre', ''),
-        'total': len(alumnos),
-        'alumnos': alumnos
-    })
+        'total': total,
+        'alumnos': alumnos,
+        'siguiente': codificar_cursor(siguiente)
+    }), etag)
 
 
 @app.route('/api/grupos/<grupo_id>/alumnos', methods=['POST'])
@@ -279,24 +690,9 @@ def registrar_alumno_grupo(grupo_id):
     
     db = get_webauthn_db()
     
-    # Generar ID único para el alumno
-    alumnos_en_grupo = sum(1 for a in db.fingerprints.values() 
-                          if a.get('grupo_id') == grupo_id)
-    user_id = f"{grupo_id}-{alumnos_en_grupo + 1:03d}"
-    
-    # Registrar alumno sin credenciales aún
-    if user_id not in db.fingerprints:
-        db.fingerprints[user_id] = {
-            'name': name,
-            'registered_at': datetime.now().isoformat(),
-            'credentials': [],
-            'grupo_id': grupo_id
-        }
-    else:
-        db.fingerprints[user_id]['name'] = name
-        db.fingerprints[user_id]['grupo_id'] = grupo_id
-    
-    db.save_database()
+    # Registrar alumno sin credenciales aún (el ID se genera con el candado de la base de datos)
+    user_id = db.add_group_student(grupo_id, name)
+    confirmar_durable(db)
     
     return jsonify({
         'message': 'Alumno registrado exitosamente',
@@ -312,16 +708,18 @@ def crear_challenge_registro(alumno_id):
     db = get_webauthn_db()
     
     # Verificar que el alumno existe
-    if alumno_id not in db.fingerprints:
+    alumno_data = db.fingerprints.get(alumno_id)
+    if alumno_data is None:
         return jsonify({'error': 'Alumno no encontrado. Regístralo primero.'}), 404
     
     handler = get_webauthn_handler()
-    challenge = handler.create_challenge()
+    challenge = handler.create_challenge(f"registro:{alumno_id}")
     
     return jsonify({
         'challenge': challenge,
+        'expira_en': CHALLENGE_TTL,
         'user_id': alumno_id,
-        'user_name': db.fingerprints[alumno_id].get('name', '')
+        'user_name': alumno_data.get('name', '')
     })
 
 
@@ -331,20 +729,24 @@ def registrar_huella_alumno(alumno_id):
     db = get_webauthn_db()
     
     # Verificar que el alumno existe
-    if alumno_id not in db.fingerprints:
+    alumno_data = db.fingerprints.get(alumno_id)
+    if alumno_data is None:
         return jsonify({'error': 'Alumno no encontrado. Regístralo primero.'}), 404
     
     data = request.json
     
     if not data or 'credential_id' not in data or 'public_key' not in data:
         return jsonify({'error': 'Datos de credencial WebAuthn requeridos'}), 400
+    error = validar_challenge(data, f"registro:{alumno_id}")
+    if error is not None:
+        return error
     
     credential_id = data.get('credential_id')
     public_key = data.get('public_key')
     
     # Registrar la credencial
-    alumno_data = db.fingerprints[alumno_id]
-    db.add_credential(alumno_id, credential_id, public_key, alumno_data.get('name', ''))
+    db.add_credential(alumno_id, credential_id, public_key, alumno_data.get('name', ''),
+                      durable=esperar_durable())
     
     return jsonify({
         'message': 'Huella registrada exitosamente',
@@ -359,7 +761,7 @@ def eliminar_alumno(alumno_id):
     """Elimina un alumno del sistema"""
     db = get_webauthn_db()
     
-    if db.delete_user(alumno_id):
+    if db.delete_user(alumno_id, durable=esperar_durable()):
         return jsonify({'message': 'Alumno eliminado exitosamente'})
     else:
         return jsonify({'error': 'Alumno no encontrado'}), 404
@@ -367,52 +769,91 @@ def eliminar_alumno(alumno_id):
 
 @app.route('/api/alumnos/<alumno_id>/asistencias', methods=['GET'])
 def obtener_asistencias(alumno_id):
-    """Obtiene el historial de asistencias de un alumno"""
-    db = get_webauthn_db()
+    """
+    Obtiene el historial de asistencias de un alumno
+    
+    Parámetros opcionales: desde, hasta (YYYY-MM-DD, incluidas), since (instante
+    ISO o epoch), limite y cursor (`siguiente` de la página anterior). El rango
+    se localiza por búsqueda binaria en el historial ordenado del alumno.
     
-    if alumno_id not in db.fingerprints:
+    `since` filtra por la hora del evento, no por la de inserción: las
+    asistencias de un lote sincronizado tarde con horas anteriores a `since`
+    no se devuelven (ver filtros_rango).
+    """
+    db = get_webauthn_db()
+    alumno_data = db.fingerprints.get(alumno_id)
+    if alumno_data is None:
         return jsonify({'error': 'Alumno no encontrado'}), 404
+    # La generación del grupo cambia con cada asistencia o modificación de sus alumnos
+    etag = etag_de('asistencias', alumno_id, db.generacion(alumno_data.get('grupo_id')))
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
+    try:
+        desde, hasta, despues_de = filtros_rango()
+    except ValueError:
+        return jsonify({'error': 'Filtro de fecha inválido (usa YYYY-MM-DD, o ISO / epoch en since)'}), 400
+    try:
+        limite, cursor = leer_paginacion(CURSOR_ASISTENCIAS)
+    except ValueError as e:
+        return jsonify({'error': f'Paginación inválida: {e}'}), 400
     
-    alumno_data = db.fingerprints[alumno_id]
-    asistencias = alumno_data.get('asistencias', [])
+    with db.read_lock():
+        alumno_data = db.fingerprints.get(alumno_id)
+        if alumno_data is None:
+            return jsonify({'error': 'Alumno no encontrado'}), 404
+        pagina = db.get_asistencias_rango(alumno_id, desde, hasta, despues_de, cursor, limite)
     
-    return jsonify({
+    return con_etag(jsonify({
         'user_id': alumno_id,
         'name': alumno_data.get('name', ''),
-        'total_asistencias': len(asistencias),
-        'asistencias': asistencias
-    })
+        'total_asistencias': pagina['total'],
+        'asistencias': pagina['asistencias'],
+        'siguiente': codificar_cursor(pagina['siguiente'])
+    }), etag)
 
 
 @app.route('/api/alumnos/<alumno_id>/asistencias', methods=['POST'])
 def registrar_asistencia_manual(alumno_id):
-    """Registra asistencia manualmente (sin huella)"""
-    db = get_webauthn_db()
-    
-    if alumno_id not in db.fingerprints:
-        return jsonify({'error': 'Alumno no encontrado'}), 404
+    """
+    Registra asistencia manualmente (sin huella)
     
+    Con "sesion_id" el alumno también queda como presente en esa sesión de pase de lista;
+    si el alumno no es del grupo de la sesión no se registra nada (403).
+    """
+    db = get_webauthn_db()
     data = request.json or {}
-    alumno_data = db.fingerprints[alumno_id]
-    
-    # Crear registro de asistencia
-    asistencia = {
-        'user_id': alumno_id,
-        'name': alumno_data.get('name', ''),
-        'timestamp': datetime.now().isoformat(),
-        'fecha': datetime.now().strftime('%Y-%m-%d'),
-        'hora': datetime.now().strftime('%H:%M:%S'),
-        'tipo': data.get('tipo', 'manual')
-    }
-    
-    # Guardar asistencia
-    if 'asistencias' not in alumno_data:
-        alumno_data['asistencias'] = []
-    alumno_data['asistencias'].append(asistencia)
-    db.save_database()
+    tipo = data.get('tipo', 'manual')
+    if not isinstance(tipo, str) or tipo not in TIPOS_ASISTENCIA:
+        return jsonify({'error': f"Tipo de asistencia inválido; se admite: {', '.join(TIPOS_ASISTENCIA)}"}), 400
+    sesion_id = data.get('sesion_id')
+    if sesion_id:
+        # Una sesión ya vencida no impide registrar la asistencia
+        sesion = get_sesiones().estado(str(sesion_id))
+        with db.read_lock():
+            grupo_alumno = (db.fingerprints.get(alumno_id) or {}).get('grupo_id')
+        if sesion is not None and grupo_alumno is not None and grupo_alumno != sesion['grupo_id']:
+            return jsonify({'error': 'El alumno no pertenece al grupo de la sesión'}), 403
+    
+    # Registrar asistencia (solo se agrega una línea a la bitácora; nada si es repetida).
+    # add_asistencias comprueba que el alumno exista con su propio candado y escribe
+    # después de soltarlo: no se llama con el candado de escritura tomado
+    [(asistencia, nueva)] = db.add_asistencias([(alumno_id, time.time(), tipo, None)])
+    if asistencia is None:
+        return jsonify({'error': 'Alumno no encontrado'}), 404
+    if sesion_id:
+        get_sesiones().marcar_presente(str(sesion_id), alumno_id, asistencia)
+    confirmar_durable(db)
     
+    if not nueva:
+        return jsonify({
+            'message': 'El alumno ya tenía asistencia registrada',
+            'repetida': True,
+            'asistencia': asistencia
+        })
     return jsonify({
         'message': 'Asistencia registrada exitosamente',
+        'repetida': False,
         'asistencia': asistencia
     }), 201
 
@@ -426,23 +867,19 @@ def crear_challenge_verificacion():
     grupo_id = data.get('grupo_id')  # Opcional: filtrar por grupo
     
     handler = get_webauthn_handler()
-    challenge = handler.create_challenge()
+    challenge = handler.create_challenge(f"verificacion:{grupo_id or '*'}")
     
     # Obtener lista de credential IDs permitidos si se especifica grupo
     allowed_credentials = []
     if grupo_id:
-        db = get_webauthn_db()
-        for user_id, user_data in db.fingerprints.items():
-            if user_data.get('grupo_id') == grupo_id:
-                credentials = user_data.get('credentials', [])
-                for cred in credentials:
-                    allowed_credentials.append({
-                        'id': cred['credential_id'],
-                        'type': 'public-key'
-                    })
+        allowed_credentials = [
+            {'id': credential_id, 'type': 'public-key'}
+            for credential_id in get_webauthn_db().get_group_credentials(grupo_id)
+        ]
     
     return jsonify({
         'challenge': challenge,
+        'expira_en': CHALLENGE_TTL,
         'allowed_credentials': allowed_credentials if allowed_credentials else None
     })
 
@@ -456,20 +893,23 @@ def verificar_asistencia():
     
     if not credential_id:
         return jsonify({'error': 'Credencial ID requerido'}), 400
+    error = validar_challenge(data, f"verificacion:{grupo_id or '*'}")
+    if error is not None:
+        return error
     
     db = get_webauthn_db()
     
-    # Buscar usuario por credential_id
-    user_id = db.find_user_by_credential_id(credential_id)
+    with db.read_lock():
+        # Buscar usuario por credential_id
+        user_id = db.find_user_by_credential_id(credential_id)
+        alumno_data = db.fingerprints.get(user_id) if user_id else None
     
-    if not user_id:
+    if alumno_data is None:
         return jsonify({
             'encontrado': False,
             'message': 'Huella no reconocida. Alumno no registrado.'
         })
     
-    alumno_data = db.fingerprints[user_id]
-    
     # Si se especificó un grupo, verificar que el alumno pertenezca a ese grupo
     if grupo_id and alumno_data.get('grupo_id') != grupo_id:
         return jsonify({
@@ -477,23 +917,20 @@ def verificar_asistencia():
             'message': 'El alumno no pertenece a este grupo'
         })
     
-    # Registrar asistencia
-    asistencia = {
-        'user_id': user_id,
-        'name': alumno_data.get('name', ''),
-        'timestamp': datetime.now().isoformat(),
-        'fecha': datetime.now().strftime('%Y-%m-%d'),
-        'hora': datetime.now().strftime('%H:%M:%S')
-    }
-    
-    # Guardar asistencia
-    if 'asistencias' not in alumno_data:
-        alumno_data['asistencias'] = []
-    alumno_data['asistencias'].append(asistencia)
-    db.save_database()
+    # Registrar asistencia (solo se agrega una línea a la bitácora; nada si es repetida).
+    # Sin el candado de escritura: add_asistencias escribe a disco después de soltar el suyo
+    [(asistencia, nueva)] = db.add_asistencias([(user_id, time.time(), None, None)])
+    if asistencia is None:
+        # Se eliminó mientras tanto
+        return jsonify({
+            'encontrado': False,
+            'message': 'Huella no reconocida. Alumno no registrado.'
+        })
+    confirmar_durable(db)
     
     return jsonify({
         'encontrado': True,
+        'repetida': not nueva,
         'alumno': {
             'user_id': user_id,
             'name': alumno_data.get('name', ''),
@@ -503,49 +940,425 @@ def verificar_asistencia():
     })
 
 
+@app.route('/api/asistencia/verificar/lote', methods=['POST'])
+def verificar_asistencia_lote():
+    """
+    Verifica un lote de asistencias encoladas sin conexión (o de un kiosco)
+    
+    Cuerpo: {"grupo_id": opcional, "verificaciones": [{"credential_id", "timestamp"
+    (ISO o epoch de cuando se tomó la huella; por defecto, ahora), "clave" (de
+    idempotencia, opcional)}], "durable": opcional (por defecto true)}.
+    Un timestamp ilegible, no finito, en el futuro o de hace más de
+    MAX_ATRASO_LOTE_DIAS días deja solo esa verificación como "invalido".
+    Todas las asistencias se escriben juntas; reenviar el mismo lote no las duplica.
+    Los challenges no se validan aquí: las huellas tomadas sin conexión llegan
+    cuando sus challenges ya caducaron. Responde con un resultado por verificación, en el mismo orden.
+    """
+    data = request.get_json(silent=True) or {}
+    grupo_id = data.get('grupo_id')
+    verificaciones = data.get('verificaciones')
+    
+    if not isinstance(verificaciones, list):
+        return jsonify({'error': 'Se requiere la lista de verificaciones'}), 400
+    if len(verificaciones) > MAX_LOTE_VERIFICACIONES:
+        return jsonify({'error': f'El lote admite como máximo {MAX_LOTE_VERIFICACIONES} verificaciones'}), 400
+    
+    db = get_webauthn_db()
+    ahora = time.time()
+    resultados = [None] * len(verificaciones)
+    registros = []  # (user_id, ts, tipo, clave)
+    posiciones = []  # Índice en `verificaciones` de cada registro
+    
+    with db.read_lock():
+        for i, item in enumerate(verificaciones):
+            item = item if isinstance(item, dict) else {}
+            clave = item.get('clave')
+            resultado = {'clave': clave}
+            resultados[i] = resultado
+            
+            credential_id = item.get('credential_id')
+            if not credential_id:
+                resultado.update(estado='invalido', encontrado=False, message='Credencial ID requerido')
+                continue
+            try:
+                ts = instante_de(str(item['timestamp'])) if item.get('timestamp') is not None else ahora
+            except (ValueError, OverflowError, OSError):
+                resultado.update(estado='invalido', encontrado=False, message='Timestamp inválido')
+                continue
+            # nan, inf o instantes muy antiguos no se pueden guardar ni mostrar como fecha
+            if not math.isfinite(ts) or ts < ahora - MAX_ATRASO_LOTE_DIAS * 86400:
+                resultado.update(estado='invalido', encontrado=False,
+                                 message=f'Timestamp inválido o de hace más de {MAX_ATRASO_LOTE_DIAS} días')
+                continue
+            if ts > ahora + MAX_ADELANTO_RELOJ:
+                resultado.update(estado='invalido', encontrado=False, message='Timestamp en el futuro')
+                continue
+            
+            user_id = db.find_user_by_credential_id(credential_id)
+            if not user_id:
+                resultado.update(estado='no_reconocido', encontrado=False,
+                                 message='Huella no reconocida. Alumno no registrado.')
+                continue
+            alumno_data = db.fingerprints[user_id]
+            if grupo_id and alumno_data.get('grupo_id') != grupo_id:
+                resultado.update(estado='otro_grupo', encontrado=False,
+                                 message='El alumno no pertenece a este grupo')
+                continue
+            
+            resultado.update(encontrado=True, alumno={
+                'user_id': user_id,
+                'name': alumno_data.get('name', ''),
+                'grupo_id': alumno_data.get('grupo_id', '')
+            })
+            registros.append((user_id, ts, None, str(clave) if clave is not None else None))
+            posiciones.append(i)
+    
+    # Una sola escritura para todo el lote (fuera del candado de lectura)
+    durable = data.get('durable', True) is not False
+    aplicadas = db.add_asistencias(registros, durable=durable)
+    for i, (asistencia, nueva) in zip(posiciones, aplicadas):
+        resultado = resultados[i]
+        if asistencia is None:
+            resultado.pop('alumno', None)
+            resultado.update(estado='no_reconocido', encontrado=False,
+                             message='Huella no reconocida. Alumno no registrado.')
+        else:
+            resultado.update(estado='registrada' if nueva else 'duplicada', asistencia=asistencia)
+    
+    return jsonify({
+        'total': len(resultados),
+        'registradas': sum(1 for r in resultados if r.get('estado') == 'registrada'),
+        'resultados': resultados
+    })
+
+
+# ==================== SESIONES DE PASE DE LISTA ====================
+
+@app.route('/api/sesiones', methods=['POST'])
+def abrir_sesion():
+    """
+    Abre una sesión de pase de lista para un grupo
+    
+    Calcula una sola vez las credenciales permitidas del grupo y entrega un lote
+    de challenges (por defecto, uno por alumno); cada verificación de la sesión
+    consume uno.
+    """
+    data = request.get_json(silent=True) or {}
+    grupo_id = data.get('grupo_id')
+    grupos = load_grupos()
+    
+    if not grupo_id:
+        return jsonify({'error': 'Se requiere el grupo'}), 400
+    if grupo_id not in grupos:
+        return jsonify({'error': 'Grupo no encontrado'}), 404
+    
+    db = get_webauthn_db()
+    with db.read_lock():
+        miembros = db.get_group_user_ids(grupo_id)
+        credenciales = db.get_group_credentials(grupo_id)
+    try:
+        cantidad = int(data.get('challenges', max(1, len(miembros))))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Número de challenges inválido'}), 400
+    
+    try:
+        sesion = get_sesiones().abrir(grupo_id, credenciales, miembros, cantidad)
+    except SesionesLlenas as e:
+        respuesta = jsonify({'error': f'{e}; cierra alguna o intenta de nuevo más tarde'})
+        respuesta.headers['Retry-After'] = '60'
+        return respuesta, 503
+    return jsonify({
+        'sesion_id': sesion['sesion_id'],
+        'grupo_id': grupo_id,
+        'grupo_nombre': grupos[grupo_id].get('nombre', ''),
+        'total_alumnos': len(miembros),
+        'allowed_credentials': sesion['allowed_credentials'] or None,
+        'challenges': sesion['challenges'],
+        'expira_en': SESION_TTL
+    }), 201
+
+
+@app.route('/api/sesiones/<sesion_id>', methods=['GET'])
+def estado_sesion(sesion_id):
+    """Consulta el avance de una sesión de pase de lista"""
+    sesion = get_sesiones().estado(sesion_id)
+    if sesion is None:
+        return jsonify({'error': 'Sesión no encontrada o vencida'}), 404
+    
+    return jsonify({
+        'sesion_id': sesion_id,
+        'grupo_id': sesion['grupo_id'],
+        'total_alumnos': len(sesion['miembros']),
+        'total_presentes': len(sesion['presentes']),
+        'challenges_pendientes': sesion['challenges_pendientes']
+    })
+
+
+@app.route('/api/sesiones/<sesion_id>/challenges', methods=['POST'])
+def emitir_challenges_sesion(sesion_id):
+    """Entrega más challenges para una sesión abierta"""
+    data = request.get_json(silent=True) or {}
+    try:
+        cantidad = int(data.get('cantidad', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Cantidad inválida'}), 400
+    
+    challenges = get_sesiones().emitir_challenges(sesion_id, cantidad)
+    if challenges is None:
+        return jsonify({'error': 'Sesión no encontrada o vencida'}), 404
+    return jsonify({'sesion_id': sesion_id, 'challenges': challenges})
+
+
+@app.route('/api/sesiones/<sesion_id>/verificar', methods=['POST'])
+def verificar_en_sesion(sesion_id):
+    """Verifica la asistencia de un alumno contra el estado de la sesión"""
+    data = request.get_json(silent=True) or {}
+    credential_id = data.get('credential_id')
+    
+    if not credential_id:
+        return jsonify({'error': 'Credencial ID requerido'}), 400
+    
+    challenge = None
+    if data.get('client_data_json'):
+        challenge = WebAuthnHandler.challenge_de_client_data(data['client_data_json'])
+        if challenge is None:
+            return jsonify({'error': 'client_data_json inválido'}), 400
+    elif EXIGIR_CHALLENGE:
+        return jsonify({'error': 'Se requiere client_data_json con el challenge'}), 400
+    
+    registro = get_sesiones()
+    estado, user_id = registro.resolver(sesion_id, credential_id, challenge)
+    if estado == 'sin_sesion':
+        return jsonify({'error': 'Sesión no encontrada o vencida'}), 404
+    if estado == 'challenge_invalido':
+        return jsonify({'error': 'Challenge inválido o ya usado. Pide más challenges a la sesión.'}), 400
+    
+    db = get_webauthn_db()
+    if estado == 'no_encontrada':
+        # Pudo registrarse después de abrir la sesión
+        sesion = registro.estado(sesion_id)
+        user_id = db.find_user_by_credential_id(credential_id)
+        if not user_id:
+            return jsonify({
+                'encontrado': False,
+                'message': 'Huella no reconocida. Alumno no registrado.'
+            })
+        with db.read_lock():
+            grupo_alumno = (db.fingerprints.get(user_id) or {}).get('grupo_id')
+        if sesion is None or grupo_alumno != sesion['grupo_id']:
+            return jsonify({
+                'encontrado': False,
+                'message': 'El alumno no pertenece a este grupo'
+            })
+        registro.agregar_credencial(sesion_id, credential_id, user_id)
+    
+    [(asistencia, nueva)] = db.add_asistencias([(user_id, time.time(), None, None)])
+    if asistencia is None:
+        return jsonify({
+            'encontrado': False,
+            'message': 'Huella no reconocida. Alumno no registrado.'
+        })
+    registro.marcar_presente(sesion_id, user_id, asistencia)
+    confirmar_durable(db)
+    
+    with db.read_lock():
+        alumno_data = db.fingerprints.get(user_id) or {}
+    sesion = registro.estado(sesion_id)
+    return jsonify({
+        'encontrado': True,
+        'repetida': not nueva,
+        'alumno': {
+            'user_id': user_id,
+            'name': alumno_data.get('name', ''),
+            'grupo_id': alumno_data.get('grupo_id', '')
+        },
+        'asistencia': asistencia,
+        'total_presentes': len(sesion['presentes']) if sesion else None,
+        'challenges_pendientes': sesion['challenges_pendientes'] if sesion else 0
+    })
+
+
+@app.route('/api/sesiones/<sesion_id>', methods=['DELETE'])
+def cerrar_sesion(sesion_id):
+    """Cierra una sesión de pase de lista y devuelve presentes y ausentes"""
+    sesion = get_sesiones().cerrar(sesion_id)
+    if sesion is None:
+        return jsonify({'error': 'Sesión no encontrada o vencida'}), 404
+    
+    db = get_webauthn_db()
+    with db.read_lock():
+        nombres = {
+            uid: (db.fingerprints.get(uid) or {}).get('name', '')
+            for uid in sesion['miembros']
+        }
+    presentes = sorted(sesion['presentes'], key=lambda uid: (nombres.get(uid, '').upper(), uid))
+    ausentes = sorted(sesion['ausentes'], key=lambda uid: (nombres.get(uid, '').upper(), uid))
+    
+    return jsonify({
+        'sesion_id': sesion_id,
+        'grupo_id': sesion['grupo_id'],
+        'presentes': [
+            {'user_id': uid, 'name': nombres.get(uid, ''), 'asistencia': sesion['presentes'][uid]}
+            for uid in presentes
+        ],
+        'ausentes': [{'user_id': uid, 'name': nombres.get(uid, '')} for uid in ausentes],
+        'total_presentes': len(presentes),
+        'total_ausentes': len(ausentes)
+    })
+
+
+@app.route('/api/grupos/<grupo_id>/ausencias', methods=['GET'])
+def obtener_ausencias_grupo(grupo_id):
+    """Lista los alumnos presentes y ausentes de un grupo en una fecha (por defecto, hoy)"""
+    fecha = request.args.get('fecha') or datetime.now().strftime('%Y-%m-%d')
+    db = get_webauthn_db()
+    # Sin ?fecha la respuesta depende del día actual
+    etag = etag_de('ausencias', grupo_id, fecha, version_grupos(), db.generacion(grupo_id))
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
+    grupos = load_grupos()
+    
+    if grupo_id not in grupos:
+        return jsonify({'error': 'Grupo no encontrado'}), 404
+    
+    with db.read_lock():
+        presentes = sorted(db.get_presentes(fecha, grupo_id))
+        ausentes = sorted(db.get_ausentes(fecha, grupo_id))
+        nombres = {uid: db.fingerprints[uid].get('name', '') for uid in presentes + ausentes}
+    
+    return con_etag(jsonify({
+        'grupo_id': grupo_id,
+        'fecha': fecha,
+        'presentes': [{'user_id': uid, 'name': nombres[uid]} for uid in presentes],
+        'ausentes': [{'user_id': uid, 'name': nombres[uid]} for uid in ausentes],
+        'total_presentes': len(presentes),
+        'total_ausentes': len(ausentes)
+    }), etag)
+
+
+@app.route('/api/asistencias/exportar', methods=['GET'])
+def exportar_asistencias():
+    """
+    Descarga el historial completo de asistencias en CSV o NDJSON, en streaming
+    
+    Parámetros: formato=csv|ndjson, grupo_id, desde, hasta (YYYY-MM-DD) y since
+    (instante ISO o epoch). Cada registro incluye hora y tipo; las filas se
+    envían conforme se leen, por lotes de alumnos.
+    
+    `since` filtra por la hora del evento, no por la de inserción: una
+    exportación incremental no incluye lotes sincronizados tarde con horas
+    anteriores a `since` (ver filtros_rango).
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato no soportado (usa csv o ndjson)'}), 400
+    try:
+        desde, hasta, despues_de = filtros_rango()
+    except ValueError:
+        return jsonify({'error': 'Filtro de fecha inválido (usa YYYY-MM-DD, o ISO / epoch en since)'}), 400
+    
+    grupo_id = request.args.get('grupo_id')
+    db = get_webauthn_db()
+    user_ids = sorted(db.get_group_user_ids(grupo_id)) if grupo_id else None
+    registros = db.iter_asistencias(user_ids, desde, hasta, despues_de)
+    campos = ['user_id', 'name', 'grupo_id', 'timestamp', 'fecha', 'hora', 'tipo']
+    
+    def filas():
+        for user_id, name, grupo, ts, tipo in registros:
+            asistencia = asistencia_dict(user_id, name, ts, tipo)
+            asistencia['grupo_id'] = grupo
+            asistencia['tipo'] = tipo
+            yield asistencia
+    
+    def generar_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=campos, extrasaction='ignore')
+        writer.writeheader()
+        # Enviar el encabezado de inmediato; después, bloques de ~64 KB
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for asistencia in filas():
+            writer.writerow(asistencia)
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generar_ndjson():
+        bloque = []
+        tamano = 0
+        for asistencia in filas():
+            linea = json.dumps({campo: asistencia[campo] for campo in campos}, ensure_ascii=False) + '\n'
+            bloque.append(linea)
+            tamano += len(linea)
+            if tamano >= 64 * 1024:
+                yield ''.join(bloque)
+                bloque = []
+                tamano = 0
+        yield ''.join(bloque)
+    
+    if formato == 'csv':
+        cuerpo, mimetype, nombre_archivo = generar_csv(), 'text/csv', 'asistencias.csv'
+    else:
+        cuerpo, mimetype, nombre_archivo = generar_ndjson(), 'application/x-ndjson', 'asistencias.ndjson'
+    return Response(
+        cuerpo,
+        mimetype=mimetype,
+        headers={'Content-Disposition': content_disposition(nombre_archivo)}
+    )
+
+
 # ==================== ESTADÍSTICAS ====================
 
 @app.route('/api/estadisticas', methods=['GET'])
 def obtener_estadisticas():
-    """Obtiene estadísticas del sistema"""
+    """
+    Obtiene estadísticas del sistema
+    
+    Los totales se mantienen de forma incremental en la base de datos; con
+    ?verificar=1 además se recalculan desde cero y se reportan las diferencias.
+    """
     db = get_webauthn_db()
+    etag = etag_de('estadisticas', version_grupos(), db.generacion())
+    respuesta = no_modificado(etag)
+    if respuesta is not None:
+        return con_etag(respuesta, etag)
     grupos = load_grupos()
-    
-    total_alumnos = len(db.fingerprints)
-    alumnos_con_huella = sum(1 for a in db.fingerprints.values() 
-                            if len(a.get('credentials', [])) > 0)
-    total_asistencias = sum(len(a.get('asistencias', [])) for a in db.fingerprints.values())
+    estadisticas = db.get_estadisticas()
     
     # Estadísticas por grupo
     estadisticas_grupos = {}
     for grupo_id, grupo_data in grupos.items():
-        alumnos_grupo = [a for a in db.fingerprints.values() if a.get('grupo_id') == grupo_id]
+        totales = estadisticas['grupos'].get(grupo_id, {})
         estadisticas_grupos[grupo_id] = {
             'nombre': grupo_data.get('nombre', ''),
             'carrera_tecnica': grupo_data.get('carrera_tecnica', ''),
-            'total_alumnos': len(alumnos_grupo),
-            'alumnos_con_huella': sum(1 for a in alumnos_grupo 
-                                     if len(a.get('credentials', [])) > 0),
-            'total_asistencias': sum(len(a.get('asistencias', [])) for a in alumnos_grupo)
+            'total_alumnos': totales.get('total_alumnos', 0),
+            'alumnos_con_huella': totales.get('alumnos_con_huella', 0),
+            'total_asistencias': totales.get('total_asistencias', 0)
         }
     
-    # Asistencias por fecha
-    asistencias_por_fecha = {}
-    for alumno_data in db.fingerprints.values():
-        for asistencia in alumno_data.get('asistencias', []):
-            fecha = asistencia.get('fecha', '')
-            if fecha:
-                asistencias_por_fecha[fecha] = asistencias_por_fecha.get(fecha, 0) + 1
-    
-    return jsonify({
+    total_alumnos = estadisticas['total_alumnos']
+    alumnos_con_huella = estadisticas['alumnos_con_huella']
+    respuesta = {
         'total_alumnos': total_alumnos,
         'alumnos_con_huella': alumnos_con_huella,
         'alumnos_sin_huella': total_alumnos - alumnos_con_huella,
-        'total_asistencias': total_asistencias,
+        'total_asistencias': estadisticas['total_asistencias'],
         'total_grupos': len(grupos),
         'estadisticas_grupos': estadisticas_grupos,
-        'asistencias_por_fecha': asistencias_por_fecha
-    })
+        'asistencias_por_fecha': estadisticas['asistencias_por_fecha']
+    }
+    
+    if request.args.get('verificar') in ('1', 'true'):
+        diferencias = db.verificar_estadisticas()
+        respuesta['consistente'] = not diferencias
+        respuesta['diferencias'] = {campo: list(valores) for campo, valores in diferencias.items()}
+    
+    return con_etag(jsonify(respuesta), etag)
 
 
 @app.route('/api/estadisticas/descargar-excel', methods=['GET'])
@@ -555,135 +1368,200 @@ def descargar_excel_asistencias():
     db = get_webauthn_db()
     grupos = load_grupos()
     
-    # Obtener alumnos (del grupo específico o todos)
+    # Nombre y título del reporte (del grupo específico o de todos)
     if grupo_id:
-        alumnos_data = [
-            (user_id, data) for user_id, data in db.fingerprints.items()
-            if data.get('grupo_id') == grupo_id
-        ]
         grupo_info = grupos.get(grupo_id, {})
         nombre_archivo = f"asistencias_{grupo_info.get('nombre', grupo_id).replace(' ', '_')}.xlsx"
         titulo = f"Asistencias - {grupo_info.get('nombre', grupo_id)}"
     else:
-        alumnos_data = list(db.fingerprints.items())
         nombre_archivo = "asistencias_todos_los_grupos.xlsx"
         titulo = "Asistencias - Todos los Grupos"
     
-    # Ordenar alumnos alfabéticamente por nombre
-    alumnos_data.sort(key=lambda x: x[1].get('name', '').upper())
-    
-    # Obtener todas las fechas únicas de todas las asistencias
-    fechas_set = set()
-    for user_id, alumno_data in alumnos_data:
-        for asistencia in alumno_data.get('asistencias', []):
-            fecha = asistencia.get('fecha', '')
-            if fecha:
-                fechas_set.add(fecha)
-    
-    # Ordenar fechas cronológicamente
-    fechas_ordenadas = sorted(list(fechas_set))
-    
-    # Crear el libro de Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Asistencias"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    border_style = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    # El contenido solo depende del grupo, la generación de sus datos y el título
+    etag = clave_exportacion('asistencias-xlsx', grupo_id or '*', db.generacion(grupo_id), titulo)
+    if request.if_none_match.contains(etag):
+        return _respuesta_exportacion(Response(status=304), etag, nombre_archivo)
+    
+    cache = get_export_cache()
+    ruta = cache.get(etag)
+    if ruta is not None:
+        return _respuesta_exportacion(
+            send_file(ruta, mimetype=MIMETYPE_XLSX, conditional=False), etag, nombre_archivo
+        )
+    
+    # Copiar las filas con el candado de lectura; el libro se construye ya sin
+    # bloquear a las escrituras
+    with db.read_lock():
+        # La generación pudo avanzar desde la consulta anterior: usar la de esta copia
+        etag = clave_exportacion('asistencias-xlsx', grupo_id or '*', db.generacion(grupo_id), titulo)
+        user_ids = db.get_group_user_ids(grupo_id) if grupo_id else list(db.fingerprints.keys())
+        columnas, alumnos_data = _datos_hoja(db, user_ids)
+    
+    fechas_ordenadas = [fecha for fecha, col in columnas]
+    posiciones = [col for fecha, col in columnas]
+    filas = (
+        (nombre, [(bits >> col) & 1 for col in posiciones])
+        for nombre, bits in alumnos_data
     )
-    center_alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Agregar título en la parte superior
-    ws.insert_rows(1)
-    ws.merge_cells(f'A1:{get_column_letter(len(fechas_ordenadas) + 1)}1')
-    title_cell = ws['A1']
-    title_cell.value = titulo
-    title_cell.font = Font(bold=True, size=14)
-    title_cell.alignment = Alignment(horizontal='center', vertical='center')
-    title_cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    
-    # Encabezado: Nombre del alumno (ahora en fila 2)
-    ws['A2'] = 'Alumno'
-    ws['A2'].fill = header_fill
-    ws['A2'].font = header_font
-    ws['A2'].alignment = center_alignment
-    ws['A2'].border = border_style
-    
-    # Encabezados: Fechas (ahora en fila 2)
-    for idx, fecha in enumerate(fechas_ordenadas, start=2):
-        col = get_column_letter(idx)
-        cell = ws[f'{col}2']
-        cell.value = fecha
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_alignment
-        cell.border = border_style
-    
-    # Llenar datos de alumnos (empezando en fila 3)
-    for row_idx, (user_id, alumno_data) in enumerate(alumnos_data, start=3):
-        nombre = alumno_data.get('name', user_id)
-        
-        # Nombre del alumno
-        cell = ws[f'A{row_idx}']
-        cell.value = nombre
-        cell.border = border_style
-        cell.alignment = Alignment(vertical='center')
-        
-        # Obtener fechas de asistencia de este alumno
-        fechas_asistencia = set()
-        for asistencia in alumno_data.get('asistencias', []):
-            fecha = asistencia.get('fecha', '')
-            if fecha:
-                fechas_asistencia.add(fecha)
-        
-        # Marcar asistencias por fecha
-        for col_idx, fecha in enumerate(fechas_ordenadas, start=2):
-            col = get_column_letter(col_idx)
-            cell = ws[f'{col}{row_idx}']
-            
-            if fecha in fechas_asistencia:
-                cell.value = '*'  # Asistió
-                cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-            else:
-                cell.value = '/'  # No asistió
-                cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-            
-            cell.border = border_style
-            cell.alignment = center_alignment
-            cell.font = Font(size=12)
-    
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 30
-    for idx in range(2, len(fechas_ordenadas) + 2):
-        col = get_column_letter(idx)
-        ws.column_dimensions[col].width = 12
-    
-    # Guardar en un archivo temporal
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-    wb.save(temp_file.name)
-    temp_file.close()
-    
-    return send_file(
-        temp_file.name,
-        as_attachment=True,
-        download_name=nombre_archivo,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    
+    # El libro se escribe y se envía fila por fila, sin archivos temporales,
+    # y a la vez se guarda en la caché para las siguientes descargas
+    hojas = [("Asistencias", hoja_asistencias(titulo, fechas_ordenadas, filas, len(alumnos_data)))]
+    return _respuesta_exportacion(
+        Response(cache.guardar_stream(etag, stream_xlsx(hojas)), mimetype=MIMETYPE_XLSX),
+        etag, nombre_archivo
     )
 
 
+def _datos_hoja(db, user_ids):
+    """
+    Copia los datos de una hoja de asistencias (llamar con el candado de lectura)
+    
+    Returns:
+        (columnas, alumnos): lista de (fecha, columna de la matriz) en orden
+        cronológico y lista de (nombre, bits de asistencia) ordenada por nombre
+    """
+    alumnos = []
+    todas = 0
+    for user_id in user_ids:
+        alumno_data = db.fingerprints.get(user_id)
+        if alumno_data is None:
+            continue
+        bits = db.get_bits_asistencia(user_id)
+        todas |= bits
+        alumnos.append((alumno_data.get('name', user_id), bits))
+    
+    # Ordenar alumnos alfabéticamente por nombre
+    alumnos.sort(key=lambda x: x[0].upper())
+    # Fechas con al menos una asistencia, en orden cronológico
+    return db.columnas_asistencia(todas), alumnos
+
+
+def _respuesta_exportacion(respuesta: Response, etag: str, nombre_archivo: str) -> Response:
+    """Agrega a la respuesta de una descarga el nombre del archivo y su ETag"""
+    respuesta.set_etag(etag)
+    # El navegador puede guardar el archivo, pero debe revalidarlo con el ETag
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    if respuesta.status_code == 200:
+        respuesta.headers['Content-Disposition'] = content_disposition(nombre_archivo)
+    return respuesta
+
+
+# ==================== EXPORTACIONES EN SEGUNDO PLANO ====================
+
+@app.route('/api/exportaciones', methods=['POST'])
+def crear_exportacion():
+    """
+    Inicia la generación de un Excel en segundo plano
+    
+    Sin grupo_id genera una hoja por grupo (más 'Sin grupo' si hay alumnos sin
+    grupo registrado). Responde de inmediato con el ID del trabajo.
+    """
+    data = request.get_json(silent=True) or {}
+    grupo_id = data.get('grupo_id') or request.args.get('grupo_id')
+    db = get_webauthn_db()
+    grupos = load_grupos()
+    
+    if grupo_id and grupo_id not in grupos:
+        return jsonify({'error': 'Grupo no encontrado'}), 404
+    
+    if grupo_id:
+        nombre_archivo = f"asistencias_{grupos[grupo_id].get('nombre', grupo_id).replace(' ', '_')}.xlsx"
+        grupos_hojas = [grupo_id]
+    else:
+        nombre_archivo = "asistencias_todos_los_grupos.xlsx"
+        grupos_hojas = sorted(grupos)
+    
+    # Copiar los datos de todas las hojas en una sola lectura consistente
+    hojas = []
+    with db.read_lock():
+        for gid in grupos_hojas:
+            nombre = grupos[gid].get('nombre', gid)
+            columnas, alumnos = _datos_hoja(db, db.get_group_user_ids(gid))
+            hojas.append({
+                'nombre': nombre,
+                'titulo': f"Asistencias - {nombre}",
+                'columnas': columnas,
+                'alumnos': alumnos
+            })
+        if not grupo_id:
+            sin_grupo = [
+                uid for uid, alumno in db.fingerprints.items()
+                if alumno.get('grupo_id') not in grupos
+            ]
+            if sin_grupo:
+                columnas, alumnos = _datos_hoja(db, sin_grupo)
+                hojas.append({
+                    'nombre': 'Sin grupo',
+                    'titulo': "Asistencias - Sin grupo",
+                    'columnas': columnas,
+                    'alumnos': alumnos
+                })
+    
+    if not hojas:
+        return jsonify({'error': 'No hay grupos para exportar'}), 400
+    
+    try:
+        job_id = get_export_jobs().enviar(nombre_archivo, hojas)
+    except ExportQueueFull as e:
+        respuesta = jsonify({'error': f'{e}; intenta de nuevo en unos momentos'})
+        respuesta.headers['Retry-After'] = '30'
+        return respuesta, 503
+    return jsonify({
+        'job_id': job_id,
+        'estado': 'pendiente',
+        'total_hojas': len(hojas),
+        'url_estado': f'/api/exportaciones/{job_id}'
+    }), 202
+
+
+@app.route('/api/exportaciones/<job_id>', methods=['GET'])
+def estado_exportacion(job_id):
+    """Consulta el avance de una exportación en segundo plano"""
+    trabajo = get_export_jobs().estado(job_id)
+    if trabajo is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    
+    respuesta = {
+        'job_id': job_id,
+        'estado': trabajo['estado'],
+        'progreso': trabajo['progreso'],
+        'hojas_listas': trabajo['hojas_listas'],
+        'total_hojas': trabajo['total_hojas'],
+        'error': trabajo['error']
+    }
+    if trabajo['estado'] == 'listo':
+        respuesta['url_descarga'] = f'/api/exportaciones/{job_id}/descarga'
+    return jsonify(respuesta)
+
+
+@app.route('/api/exportaciones/<job_id>/descarga', methods=['GET'])
+def descargar_exportacion(job_id):
+    """Descarga el Excel de una exportación terminada"""
+    trabajo = get_export_jobs().estado(job_id)
+    if trabajo is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    if trabajo['estado'] != 'listo':
+        return jsonify({
+            'error': 'La exportación aún no está lista',
+            'estado': trabajo['estado'],
+            'progreso': trabajo['progreso']
+        }), 409
+    
+    respuesta = send_file(trabajo['archivo'], mimetype=MIMETYPE_XLSX)
+    respuesta.headers['Content-Disposition'] = content_disposition(trabajo['nombre_archivo'])
+    return respuesta
+
+
 if __name__ == '__main__':
     print("=" * 60)
     print("  SISTEMA DE PASE DE LISTA - BACKEND API")
     print("=" * 60)
     print("  Usando WebAuthn API para lectura de huellas")
-    print(f"Database: {DB_FILE}")
+    print(f"Almacenamiento: {STORAGE_BACKEND}")
+    print(f"Database: {SQLITE_FILE if STORAGE_BACKEND == 'sqlite' else DB_FILE}")
     print(f"Grupos: {GRUPOS_FILE}")
+    print(f"Bitácora de asistencias: {JOURNAL_FILE}")
     print("\nIniciando servidor en http://localhost:5000")
     print("Endpoints disponibles:")
     print("  Grupos:")
@@ -692,17 +1570,31 @@ if __name__ == '__main__':
     print("    GET    /api/grupos/<id>")
     print("    DELETE /api/grupos/<id>")
     print("  Alumnos:")
-    print("    GET    /api/grupos/<id>/alumnos")
+    print("    GET    /api/grupos/<id>/alumnos?limite=&cursor=")
     print("    POST   /api/grupos/<id>/alumnos")
     print("    POST   /api/alumnos/<id>/huella/challenge")
     print("    POST   /api/alumnos/<id>/huella")
     print("    DELETE /api/alumnos/<id>")
+    print("    GET    /api/alumnos/<id>/asistencias?desde=&hasta=&since=&limite=&cursor=")
     print("  Asistencia:")
     print("    POST   /api/asistencia/verificar/challenge")
     print("    POST   /api/asistencia/verificar")
+    print("    POST   /api/asistencia/verificar/lote")
+    print("    GET    /api/grupos/<id>/ausencias?fecha=<YYYY-MM-DD>")
+    print("  Sesiones de pase de lista:")
+    print("    POST   /api/sesiones")
+    print("    GET    /api/sesiones/<id>")
+    print("    POST   /api/sesiones/<id>/challenges")
+    print("    POST   /api/sesiones/<id>/verificar")
+    print("    DELETE /api/sesiones/<id>")
+    print("    GET    /api/asistencias/exportar?formato=csv|ndjson&grupo_id=&desde=&hasta=&since=")
     print("  Estadísticas:")
     print("    GET    /api/estadisticas")
     print("    GET    /api/estadisticas/descargar-excel?grupo_id=<id>")
+    print("  Exportaciones en segundo plano:")
+    print("    POST   /api/exportaciones")
+    print("    GET    /api/exportaciones/<job_id>")
+    print("    GET    /api/exportaciones/<job_id>/descarga")
     print("=" * 60)
     
     app.run(debug=True, host='0.0.0.0', port=5000)
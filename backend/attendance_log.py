@@ -0,0 +1,221 @@
+"""
+Representación compacta del historial de asistencias de un alumno
+Cada asistencia se guarda como un instante (segundos epoch) y un código de tipo;
+la fecha, la hora y el diccionario que ve el frontend solo se generan al responder
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Dict, List, Iterator, Tuple
+
+
+# Tipos de asistencia: el código 0 es la verificación con huella (sin campo 'tipo')
+TIPO_OTRO = 'otro'  # Tipos ilegibles (datos antiguos) o que ya no caben en el registro
+_TIPOS = [None, 'manual', TIPO_OTRO]
+_TIPO_CODES = {None: 0, 'manual': 1, TIPO_OTRO: 2}
+
+
+def tipo_code(tipo: Optional[str]) -> int:
+    """
+    Devuelve el código de un tipo de asistencia, registrándolo si es nuevo
+
+    Nunca falla: un tipo que no es texto (p. ej. de un snapshot o bitácora
+    antiguos) o uno nuevo con el registro ya lleno (256 códigos) se guarda
+    como TIPO_OTRO. La API solo acepta tipos de su lista.
+    """
+    if tipo is not None and not isinstance(tipo, str):
+        return _TIPO_CODES[TIPO_OTRO]
+    code = _TIPO_CODES.get(tipo)
+    if code is None:
+        if len(_TIPOS) >= 256:
+            return _TIPO_CODES[TIPO_OTRO]
+        code = len(_TIPOS)
+        _TIPOS.append(tipo)
+        _TIPO_CODES[tipo] = code
+    return code
+
+
+def tipo_de(code: int) -> Optional[str]:
+    """Devuelve el tipo de asistencia de un código"""
+    return _TIPOS[code]
+
+
+@lru_cache(maxsize=4096)
+def _fecha_de_cuarto(cuarto: int) -> str:
+    # Todas las zonas horarias usan desfases múltiplos de 15 minutos, así que
+    # dentro de un mismo cuarto de hora la fecha local no cambia
+    return datetime.fromtimestamp(cuarto * 900).strftime('%Y-%m-%d')
+
+
+def fecha_de(ts: float) -> str:
+    """Fecha local (YYYY-MM-DD) de un instante epoch, con caché por cuarto de hora"""
+    return _fecha_de_cuarto(int(ts // 900))
+
+
+def timestamp_de_iso(timestamp: str) -> float:
+    """Convierte un timestamp ISO (hora local, como lo generaba datetime.now()) a epoch"""
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def inicio_de_fecha(fecha: str) -> float:
+    """Instante epoch del inicio (00:00 local) de una fecha YYYY-MM-DD"""
+    return datetime.strptime(fecha, '%Y-%m-%d').timestamp()
+
+
+def fin_de_fecha(fecha: str) -> float:
+    """Instante epoch del inicio del día siguiente a una fecha (los días con cambio de horario no duran 24 h)"""
+    return (datetime.strptime(fecha, '%Y-%m-%d') + timedelta(days=1)).timestamp()
+
+
+def instante_de(valor: str) -> float:
+    """Convierte un instante en segundos epoch o en formato ISO a segundos epoch"""
+    try:
+        return float(valor)
+    except ValueError:
+        return timestamp_de_iso(valor)
+
+
+def asistencia_dict(user_id: str, name: str, ts: float, tipo: Optional[str] = None) -> Dict:
+    """Construye el registro de asistencia con el formato que espera el frontend"""
+    momento = datetime.fromtimestamp(ts)
+    asistencia = {
+        'user_id': user_id,
+        'name': name,
+        'timestamp': momento.isoformat(),
+        'fecha': momento.strftime('%Y-%m-%d'),
+        'hora': momento.strftime('%H:%M:%S')
+    }
+    if tipo is not None:
+        asistencia['tipo'] = tipo
+    return asistencia
+
+
+class AttendanceLog:
+    """
+    Historial de asistencias de un alumno ordenado cronológicamente
+
+    Usa dos arreglos paralelos: instantes epoch (double) y códigos de tipo (byte),
+    unos 9 bytes por asistencia en lugar de un diccionario con cinco cadenas.
+    En el snapshot se guarda como una lista de [ts] o [ts, tipo].
+    """
+
+    __slots__ = ('ts', 'kinds')
+
+    def __init__(self):
+        self.ts = array('d')
+        self.kinds = array('B')
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, ts: float, tipo: Optional[str] = None) -> int:
+        """
+        Agrega una asistencia manteniendo el orden cronológico
+
+        Returns:
+            Posición en la que quedó la asistencia
+        """
+        code = tipo_code(tipo)
+        if not self.ts or ts >= self.ts[-1]:
+            self.ts.append(ts)
+            self.kinds.append(code)
+            return len(self.ts) - 1
+        # Llegó fuera de orden (p. ej. con la hora del cliente): insertar en su lugar
+        pos = bisect_right(self.ts, ts)
+        self.ts.insert(pos, ts)
+        self.kinds.insert(pos, code)
+        return pos
+
+    def contiene(self, ts: float) -> bool:
+        """Indica si ya hay una asistencia exactamente en el instante ts (búsqueda binaria)"""
+        i = bisect_left(self.ts, ts)
+        return i < len(self.ts) and self.ts[i] == ts
+
+    def tipo_en(self, ts: float) -> Optional[str]:
+        """Tipo de la asistencia registrada exactamente en el instante ts (None si no hay)"""
+        i = bisect_left(self.ts, ts)
+        if i < len(self.ts) and self.ts[i] == ts:
+            return _TIPOS[self.kinds[i]]
+        return None
+
+    def indices(self, desde: Optional[float] = None, hasta: Optional[float] = None,
+                despues_de: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Posiciones [i, j) de las asistencias dentro de un rango, por búsqueda binaria
+
+        Args:
+            desde: Instante mínimo (incluido)
+            hasta: Instante máximo (excluido)
+            despues_de: Solo asistencias estrictamente posteriores a este instante
+        """
+        i = 0 if desde is None else bisect_left(self.ts, desde)
+        if despues_de is not None:
+            i = max(i, bisect_right(self.ts, despues_de))
+        j = len(self.ts) if hasta is None else bisect_left(self.ts, hasta)
+        return i, max(i, j)
+
+    def rango(self, desde: Optional[float] = None, hasta: Optional[float] = None,
+              despues_de: Optional[float] = None) -> List[Tuple[float, Optional[str]]]:
+        """Lista de (ts, tipo) dentro de un rango (ver `indices`)"""
+        i, j = self.indices(desde, hasta, despues_de)
+        return [(self.ts[k], _TIPOS[self.kinds[k]]) for k in range(i, j)]
+
+    def cursor(self, j: int) -> Tuple[float, int]:
+        """
+        Cursor para continuar en la posición j (la j-1 fue la última entregada)
+
+        Es (ts de la última entregada, cuántas con ese mismo ts se entregaron),
+        así sigue siendo válido aunque se inserten asistencias antes de él.
+        """
+        ts = self.ts[j - 1]
+        return ts, j - bisect_left(self.ts, ts)
+
+    def posicion(self, cursor: Tuple[float, int]) -> int:
+        """Posición en la que continúa un cursor de `cursor()`"""
+        ts, repetidas = cursor
+        return min(len(self.ts), bisect_left(self.ts, ts) + repetidas)
+
+    def records(self) -> Iterator[Tuple[float, Optional[str]]]:
+        """Itera (ts, tipo) en orden cronológico"""
+        for ts, code in zip(self.ts, self.kinds):
+            yield ts, _TIPOS[code]
+
+    def to_dicts(self, user_id: str, name: str, i: int = 0, j: Optional[int] = None) -> List[Dict]:
+        """Convierte el historial (o las posiciones [i, j)) al formato de la API"""
+        if j is None:
+            j = len(self.ts)
+        return [
+            asistencia_dict(user_id, name, self.ts[k], _TIPOS[self.kinds[k]])
+            for k in range(i, j)
+        ]
+
+    def fechas(self) -> set:
+        """Conjunto de fechas (YYYY-MM-DD) con al menos una asistencia"""
+        return {fecha_de(ts) for ts in self.ts}
+
+    def to_json(self) -> List:
+        """Formato compacto para el snapshot"""
+        return [
+            [ts] if code == 0 else [ts, _TIPOS[code]]
+            for ts, code in zip(self.ts, self.kinds)
+        ]
+
+    @classmethod
+    def from_json(cls, data: List) -> 'AttendanceLog':
+        """
+        Crea el historial desde el snapshot
+
+        Acepta el formato compacto ([ts] / [ts, tipo]) y el formato anterior
+        (diccionarios con timestamp, fecha, hora y tipo).
+        """
+        log = cls()
+        for item in data or []:
+            if isinstance(item, dict):
+                if not item.get('timestamp'):
+                    continue
+                log.append(timestamp_de_iso(item['timestamp']), item.get('tipo'))
+            else:
+                log.append(float(item[0]), item[1] if len(item) > 1 else None)
+        return log
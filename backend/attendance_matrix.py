@@ -0,0 +1,147 @@
+"""
+Índice de asistencia alumno × fecha con mapas de bits
+Cada día de clases se asigna a una columna y cada alumno a una fila; las consultas
+de reportes, estadísticas y ausencias se resuelven con operaciones de bits
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from attendance_log import AttendanceLog, fecha_de
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Itera las posiciones de los bits encendidos, de menor a mayor"""
+    while bits:
+        bajo = bits & -bits
+        yield bajo.bit_length() - 1
+        bits ^= bajo
+
+
+def contar_bits(bits: int) -> int:
+    """Número de bits encendidos"""
+    return bin(bits).count('1')
+
+
+class AttendanceMatrix:
+    """
+    Matriz de asistencia mantenida en memoria
+
+    - Por alumno: un entero cuyos bits son las columnas (fechas) en que asistió.
+    - Por fecha: un entero cuyos bits son las filas (alumnos) que asistieron.
+    - Por fecha: el número de registros de asistencia (un alumno puede tener
+      más de uno en el mismo día).
+
+    Las columnas se asignan en el orden en que aparecen las fechas y no se
+    liberan; las filas de alumnos eliminados se reutilizan.
+    """
+
+    def __init__(self):
+        self._fechas = []  # columna -> fecha
+        self._columnas = {}  # fecha -> columna
+        self._dias = []  # columna -> bits de filas presentes
+        self._registros = []  # columna -> número de asistencias
+        self._filas = {}  # user_id -> fila
+        self._libres = []  # filas liberadas
+        self._alumnos = {}  # user_id -> bits de columnas con asistencia
+
+    def _columna(self, fecha: str) -> int:
+        col = self._columnas.get(fecha)
+        if col is None:
+            col = len(self._fechas)
+            self._fechas.append(fecha)
+            self._columnas[fecha] = col
+            self._dias.append(0)
+            self._registros.append(0)
+        return col
+
+    def _fila(self, user_id: str) -> int:
+        fila = self._filas.get(user_id)
+        if fila is None:
+            fila = self._libres.pop() if self._libres else len(self._filas)
+            self._filas[user_id] = fila
+            self._alumnos[user_id] = 0
+        return fila
+
+    def add(self, user_id: str, ts: float):
+        """Marca una asistencia del alumno en la fecha del instante `ts`"""
+        fila = self._fila(user_id)
+        col = self._columna(fecha_de(ts))
+        self._alumnos[user_id] |= 1 << col
+        self._dias[col] |= 1 << fila
+        self._registros[col] += 1
+
+    def add_log(self, user_id: str, log: AttendanceLog):
+        """Marca todas las asistencias de un historial"""
+        for ts in log.ts:
+            self.add(user_id, ts)
+
+    def remove_user(self, user_id: str, log: Optional[AttendanceLog] = None):
+        """
+        Quita a un alumno de la matriz
+
+        Args:
+            user_id: ID del alumno
+            log: Historial del alumno, para descontar sus registros por fecha
+        """
+        fila = self._filas.pop(user_id, None)
+        if fila is None:
+            return
+        bits = self._alumnos.pop(user_id)
+        mascara = ~(1 << fila)
+        for col in iter_bits(bits):
+            self._dias[col] &= mascara
+        for ts in (log.ts if log else ()):
+            col = self._columnas.get(fecha_de(ts))
+            if col is not None:
+                self._registros[col] -= 1
+        self._libres.append(fila)
+
+    def bits_alumno(self, user_id: str) -> int:
+        """Bits de las columnas en que asistió el alumno (0 si no tiene asistencias)"""
+        return self._alumnos.get(user_id, 0)
+
+    def fechas_de(self, user_id: str) -> set:
+        """Fechas en que asistió un alumno"""
+        return {self._fechas[col] for col in iter_bits(self._alumnos.get(user_id, 0))}
+
+    def columnas(self, bits: int) -> List[Tuple[str, int]]:
+        """
+        Fechas de las columnas indicadas por `bits`, ordenadas cronológicamente
+
+        Returns:
+            Lista de (fecha, columna)
+        """
+        return sorted((self._fechas[col], col) for col in iter_bits(bits))
+
+    def presentes(self, fecha: str, user_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """Alumnos (de `user_ids`, o todos) que asistieron en una fecha"""
+        col = self._columnas.get(fecha)
+        if col is None:
+            return []
+        dia = self._dias[col]
+        if user_ids is None:
+            return [uid for uid, fila in self._filas.items() if (dia >> fila) & 1]
+        return [uid for uid in user_ids if uid in self._filas and (dia >> self._filas[uid]) & 1]
+
+    def ausentes(self, fecha: str, user_ids: Iterable[str]) -> List[str]:
+        """Alumnos de `user_ids` que no asistieron en una fecha"""
+        col = self._columnas.get(fecha)
+        dia = self._dias[col] if col is not None else 0
+        return [
+            uid for uid in user_ids
+            if uid not in self._filas or not (dia >> self._filas[uid]) & 1
+        ]
+
+    def conteo_por_fecha(self) -> Dict[str, int]:
+        """Número de asistencias registradas en cada fecha"""
+        return {
+            self._fechas[col]: total
+            for col, total in enumerate(self._registros) if total
+        }
+
+    def alumnos_por_fecha(self) -> Dict[str, int]:
+        """Número de alumnos distintos que asistieron en cada fecha"""
+        return {
+            self._fechas[col]: contar_bits(dia)
+            for col, dia in enumerate(self._dias) if dia
+        }
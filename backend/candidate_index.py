@@ -0,0 +1,247 @@
+"""
+Índice de candidatos para acotar la identificación 1:N
+Al inscribir una huella se guardan los hashes de sus tripletas de minucias
+cercanas: distancias y direcciones cuantizadas, medidas respecto a la minucia
+de origen, así que no cambian al girar o desplazar el dedo. Al identificar,
+las huellas que comparten más tripletas con el probe forman la lista corta
+que se compara con el matcher; el resto de la galería se descarta
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from minutiae_matcher import np, parse_iso_19794_2
+
+
+class CandidateIndex:
+    """
+    Índice invertido hash de tripleta de minucias -> alumnos
+
+    Las huellas cuyo template no se puede leer (p. ej. formatos propios del
+    SDK) no se indexan y se incluyen siempre entre los candidatos, así que el
+    índice nunca las descarta. Lleva la cuenta de la poda y de los fallos del
+    filtro en las búsquedas auditadas contra la galería completa.
+
+    Los hashes de cada alumno se guardan aparte y las listas invertidas se
+    reconstruyen en arreglos ordenados en la primera consulta después de una
+    inscripción o baja; así la votación de una consulta es un solo bincount.
+    """
+
+    def __init__(self, radio: float = 4.0, celda_distancia: float = 0.5, celdas_angulo: int = 16,
+                 max_candidatos: int = 50, min_votos: int = 1):
+        """
+        Args:
+            radio: Milímetros máximos entre la minucia de origen y las otras dos de una tripleta
+            celda_distancia: Milímetros de cada celda de distancia
+            celdas_angulo: Celdas en que se divide la vuelta para las direcciones
+            max_candidatos: Candidatos máximos por consulta
+            min_votos: Tripletas compartidas mínimas para ser candidato
+        """
+        if np is None:
+            raise RuntimeError("El índice de candidatos requiere NumPy (pip install numpy)")
+        self.radio = radio
+        self.celda_distancia = celda_distancia
+        self.celdas_angulo = celdas_angulo
+        self.max_candidatos = max_candidatos
+        self.min_votos = min_votos
+        self._celdas_distancia = int(np.ceil(radio / celda_distancia)) + 1
+        self._claves = {}        # user_id -> hashes (np.ndarray ordenado, sin repetidos)
+        self._sin_indice = set()
+        self._listas = None      # (hashes ordenados, posición del alumno, IDs, tamaños) o None si hay cambios
+        self.consultas = 0
+        self.comparados = 0      # Candidatos devueltos en todas las consultas
+        self.galeria = 0         # Tamaño de la galería sumado en todas las consultas
+        self.auditadas = 0
+        self.fallos = 0
+
+    def __len__(self) -> int:
+        return len(self._claves) + len(self._sin_indice)
+
+    def _rasgos(self, template: bytes) -> Optional['np.ndarray']:
+        """
+        Rasgos de las tripletas de una huella, en unidades de celda (sin cuantizar)
+
+        Una tripleta es una minucia de origen c con dos minucias a y b a menos
+        de `radio` de ella (en los dos órdenes, así que no hace falta decidir
+        cuál va primero).
+
+        Returns:
+            Arreglo (T, 6): distancias c-a y c-b, direcciones de c->a y c->b y
+            direcciones de a y b, todas respecto a la de c; None si el template
+            no se puede leer
+        """
+        try:
+            minucias = parse_iso_19794_2(template)
+        except (ValueError, TypeError):
+            return None
+        x, y, t = minucias[:, 0], minucias[:, 1], minucias[:, 2]
+        dx, dy = x[None, :] - x[:, None], y[None, :] - y[:, None]
+        distancia = np.hypot(dx, dy)
+        cerca = (distancia <= self.radio) & (distancia > 0)
+        c, a, b = np.nonzero(cerca[:, :, None] & cerca[:, None, :])
+        distintas = a != b
+        c, a, b = c[distintas], a[distintas], b[distintas]
+        dos_pi = 2 * np.pi
+        por_celda = self.celdas_angulo / dos_pi
+        direccion = np.mod(np.arctan2(dy, dx) - t[:, None], dos_pi) * por_celda
+        return np.stack([
+            distancia[c, a] / self.celda_distancia,
+            distancia[c, b] / self.celda_distancia,
+            direccion[c, a],
+            direccion[c, b],
+            np.mod(t[a] - t[c], dos_pi) * por_celda,
+            np.mod(t[b] - t[c], dos_pi) * por_celda,
+        ], axis=1)
+
+    def _hash(self, celdas: 'np.ndarray') -> 'np.ndarray':
+        """Hash entero de rasgos ya cuantizados (última dimensión = 6)"""
+        celdas = celdas.astype(np.int64)
+        clave = np.clip(celdas[..., 0], 0, self._celdas_distancia - 1)
+        clave = clave * self._celdas_distancia + np.clip(celdas[..., 1], 0, self._celdas_distancia - 1)
+        for columna in range(2, 6):
+            clave = clave * self.celdas_angulo + np.mod(celdas[..., columna], self.celdas_angulo)
+        return clave
+
+    def _hashes_consulta(self, rasgos: 'np.ndarray') -> 'np.ndarray':
+        """
+        Hashes del probe, sin repetidos
+
+        Cada rasgo se busca en sus dos celdas más cercanas, así que una
+        diferencia de hasta media celda con la huella inscrita no rompe la
+        coincidencia.
+        """
+        dimensiones = rasgos.shape[1]
+        base = np.floor(rasgos - 0.5)
+        variantes = 1 << dimensiones
+        desplazamientos = (np.arange(variantes)[:, None] >> np.arange(dimensiones)[None, :]) & 1
+        return np.unique(self._hash(base[:, None, :] + desplazamientos[None, :, :]))
+
+    def agregar(self, user_id: str, template: bytes):
+        """Indexa la huella de un alumno (reemplaza la anterior si la había)"""
+        self.quitar(user_id)
+        rasgos = self._rasgos(template)
+        if rasgos is None:
+            self._sin_indice.add(user_id)
+        else:
+            self._claves[user_id] = np.unique(self._hash(np.floor(rasgos)))
+        self._listas = None
+
+    def quitar(self, user_id: str):
+        """Saca a un alumno del índice"""
+        if self._claves.pop(user_id, None) is not None or user_id in self._sin_indice:
+            self._sin_indice.discard(user_id)
+            self._listas = None
+
+    def construir(self, huellas: Iterable[Tuple[str, bytes]]):
+        """Reconstruye el índice con (user_id, template) de toda la galería"""
+        self._claves = {}
+        self._sin_indice = set()
+        for user_id, template in huellas:
+            self.agregar(user_id, template)
+
+    def _get_listas(self):
+        """Listas invertidas como arreglos ordenados por hash (se rehacen tras un cambio)"""
+        if self._listas is None:
+            ids = list(self._claves)
+            tamanos = np.array([len(self._claves[user_id]) for user_id in ids], dtype=np.int64)
+            if ids:
+                hashes = np.concatenate([self._claves[user_id] for user_id in ids])
+            else:
+                hashes = np.zeros(0, dtype=np.int64)
+            posiciones = np.repeat(np.arange(len(ids)), tamanos)
+            orden = np.argsort(hashes, kind='stable')
+            self._listas = (hashes[orden], posiciones[orden], ids, tamanos)
+        return self._listas
+
+    def candidatos(self, probe: bytes) -> Optional[List[str]]:
+        """
+        Lista corta de alumnos a comparar con el probe
+
+        Returns:
+            IDs ordenados de más a menos parecidos según el índice (seguidos de
+            los no indexados), o None si el probe no se puede leer y hay que
+            recorrer toda la galería
+        """
+        rasgos = self._rasgos(probe)
+        self.consultas += 1
+        self.galeria += len(self)
+        if rasgos is None:
+            self.comparados += len(self)
+            return None
+        hashes, posiciones, ids, tamanos = self._get_listas()
+        elegidos = []
+        if ids and len(rasgos):
+            consulta = self._hashes_consulta(rasgos)
+            inicio = np.searchsorted(hashes, consulta, side='left')
+            fin = np.searchsorted(hashes, consulta, side='right')
+            largo = fin - inicio
+            # Índices de todas las entradas de las listas que tocan el probe
+            tocadas = np.repeat(inicio - np.cumsum(largo) + largo, largo) + np.arange(largo.sum())
+            votos = np.bincount(posiciones[tocadas], minlength=len(ids))
+            # Las huellas con más minucias comparten más hashes por azar: normalizar
+            parecido = votos / np.sqrt(np.maximum(tamanos, 1))
+            k = min(self.max_candidatos, len(ids))
+            mejores = np.argpartition(-parecido, k - 1)[:k]
+            mejores = mejores[np.argsort(-parecido[mejores], kind='stable')]
+            elegidos = [ids[i] for i in mejores.tolist() if votos[i] >= self.min_votos]
+        elegidos.extend(self._sin_indice)
+        self.comparados += len(elegidos)
+        return elegidos
+
+    def registrar_auditoria(self, esperado: Optional[str], candidatos: Sequence[str]):
+        """
+        Anota el resultado de comparar el filtro contra una búsqueda completa
+
+        Args:
+            esperado: Mejor coincidencia de la búsqueda completa (None = ninguna)
+            candidatos: Lista corta que devolvió el filtro
+        """
+        if esperado is None:
+            return
+        self.auditadas += 1
+        if esperado not in candidatos:
+            self.fallos += 1
+
+    def estadisticas(self) -> Dict:
+        """
+        Poda y fallos acumulados
+
+        Returns:
+            'poda': fracción de la galería descartada por consulta;
+            'tasa_fallo': fracción de búsquedas auditadas cuya coincidencia
+            quedó fuera de la lista corta (None si no hay auditorías)
+        """
+        return {
+            'indexadas': len(self._claves),
+            'sin_indice': len(self._sin_indice),
+            'consultas': self.consultas,
+            'poda': 1 - self.comparados / self.galeria if self.galeria else 0.0,
+            'auditadas': self.auditadas,
+            'fallos': self.fallos,
+            'tasa_fallo': self.fallos / self.auditadas if self.auditadas else None
+        }
+
+    def evaluar(self, pruebas: Iterable[Tuple[bytes, str]]) -> Dict:
+        """
+        Mide el filtro con probes de identidad conocida, sin tocar las estadísticas
+
+        Args:
+            pruebas: (probe, user_id esperado)
+
+        Returns:
+            'pruebas', 'poda' media y 'tasa_fallo' (esperado fuera de la lista corta)
+        """
+        contadores = (self.consultas, self.comparados, self.galeria)
+        total = fallos = 0
+        descartados = 0.0
+        for probe, esperado in pruebas:
+            elegidos = self.candidatos(probe)
+            total += 1
+            if elegidos is not None:
+                descartados += 1 - len(elegidos) / max(len(self), 1)
+                fallos += esperado not in elegidos
+        self.consultas, self.comparados, self.galeria = contadores
+        return {
+            'pruebas': total,
+            'poda': descartados / total if total else 0.0,
+            'tasa_fallo': fallos / total if total else 0.0
+        }
@@ -0,0 +1,181 @@
+"""
+Almacén de challenges WebAuthn emitidos por el servidor
+Cada challenge se puede usar una sola vez y caduca tras `ttl` segundos; el
+número de challenges pendientes está acotado y, si se llena, se descartan los
+más antiguos. Hay una versión en memoria (un proceso) y otra en SQLite para
+compartirla entre varios procesos del servidor
+"""
+
+import base64
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def nuevo_challenge() -> str:
+    """Challenge aleatorio de 32 bytes en base64url sin relleno"""
+    return base64.urlsafe_b64encode(secrets.token_bytes(32)).decode('utf-8').rstrip('=')
+
+
+class ChallengeStore:
+    """
+    Challenges pendientes en memoria
+
+    Todos caducan tras el mismo `ttl`, así que el orden de emisión es también
+    el orden de caducidad: un OrderedDict sirve a la vez de diccionario y de
+    cola, y emitir, consumir y purgar cuestan O(1) amortizado. Un challenge
+    emitido con un ttl propio más largo (sesiones de pase de lista) solo retrasa
+    la purga de los que vienen detrás; consumir siempre revisa la caducidad y el
+    límite sigue acotando el total.
+    """
+
+    def __init__(self, ttl: float = 120, max_challenges: int = 20000):
+        """
+        Args:
+            ttl: Segundos de validez de cada challenge
+            max_challenges: Máximo de challenges pendientes (se descartan los más antiguos)
+        """
+        self.ttl = ttl
+        self.max_challenges = max_challenges
+        self._lock = threading.Lock()
+        self._pendientes = OrderedDict()  # challenge -> (expira, contexto)
+        self.descartados = 0  # Expulsados por el límite antes de caducar
+
+    def __len__(self) -> int:
+        return len(self._pendientes)
+
+    def _purgar(self, ahora: float):
+        """Quita los caducados del frente de la cola (con el candado tomado)"""
+        while self._pendientes:
+            challenge, (expira, _) = next(iter(self._pendientes.items()))
+            if expira >= ahora:
+                break
+            del self._pendientes[challenge]
+
+    def emitir(self, contexto: Optional[str] = None, ttl: Optional[float] = None) -> str:
+        """
+        Crea y registra un challenge
+
+        Args:
+            contexto: Operación para la que se emite (p. ej. 'registro:<user_id>');
+                al consumirlo se exige el mismo contexto
+            ttl: Segundos de validez de este challenge (None = el del almacén)
+
+        Returns:
+            Challenge en base64url
+        """
+        challenge = nuevo_challenge()
+        ahora = time.monotonic()
+        with self._lock:
+            self._purgar(ahora)
+            while len(self._pendientes) >= self.max_challenges:
+                self._pendientes.popitem(last=False)
+                self.descartados += 1
+            self._pendientes[challenge] = (ahora + (self.ttl if ttl is None else ttl), contexto)
+        return challenge
+
+    def consumir(self, challenge: str, contexto: Optional[str] = None) -> bool:
+        """
+        Valida y elimina un challenge en una sola operación
+
+        Args:
+            challenge: Challenge recibido del cliente
+            contexto: Contexto esperado (None = no comprobarlo)
+
+        Returns:
+            True si estaba pendiente, no había caducado y coincide el contexto
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            registro = self._pendientes.get(challenge)
+            if registro is None:
+                return False
+            expira, emitido_para = registro
+            if contexto is not None and emitido_para != contexto:
+                return False
+            del self._pendientes[challenge]
+            return expira >= ahora
+
+    def close(self):
+        """No hay recursos que liberar"""
+        pass
+
+
+class SQLiteChallengeStore:
+    """
+    Challenges pendientes en una base SQLite compartida entre procesos
+
+    Consumir es un único DELETE, así que dos procesos no pueden aceptar el
+    mismo challenge. Los caducados se borran al emitir, por el índice de
+    caducidad, y el límite se revisa cada `revisar_cada` emisiones.
+    """
+
+    def __init__(self, db_file: str = "challenges.db", ttl: float = 120,
+                 max_challenges: int = 20000, revisar_cada: int = 100):
+        """
+        Args:
+            db_file: Archivo SQLite compartido
+            ttl: Segundos de validez de cada challenge
+            max_challenges: Máximo de challenges pendientes (se descartan los más antiguos)
+            revisar_cada: Emisiones entre comprobaciones del límite
+        """
+        self.ttl = ttl
+        self.max_challenges = max_challenges
+        self.revisar_cada = revisar_cada
+        self._emitidos = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS challenges ("
+                "challenge TEXT PRIMARY KEY, expira REAL NOT NULL, contexto TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_challenges_expira ON challenges(expira)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM challenges WHERE expira >= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def emitir(self, contexto: Optional[str] = None, ttl: Optional[float] = None) -> str:
+        """Crea y registra un challenge (ver ChallengeStore.emitir)"""
+        challenge = nuevo_challenge()
+        # Varios procesos comparten la tabla: se usa el reloj de pared
+        ahora = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM challenges WHERE expira < ?", (ahora,))
+            self.conn.execute(
+                "INSERT INTO challenges (challenge, expira, contexto) VALUES (?, ?, ?)",
+                (challenge, ahora + (self.ttl if ttl is None else ttl), contexto)
+            )
+            self._emitidos += 1
+            if self._emitidos % self.revisar_cada == 0:
+                sobrantes = self.conn.execute("SELECT COUNT(*) FROM challenges").fetchone()[0] - self.max_challenges
+                if sobrantes > 0:
+                    self.conn.execute(
+                        "DELETE FROM challenges WHERE challenge IN "
+                        "(SELECT challenge FROM challenges ORDER BY expira LIMIT ?)",
+                        (sobrantes,)
+                    )
+        return challenge
+
+    def consumir(self, challenge: str, contexto: Optional[str] = None) -> bool:
+        """Valida y elimina un challenge con un solo DELETE (ver ChallengeStore.consumir)"""
+        consulta = "DELETE FROM challenges WHERE challenge = ? AND expira >= ?"
+        parametros = [challenge, time.time()]
+        if contexto is not None:
+            consulta += " AND contexto = ?"
+            parametros.append(contexto)
+        with self._lock, self.conn:
+            return self.conn.execute(consulta, parametros).rowcount == 1
+
+    def close(self):
+        """Cierra la conexión a SQLite"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,182 @@
+"""
+Deduplicación de asistencias repetidas de un mismo alumno
+Un segundo toque de huella dentro del mismo día, del mismo periodo de clase o
+antes de un intervalo mínimo no genera otra asistencia. El día más reciente de
+cada alumno se consulta en O(1); los días anteriores (lotes sin conexión) se
+buscan por bisección en su historial ordenado
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from attendance_log import AttendanceLog, fecha_de
+
+
+POLITICAS = ('ninguna', 'diaria', 'periodo', 'intervalo')
+
+
+def _segundos(hora: str) -> int:
+    """Segundos desde la medianoche de una hora HH:MM o HH:MM:SS"""
+    partes = [int(p) for p in hora.split(':')]
+    while len(partes) < 3:
+        partes.append(0)
+    return partes[0] * 3600 + partes[1] * 60 + partes[2]
+
+
+class CheckinIndex:
+    """
+    Política de deduplicación y última asistencia por (alumno, fecha)
+
+    Políticas:
+        ninguna: toda asistencia se registra
+        diaria: una asistencia por alumno y día
+        periodo: una por alumno y periodo de clase; los huecos entre periodos
+            cuentan como un periodo más
+        intervalo: se descarta la que llega a menos de `intervalo` segundos
+            de otra del mismo alumno
+    """
+
+    def __init__(self, politica: str = 'ninguna', periodos: Iterable[Tuple[str, str]] = (),
+                 intervalo: float = 0):
+        """
+        Args:
+            politica: Una de POLITICAS
+            periodos: Periodos de clase como (inicio, fin) en HH:MM (solo politica='periodo')
+            intervalo: Segundos mínimos entre asistencias (solo politica='intervalo')
+        """
+        if politica not in POLITICAS:
+            raise ValueError(f"Política de deduplicación desconocida: {politica}")
+        if politica == 'periodo' and not periodos:
+            raise ValueError("La política 'periodo' requiere los periodos de clase")
+        if politica == 'intervalo' and intervalo <= 0:
+            raise ValueError("La política 'intervalo' requiere un intervalo mayor que 0")
+        self.politica = politica
+        self.intervalo = intervalo
+        # Límites (segundos desde la medianoche) de los tramos del día
+        limites = {0, 86400}
+        if politica == 'periodo':
+            for inicio, fin in periodos:
+                limites.update((_segundos(inicio), _segundos(fin)))
+        self._limites = sorted(limites)
+        self._recientes = {}  # user_id -> (fecha, {tramo: último ts})
+
+    @property
+    def activa(self) -> bool:
+        return self.politica != 'ninguna'
+
+    def _tramo(self, ts: float) -> Tuple[str, int]:
+        """(fecha, tramo del día) de un instante; con 'intervalo' el tramo es siempre 0"""
+        if self.politica != 'periodo':
+            return fecha_de(ts), 0
+        momento = datetime.fromtimestamp(ts)
+        segundos = momento.hour * 3600 + momento.minute * 60 + momento.second
+        return momento.strftime('%Y-%m-%d'), bisect_right(self._limites, segundos) - 1
+
+    def _rango(self, ts: float, tramo: int) -> Tuple[float, float]:
+        """Instantes [desde, hasta) en los que otra asistencia sería repetida"""
+        if self.politica == 'intervalo':
+            return ts - self.intervalo, ts + self.intervalo
+        medianoche = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (
+            (medianoche + timedelta(seconds=self._limites[tramo])).timestamp(),
+            (medianoche + timedelta(seconds=self._limites[tramo + 1])).timestamp()
+        )
+
+    def _choca(self, previo: float, ts: float) -> bool:
+        """Con 'intervalo', indica si dos asistencias están a menos del intervalo mínimo"""
+        return abs(ts - previo) < self.intervalo
+
+    def repetida(self, user_id: str, ts: float, log: Optional[AttendanceLog],
+                 pendientes: Iterable[float] = ()) -> Optional[float]:
+        """
+        Busca una asistencia previa del alumno que haga repetida la del instante ts
+
+        Args:
+            user_id: ID del alumno
+            ts: Instante de la nueva asistencia
+            log: Historial del alumno (para fechas anteriores a la más reciente)
+            pendientes: Instantes aceptados en el mismo lote que aún no están en el historial
+
+        Returns:
+            Instante de la asistencia previa, o None si la nueva debe registrarse
+        """
+        if not self.activa:
+            return None
+        if self.politica == 'intervalo':
+            return self._repetida_en_intervalo(user_id, ts, log, pendientes)
+        fecha, tramo = self._tramo(ts)
+        for previo in pendientes:
+            if self._tramo(previo) == (fecha, tramo):
+                return previo
+        reciente = self._recientes.get(user_id)
+        if reciente is not None and reciente[0] == fecha:
+            # Ya hay una del mismo tramo de hoy, o es la primera del tramo
+            return reciente[1].get(tramo)
+        elif reciente is not None and fecha > reciente[0]:
+            # Primera asistencia de un día nuevo
+            return None
+        # Fecha anterior (o asistencia fuera de orden): buscar en el historial
+        if not log:
+            return None
+        desde, hasta = self._rango(ts, tramo)
+        i, j = log.indices(desde, hasta)
+        return log.ts[i] if i < j else None
+
+    def _repetida_en_intervalo(self, user_id: str, ts: float, log: Optional[AttendanceLog],
+                               pendientes: Iterable[float]) -> Optional[float]:
+        """repetida() con la política 'intervalo': se compara con el último instante sin importar el día"""
+        for previo in pendientes:
+            if self._choca(previo, ts):
+                return previo
+        reciente = self._recientes.get(user_id)
+        if reciente is not None:
+            previo = reciente[1][0]
+            if self._choca(previo, ts):
+                return previo
+            if ts >= previo:
+                # Posterior a la última asistencia y ya pasó el intervalo
+                return None
+        # Asistencia fuera de orden: buscar en el historial
+        if not log:
+            return None
+        i, j = log.indices(*self._rango(ts, 0))
+        # Excluir el extremo inferior exacto (a `intervalo` segundos justos)
+        while i < j and ts - log.ts[i] >= self.intervalo:
+            i += 1
+        return log.ts[i] if i < j else None
+
+    def registrar(self, user_id: str, ts: float):
+        """Registra una asistencia aceptada (el último instante del día más reciente se conserva)"""
+        if not self.activa:
+            return
+        fecha, tramo = self._tramo(ts)
+        reciente = self._recientes.get(user_id)
+        if reciente is None or fecha > reciente[0]:
+            self._recientes[user_id] = (fecha, {tramo: ts})
+        elif fecha == reciente[0]:
+            tramos = reciente[1]
+            if ts >= tramos.get(tramo, ts):
+                tramos[tramo] = ts
+
+    def quitar(self, user_id: str):
+        """Olvida a un alumno eliminado"""
+        self._recientes.pop(user_id, None)
+
+    def construir(self, fingerprints: Dict[str, Dict]):
+        """Reconstruye el índice con el día más reciente del historial de cada alumno"""
+        self._recientes = {}
+        if not self.activa:
+            return
+        for user_id, user_data in fingerprints.items():
+            log = user_data.get('asistencias')
+            if not log:
+                continue
+            ultima = fecha_de(log.ts[-1])
+            recientes = []
+            for k in range(len(log.ts) - 1, -1, -1):
+                if fecha_de(log.ts[k]) != ultima:
+                    break
+                recientes.append(log.ts[k])
+            for ts in reversed(recientes):
+                self.registrar(user_id, ts)
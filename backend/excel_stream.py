@@ -0,0 +1,324 @@
+"""
+Generación de archivos Excel (XLSX) en streaming
+Escribe el libro directamente como ZIP sobre un flujo no posicionable, fila por
+fila, con una tabla de estilos compartida; no usa archivos temporales y la memoria
+no crece con el tamaño del reporte
+"""
+
+import re
+import struct
+import zipfile
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Índices de los estilos de celda definidos en ESTILOS_XML (cellXfs)
+ESTILO_TITULO = 1
+ESTILO_ENCABEZADO = 2
+ESTILO_NOMBRE = 3
+ESTILO_ASISTIO = 4
+ESTILO_FALTO = 5
+
+ESTILOS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="4">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="14"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><sz val="12"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="6">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FFD9E1F2"/><bgColor rgb="FFD9E1F2"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF366092"/><bgColor rgb="FF366092"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FFC6EFCE"/><bgColor rgb="FFC6EFCE"/></patternFill></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FFFFC7CE"/><bgColor rgb="FFFFC7CE"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="6">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="2" fillId="3" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1" applyAlignment="1">'
+    '<alignment vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="3" fillId="4" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '<xf numFmtId="0" fontId="3" fillId="5" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# Caracteres de control que no admite XML 1.0
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Caracteres que Excel no admite en el nombre de una hoja
+_NOMBRE_HOJA_INVALIDO = re.compile(r'[\[\]:*?/\\]')
+
+
+def columna_letra(n: int) -> str:
+    """Letra de columna de Excel para un índice que empieza en 1 (1 -> A, 27 -> AA)"""
+    letras = ''
+    while n > 0:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _texto(valor: str) -> str:
+    return escape(_CONTROL.sub('', valor))
+
+
+def celda_texto(ref: str, valor: str, estilo: int = 0) -> str:
+    """XML de una celda con texto en línea"""
+    return f'<c r="{ref}" s="{estilo}" t="inlineStr"><is><t xml:space="preserve">{_texto(valor)}</t></is></c>'
+
+
+def nombre_hoja(nombre: str, usados: Optional[set] = None) -> str:
+    """Ajusta un nombre a las reglas de Excel (31 caracteres, sin []:*?/\\, único)"""
+    base = _NOMBRE_HOJA_INVALIDO.sub('_', _CONTROL.sub('', nombre)).strip("'") or 'Hoja'
+    candidato = base[:31]
+    if usados is not None:
+        n = 2
+        while candidato.lower() in usados:
+            sufijo = f" ({n})"
+            candidato = base[:31 - len(sufijo)] + sufijo
+            n += 1
+        usados.add(candidato.lower())
+    return candidato
+
+
+def hoja_asistencias(titulo: str, fechas: List[str],
+                     alumnos: Iterable[Tuple[str, Iterable[bool]]],
+                     total_alumnos: Optional[int] = None) -> Iterator[str]:
+    """
+    XML de una hoja de asistencias, generado fila por fila
+
+    Fila 1: título; fila 2: 'Alumno' y las fechas; después un alumno por fila
+    con '*' (asistió) o '/' (no asistió) en cada fecha.
+
+    Args:
+        titulo: Texto del título de la hoja
+        fechas: Fechas de las columnas, en orden
+        alumnos: (nombre, asistió en cada fecha) por alumno, en el orden de salida
+        total_alumnos: Número de alumnos, si se conoce, para declarar el rango de la hoja
+    """
+    letras = [columna_letra(i) for i in range(2, len(fechas) + 2)]
+    ultima = columna_letra(len(fechas) + 1)
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<worksheet xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}">'
+    )
+    if total_alumnos is not None:
+        yield f'<dimension ref="A1:{ultima}{total_alumnos + 2}"/>'
+    yield '<cols><col min="1" max="1" width="30" customWidth="1"/>'
+    if fechas:
+        yield f'<col min="2" max="{len(fechas) + 1}" width="12" customWidth="1"/>'
+    yield '</cols><sheetData>'
+
+    # Título (se combina con el resto de la fila al final de la hoja)
+    yield '<row r="1">' + celda_texto('A1', titulo, ESTILO_TITULO) + '</row>'
+
+    # Encabezados
+    yield '<row r="2">' + celda_texto('A2', 'Alumno', ESTILO_ENCABEZADO)
+    yield ''.join(celda_texto(f'{letra}2', fecha, ESTILO_ENCABEZADO) for letra, fecha in zip(letras, fechas))
+    yield '</row>'
+
+    # Las marcas son iguales en todas las celdas; solo cambia la referencia
+    asistio = f'" s="{ESTILO_ASISTIO}" t="inlineStr"><is><t>*</t></is></c>'
+    falto = f'" s="{ESTILO_FALTO}" t="inlineStr"><is><t>/</t></is></c>'
+    for fila, (nombre, marcas) in enumerate(alumnos, start=3):
+        partes = [f'<row r="{fila}">', celda_texto(f'A{fila}', nombre, ESTILO_NOMBRE)]
+        for letra, presente in zip(letras, marcas):
+            partes.append(f'<c r="{letra}{fila}')
+            partes.append(asistio if presente else falto)
+        partes.append('</row>')
+        yield ''.join(partes)
+
+    yield '</sheetData>'
+    if fechas:
+        yield f'<mergeCells count="1"><mergeCell ref="A1:{ultima}1"/></mergeCells>'
+    yield '</worksheet>'
+
+
+class _Salida:
+    """Flujo de solo escritura que acumula los bytes hasta que se recogen"""
+
+    def __init__(self):
+        self._partes = []
+        self.pendientes = 0
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self.pendientes += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def recoger(self) -> bytes:
+        datos = b''.join(self._partes)
+        self._partes = []
+        self.pendientes = 0
+        return datos
+
+
+def stream_xlsx(hojas: Iterable[Tuple[str, Iterable[str]]], bloque: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Genera un libro XLSX como una secuencia de bloques de bytes
+
+    Cada hoja se comprime conforme se producen sus filas y los bytes se
+    entregan en cuanto se acumula `bloque`; sirve como cuerpo de una
+    respuesta en streaming.
+
+    Args:
+        hojas: (nombre de la hoja, fragmentos XML de la hoja) por hoja
+        bloque: Tamaño aproximado de cada bloque entregado
+    """
+    salida = _Salida()
+    usados = set()
+    nombres = []
+    # `salida` no permite seek: zipfile escribe los tamaños después de cada entrada
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, fragmentos in hojas:
+            nombres.append(nombre_hoja(nombre, usados))
+            with zf.open(f'xl/worksheets/sheet{len(nombres)}.xml', 'w') as destino:
+                for fragmento in fragmentos:
+                    destino.write(fragmento.encode('utf-8'))
+                    if salida.pendientes >= bloque:
+                        yield salida.recoger()
+            if salida.pendientes >= bloque:
+                yield salida.recoger()
+
+        if not nombres:
+            raise ValueError("Un libro de Excel necesita al menos una hoja")
+        for ruta, contenido in _partes_libro(nombres):
+            zf.writestr(ruta, contenido)
+    yield salida.recoger()
+
+
+def escribir_xlsx(destino, hojas: Iterable[Tuple[str, Iterable[str]]]):
+    """Escribe un libro XLSX completo en un archivo abierto en modo binario"""
+    for datos in stream_xlsx(hojas):
+        destino.write(datos)
+
+
+def comprimir_parte(fragmentos: Iterable[str]) -> Tuple[bytes, int, int]:
+    """
+    Comprime una parte del libro (p. ej. el XML de una hoja) por separado
+
+    Permite generar las hojas en otros procesos y unirlas después con
+    `escribir_xlsx_comprimido` sin volver a comprimirlas.
+
+    Returns:
+        (datos deflate, CRC-32, tamaño sin comprimir)
+    """
+    compresor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    bloques = []
+    crc = 0
+    tamano = 0
+    for fragmento in fragmentos:
+        datos = fragmento.encode('utf-8')
+        crc = zlib.crc32(datos, crc)
+        tamano += len(datos)
+        bloques.append(compresor.compress(datos))
+    bloques.append(compresor.flush())
+    return b''.join(bloques), crc, tamano
+
+
+def escribir_xlsx_comprimido(destino, hojas: List[Tuple[str, Tuple[bytes, int, int]]]):
+    """
+    Escribe un libro XLSX con hojas ya comprimidas por `comprimir_parte`
+
+    Args:
+        destino: Archivo abierto en modo binario
+        hojas: (nombre de la hoja, parte comprimida) por hoja, en orden
+    """
+    if not hojas:
+        raise ValueError("Un libro de Excel necesita al menos una hoja")
+    usados = set()
+    nombres = [nombre_hoja(nombre, usados) for nombre, _ in hojas]
+    partes = [(f'xl/worksheets/sheet{i}.xml', parte) for i, (_, parte) in enumerate(hojas, start=1)]
+    partes += [(ruta, comprimir_parte([contenido])) for ruta, contenido in _partes_libro(nombres)]
+
+    # ZIP mínimo: encabezado local + datos por parte, directorio central al final
+    central = []
+    posicion = 0
+    for ruta, (datos, crc, tamano) in partes:
+        nombre = ruta.encode('utf-8')
+        encabezado = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, 0x800, zipfile.ZIP_DEFLATED, 0, 0x21,
+            crc, len(datos), tamano, len(nombre), 0
+        ) + nombre
+        destino.write(encabezado)
+        destino.write(datos)
+        central.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, 0x800, zipfile.ZIP_DEFLATED, 0, 0x21,
+            crc, len(datos), tamano, len(nombre), 0, 0, 0, 0, 0, posicion
+        ) + nombre)
+        posicion += len(encabezado) + len(datos)
+    directorio = b''.join(central)
+    destino.write(directorio)
+    destino.write(struct.pack(
+        '<IHHHHIIH', 0x06054b50, 0, 0, len(partes), len(partes), len(directorio), posicion, 0
+    ))
+
+
+def _partes_libro(nombres: List[str]) -> List[Tuple[str, str]]:
+    """Archivos del paquete XLSX además de las hojas"""
+    cabecera = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    hojas_tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(nombres) + 1)
+    )
+    hojas_libro = ''.join(
+        f'<sheet name="{escape(nombre, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, nombre in enumerate(nombres, start=1)
+    )
+    hojas_rels = ''.join(
+        f'<Relationship Id="rId{i}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(nombres) + 1)
+    )
+    return [
+        ('[Content_Types].xml', cabecera +
+         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+         '<Default Extension="xml" ContentType="application/xml"/>'
+         '<Override PartName="/xl/workbook.xml" '
+         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+         '<Override PartName="/xl/styles.xml" '
+         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+         + hojas_tipos + '</Types>'),
+        ('_rels/.rels', cabecera +
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" '
+         'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+         'Target="xl/workbook.xml"/></Relationships>'),
+        ('xl/workbook.xml', cabecera +
+         f'<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>' + hojas_libro + '</sheets></workbook>'),
+        ('xl/_rels/workbook.xml.rels', cabecera +
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         + hojas_rels +
+         f'<Relationship Id="rId{len(nombres) + 1}" '
+         'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+         'Target="styles.xml"/></Relationships>'),
+        ('xl/styles.xml', ESTILOS_XML),
+    ]
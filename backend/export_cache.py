@@ -0,0 +1,125 @@
+"""
+Caché en disco de los reportes exportados
+Cada archivo se guarda bajo una clave derivada del grupo y de la generación de sus
+datos; mientras los datos no cambian, las descargas repetidas se sirven del disco.
+El tamaño total está acotado y se descartan primero los menos usados (LRU)
+Las generaciones solo valen dentro de un proceso, así que los archivos de
+ejecuciones anteriores se borran al iniciar en lugar de reutilizarlos
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+
+def clave_exportacion(*partes: str) -> str:
+    """Clave de caché (y ETag) a partir de las partes que determinan el contenido"""
+    return hashlib.sha1('\x00'.join(partes).encode('utf-8')).hexdigest()
+
+
+class ExportCache:
+    """
+    Caché LRU de archivos exportados acotada por tamaño
+
+    El índice y el orden de uso solo existen en memoria: las claves incluyen la
+    época de la base de datos, que cambia en cada arranque, así que un archivo
+    de otra ejecución nunca volvería a pedirse. Al iniciar se vacía el directorio.
+    """
+
+    def __init__(self, directorio: str = "exportaciones_cache", max_bytes: int = 200 * 1024 * 1024,
+                 extension: str = ".xlsx"):
+        """
+        Args:
+            directorio: Carpeta donde se guardan los archivos
+            max_bytes: Tamaño total máximo de la caché
+            extension: Extensión de los archivos guardados
+        """
+        self.directorio = os.path.abspath(directorio)
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> tamaño, de la menos a la más usada
+        self._total = 0
+        os.makedirs(directorio, exist_ok=True)
+        self._limpiar()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave + self.extension)
+
+    def _limpiar(self):
+        """Borra los archivos (y escrituras interrumpidas) que quedaron de ejecuciones anteriores"""
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(self.extension) or nombre.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except OSError:
+                    # P. ej. en Windows, si otro proceso aún lo está enviando
+                    pass
+
+    def _desalojar(self):
+        """Elimina las entradas menos usadas hasta respetar el tamaño máximo (con el candado)"""
+        while self._total > self.max_bytes and self._entradas:
+            clave, tamano = self._entradas.popitem(last=False)
+            self._total -= tamano
+            try:
+                os.remove(self._ruta(clave))
+            except OSError:
+                pass
+
+    def get(self, clave: str) -> Optional[str]:
+        """
+        Busca un archivo en la caché y lo marca como recién usado
+
+        Returns:
+            Ruta del archivo, o None si no está
+        """
+        with self._lock:
+            if clave not in self._entradas:
+                return None
+            ruta = self._ruta(clave)
+            if not os.path.exists(ruta):
+                self._total -= self._entradas.pop(clave)
+                return None
+            self._entradas.move_to_end(clave)
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+        return ruta
+
+    def guardar_stream(self, clave: str, bloques: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Entrega los bloques de un archivo mientras los guarda en la caché
+
+        El archivo solo entra a la caché si el flujo se completa; si el cliente
+        se desconecta a la mitad, el archivo parcial se descarta.
+        """
+        temporal = f"{self._ruta(clave)}.{threading.get_ident()}.tmp"
+        completo = False
+        try:
+            with open(temporal, 'wb') as f:
+                for bloque in bloques:
+                    f.write(bloque)
+                    yield bloque
+            completo = True
+        finally:
+            if completo:
+                self._registrar(clave, temporal)
+            elif os.path.exists(temporal):
+                os.remove(temporal)
+
+    def _registrar(self, clave: str, temporal: str):
+        """Mueve un archivo completo a la caché"""
+        tamano = os.path.getsize(temporal)
+        if tamano > self.max_bytes:
+            os.remove(temporal)
+            return
+        with self._lock:
+            os.replace(temporal, self._ruta(clave))
+            if clave in self._entradas:
+                self._total -= self._entradas.pop(clave)
+            self._entradas[clave] = tamano
+            self._total += tamano
+            self._desalojar()
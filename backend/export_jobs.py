@@ -0,0 +1,191 @@
+"""
+Trabajos de exportación en segundo plano
+Las hojas de cada grupo se generan en paralelo en un ProcessPoolExecutor y después
+se unen en un solo libro; la API solo registra el trabajo y consulta su avance
+Los procesos se crean con 'spawn': el servidor tiene hilos (escritor de la base de
+datos, candados) y un fork podría copiar al hijo un candado tomado
+"""
+
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from excel_stream import comprimir_parte, escribir_xlsx_comprimido, hoja_asistencias
+
+
+def renderizar_hoja(titulo: str, columnas: List[Tuple[str, int]],
+                    alumnos: List[Tuple[str, int]]) -> Tuple[bytes, int, int]:
+    """
+    Genera y comprime la hoja de asistencias de un grupo (se ejecuta en otro proceso)
+
+    Args:
+        titulo: Título de la hoja
+        columnas: (fecha, columna de la matriz) en orden cronológico
+        alumnos: (nombre, bits de asistencia) en el orden de salida
+
+    Returns:
+        La hoja comprimida, lista para `escribir_xlsx_comprimido`
+    """
+    fechas = [fecha for fecha, col in columnas]
+    posiciones = [col for fecha, col in columnas]
+    filas = (
+        (nombre, [(bits >> col) & 1 for col in posiciones])
+        for nombre, bits in alumnos
+    )
+    return comprimir_parte(hoja_asistencias(titulo, fechas, filas, len(alumnos)))
+
+
+class ExportQueueFull(RuntimeError):
+    """Hay demasiados trabajos sin terminar; el cliente debe reintentar más tarde"""
+
+
+class ExportJobs:
+    """
+    Registro de trabajos de exportación
+
+    Estados: 'pendiente' -> 'procesando' -> 'listo' o 'error'. Los trabajos
+    terminados se conservan `ttl` segundos para descargarlos.
+    """
+
+    def __init__(self, directorio: str = "exportaciones_trabajos", procesos: Optional[int] = None,
+                 ttl: float = 3600, max_pendientes: int = 4):
+        """
+        Args:
+            directorio: Carpeta donde se escriben los libros generados
+            procesos: Número de procesos del pool (None = uno por núcleo)
+            ttl: Segundos que se conserva un trabajo terminado
+            max_pendientes: Trabajos sin terminar admitidos a la vez
+        """
+        self.directorio = os.path.abspath(directorio)
+        self.procesos = procesos
+        self.ttl = ttl
+        self.max_pendientes = max_pendientes
+        self._lock = threading.Lock()
+        self._trabajos = {}  # job_id -> estado del trabajo
+        self._pool = None
+        os.makedirs(self.directorio, exist_ok=True)
+        # Los trabajos solo viven en memoria: los archivos de una ejecución anterior ya no se pueden pedir
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.xlsx') or nombre.endswith('.tmp'):
+                os.remove(os.path.join(self.directorio, nombre))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def enviar(self, nombre_archivo: str, hojas: List[Dict]) -> str:
+        """
+        Registra un trabajo y empieza a generarlo en segundo plano
+
+        Args:
+            nombre_archivo: Nombre con el que se descargará el libro
+            hojas: Por hoja: {'nombre', 'titulo', 'columnas', 'alumnos'} (ver `renderizar_hoja`)
+
+        Returns:
+            ID del trabajo
+
+        Raises:
+            ExportQueueFull: si ya hay `max_pendientes` trabajos sin terminar
+        """
+        self.limpiar()
+        job_id = secrets.token_urlsafe(12)
+        trabajo = {
+            'job_id': job_id,
+            'estado': 'pendiente',
+            'nombre_archivo': nombre_archivo,
+            'total_hojas': len(hojas),
+            'hojas_listas': 0,
+            'total_filas': sum(len(h['alumnos']) for h in hojas),
+            'filas_listas': 0,
+            'creado': time.time(),
+            'terminado': None,
+            'archivo': None,
+            'error': None
+        }
+        with self._lock:
+            pendientes = sum(1 for t in self._trabajos.values() if t['terminado'] is None)
+            if pendientes >= self.max_pendientes:
+                raise ExportQueueFull(f"Hay {pendientes} exportaciones en curso")
+            self._trabajos[job_id] = trabajo
+        threading.Thread(
+            target=self._ejecutar, args=(trabajo, hojas), name=f"exportacion-{job_id}", daemon=True
+        ).start()
+        return job_id
+
+    def _ejecutar(self, trabajo: Dict, hojas: List[Dict]):
+        """Reparte las hojas entre los procesos y une el resultado"""
+        try:
+            pool = self._get_pool()
+            with self._lock:
+                trabajo['estado'] = 'procesando'
+            futuros = {
+                pool.submit(renderizar_hoja, hoja['titulo'], hoja['columnas'], hoja['alumnos']): i
+                for i, hoja in enumerate(hojas)
+            }
+            partes = [None] * len(hojas)
+            for futuro in as_completed(futuros):
+                i = futuros[futuro]
+                partes[i] = futuro.result()
+                with self._lock:
+                    trabajo['hojas_listas'] += 1
+                    trabajo['filas_listas'] += len(hojas[i]['alumnos'])
+
+            archivo = os.path.join(self.directorio, f"{trabajo['job_id']}.xlsx")
+            temporal = f"{archivo}.tmp"
+            with open(temporal, 'wb') as f:
+                escribir_xlsx_comprimido(f, [(hoja['nombre'], parte) for hoja, parte in zip(hojas, partes)])
+            os.replace(temporal, archivo)
+            with self._lock:
+                trabajo['archivo'] = archivo
+                trabajo['estado'] = 'listo'
+                trabajo['terminado'] = time.time()
+            print(f"✓ Exportación {trabajo['job_id']} lista ({len(hojas)} hojas)")
+        except Exception as e:
+            with self._lock:
+                trabajo['estado'] = 'error'
+                trabajo['error'] = str(e) or type(e).__name__
+                trabajo['terminado'] = time.time()
+            print(f"✗ Error en la exportación {trabajo['job_id']}: {e}")
+
+    def estado(self, job_id: str) -> Optional[Dict]:
+        """Copia del estado de un trabajo (None si no existe o ya expiró)"""
+        self.limpiar()
+        with self._lock:
+            trabajo = self._trabajos.get(job_id)
+            if trabajo is None:
+                return None
+            resultado = dict(trabajo)
+        total = resultado['total_filas'] or resultado['total_hojas']
+        listas = resultado['filas_listas'] if resultado['total_filas'] else resultado['hojas_listas']
+        # 100 solo cuando el libro ya está escrito, no al terminar la última hoja
+        resultado['progreso'] = 100 if resultado['estado'] == 'listo' else (
+            min(99, int(100 * listas / total)) if total else 0
+        )
+        return resultado
+
+    def limpiar(self):
+        """Elimina los trabajos terminados hace más de `ttl` segundos y sus archivos"""
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidos = [
+                job_id for job_id, trabajo in self._trabajos.items()
+                if trabajo['terminado'] is not None and trabajo['terminado'] < limite
+            ]
+            archivos = [self._trabajos.pop(job_id)['archivo'] for job_id in vencidos]
+        for archivo in archivos:
+            if archivo and os.path.exists(archivo):
+                os.remove(archivo)
+
+    def close(self):
+        """Detiene el pool de procesos"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
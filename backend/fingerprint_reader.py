@@ -3,14 +3,23 @@ Módulo para interactuar con el lector de huellas digitales U.are.U 4500
 Utiliza el SDK de DigitalPersona a través de ctypes
 """
 
+import atexit
 import ctypes
 import os
+import random
 import sys
+import threading
+from contextlib import contextmanager
 from ctypes import c_int, c_char_p, c_void_p, POINTER, Structure, byref
 from typing import Optional, Tuple, List
 import json
 from datetime import datetime
 
+from candidate_index import CandidateIndex
+from identification import IdentificationEngine
+from matcher import Matcher
+from template_store import TemplateStore
+
 
 # Constantes del SDK DigitalPersona
 DPFP_DD_SUCCESS = 0
@@ -29,6 +38,11 @@ DPFP_DD_PROCESS_FAILURE = 1
 DPFP_DD_PROCESS_GOOD = 2
 DPFP_DD_PROCESS_NOT_READY = 3
 
+# DLLs ya cargadas y configuradas por ruta del SDK, compartidas por todos los
+# lectores del proceso: buscar y cargar el SDK se hace una sola vez
+_sdk_lock = threading.Lock()
+_sdk_cargados = {}  # sdk_path -> (dpfpdd_dll, dpfhtrex_dll, dpfj_dll), o None si no se encontró
+
 
 class FingerprintReader:
     """Clase para manejar el lector de huellas digitales U.are.U 4500"""
@@ -51,7 +65,26 @@ class FingerprintReader:
         self._load_sdk(sdk_path)
         
     def _load_sdk(self, sdk_path: Optional[str] = None):
-        """Carga las DLLs del SDK de DigitalPersona One Touch"""
+        """
+        Carga las DLLs del SDK de DigitalPersona One Touch
+        
+        La búsqueda y carga se hacen una sola vez por proceso y ruta; los
+        lectores siguientes reutilizan las DLLs ya configuradas
+        """
+        with _sdk_lock:
+            if sdk_path in _sdk_cargados:
+                cargadas = _sdk_cargados[sdk_path]
+                if cargadas is not None:
+                    self.dpfpdd_dll, self.dpfhtrex_dll, self.dpfj_dll = cargadas
+                    self.sdk_loaded = True
+                return
+            self._buscar_sdk(sdk_path)
+            _sdk_cargados[sdk_path] = (
+                (self.dpfpdd_dll, self.dpfhtrex_dll, self.dpfj_dll) if self.sdk_loaded else None
+            )
+    
+    def _buscar_sdk(self, sdk_path: Optional[str] = None):
+        """Busca las DLLs del SDK en las rutas comunes y configura sus funciones"""
         # Rutas comunes donde puede estar el SDK
         common_paths = [
             sdk_path,
@@ -653,6 +686,8 @@ class FingerprintReader:
             return False, 0
         
         try:
+            # Los templates de la galería binaria llegan como memoryview
+            template1, template2 = bytes(template1), bytes(template2)
             score = c_int()
             result = self.dpfj_dll.dpfj_compare_fmd(
                 template1, len(template1),
@@ -678,23 +713,164 @@ class FingerprintReader:
         self.close_device()
 
 
+class FingerprintReaderPool(Matcher):
+    """
+    Pool de lectores reutilizables compartido por el proceso
+    
+    Los lectores se crean bajo demanda (hasta `max_readers`) y se prestan a un
+    hilo a la vez, porque cada FingerprintReader guarda estado de la captura en
+    curso. Es el matcher del backend 'sdk' (ver matcher.crear_matcher).
+    """
+    
+    def __init__(self, sdk_path: Optional[str] = None, max_readers: int = 4):
+        """
+        Args:
+            sdk_path: Ruta al directorio del SDK (opcional)
+            max_readers: Máximo de lectores creados a la vez
+        """
+        self.sdk_path = sdk_path
+        self.max_readers = max(1, max_readers)
+        self._cond = threading.Condition()
+        self._libres = []
+        self._creados = 0
+        self._cerrado = False
+    
+    def _tomar(self, timeout: Optional[float] = None) -> FingerprintReader:
+        """Saca un lector libre, o crea uno si no se ha llegado al máximo"""
+        with self._cond:
+            while True:
+                if self._cerrado:
+                    raise RuntimeError("El pool de lectores está cerrado")
+                if self._libres:
+                    return self._libres.pop()
+                if self._creados < self.max_readers:
+                    self._creados += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No hay lectores de huellas libres")
+        try:
+            # Crear el lector fuera del candado (la primera vez carga el SDK)
+            return FingerprintReader(self.sdk_path)
+        except Exception:
+            with self._cond:
+                self._creados -= 1
+                self._cond.notify()
+            raise
+    
+    def _devolver(self, reader: FingerprintReader):
+        """Devuelve un lector al pool; si el pool ya se cerró, lo cierra"""
+        with self._cond:
+            if not self._cerrado:
+                self._libres.append(reader)
+                self._cond.notify()
+                return
+            self._creados -= 1
+        reader.close_device()
+    
+    @contextmanager
+    def obtener(self, timeout: Optional[float] = None):
+        """
+        Presta un lector durante el bloque with
+        
+        Args:
+            timeout: Segundos máximos de espera por un lector libre (None = sin límite)
+        """
+        reader = self._tomar(timeout)
+        try:
+            yield reader
+        finally:
+            self._devolver(reader)
+    
+    def is_sdk_loaded(self) -> bool:
+        """Verifica si el SDK está cargado (lo carga la primera vez)"""
+        with self.obtener() as reader:
+            return reader.is_sdk_loaded()
+    
+    def compare_templates(self, template1: bytes, template2: bytes) -> Tuple[bool, int]:
+        """Compara dos templates con un lector del pool (ver FingerprintReader.compare_templates)"""
+        with self.obtener() as reader:
+            return reader.compare_templates(template1, template2)
+    
+    def cerrar(self):
+        """Cierra los lectores libres; los prestados se cierran al devolverse"""
+        with self._cond:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._creados -= len(libres)
+            self._cond.notify_all()
+        for reader in libres:
+            reader.close_device()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_reader_pool() -> FingerprintReaderPool:
+    """Pool de lectores del proceso (se crea al primer uso y se cierra al salir)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Un lector por núcleo: los hilos de identificación comparan a la vez
+                _pool = FingerprintReaderPool(max_readers=os.cpu_count() or 4)
+                atexit.register(_pool.cerrar)
+    return _pool
+
+
 class FingerprintDatabase:
     """Clase para gestionar una base de datos de huellas"""
     
-    def __init__(self, db_file: str = "fingerprints.json"):
+    def __init__(self, db_file: str = "fingerprints.json", matcher=None,
+                 hilos: Optional[int] = None, prefiltro: Optional[CandidateIndex] = None,
+                 auditoria: float = 0.0, formato: str = "json"):
         """
         Inicializa la base de datos
         
         Args:
-            db_file: Archivo JSON donde se almacenan las huellas
+            db_file: Archivo donde se almacenan las huellas
+            matcher: Matcher para comparar (ver matcher.crear_matcher; por
+                defecto, el pool de lectores del proceso)
+            hilos: Hilos para la identificación 1:N (None = uno por núcleo)
+            prefiltro: Índice de candidatos para acotar la identificación 1:N
+                (None = comparar contra toda la galería)
+            auditoria: Fracción de identificaciones que además recorren toda la
+                galería para medir los fallos del prefiltro
+            formato: 'json' (templates en base64) o 'binario' (galería mapeada
+                en memoria, ver TemplateStore)
         """
+        if formato not in ('json', 'binario'):
+            raise ValueError(f"Formato de base de datos desconocido: {formato}")
         self.db_file = db_file
+        self.formato = formato
+        self.store = None
         self.fingerprints = {}
+        self.matcher = matcher
+        self.hilos = hilos
+        self.prefiltro = prefiltro
+        self.auditoria = auditoria
+        self._engine = None
         self.load_database()
     
+    def _get_matcher(self):
+        """Matcher inyectado, o el pool de lectores del proceso"""
+        return self.matcher if self.matcher is not None else get_reader_pool()
+    
+    def _get_engine(self) -> IdentificationEngine:
+        """Motor de identificación 1:N sobre el matcher (se crea al primer uso)"""
+        if self._engine is None:
+            self._engine = IdentificationEngine(self._get_matcher(), hilos=self.hilos)
+        return self._engine
+    
     def load_database(self):
         """Carga la base de datos desde el archivo"""
-        if os.path.exists(self.db_file):
+        if self.formato == 'binario':
+            # Los templates se quedan en el archivo: aquí solo el nombre y la fecha
+            if self.store is None:
+                self.store = TemplateStore(self.db_file)
+            self.fingerprints = dict(self.store.registros())
+            print(f"✓ Base de datos cargada: {len(self.fingerprints)} huellas registradas")
+        elif os.path.exists(self.db_file):
             try:
                 with open(self.db_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -710,9 +886,28 @@ class FingerprintDatabase:
                 self.fingerprints = {}
         else:
             self.fingerprints = {}
+        
+        if self.prefiltro is not None:
+            self.prefiltro.construir(self._galeria())
+    
+    def _template(self, user_id: str) -> bytes:
+        """Template de un usuario (en formato binario, una vista del mapa actual de la galería)"""
+        if self.store is not None:
+            return self.store.template(user_id)
+        return self.fingerprints[user_id]['template']
+    
+    def _galeria(self) -> List[Tuple[str, bytes]]:
+        """(user_id, template) de toda la base de datos"""
+        if self.store is not None:
+            return self.store.galeria()
+        return [(user_id, user_data['template']) for user_id, user_data in self.fingerprints.items()]
     
     def save_database(self):
         """Guarda la base de datos en el archivo"""
+        if self.store is not None:
+            # La galería binaria ya escribió cada cambio: solo falta llevarlo a disco
+            self.store.sincronizar()
+            return
         try:
             # Convertir templates a base64 para JSON
             data_to_save = {}
@@ -739,12 +934,20 @@ class FingerprintDatabase:
             template: Template de la huella
             name: Nombre del usuario (opcional)
         """
-        self.fingerprints[user_id] = {
+        registro = {
             'name': name,
             'template': template,
             'registered_at': datetime.now().isoformat()
         }
-        self.save_database()
+        if self.store is not None:
+            # Solo se escribe el registro nuevo
+            self.store.agregar(user_id, template, name, registro['registered_at'])
+            del registro['template']
+        self.fingerprints[user_id] = registro
+        if self.prefiltro is not None:
+            self.prefiltro.agregar(user_id, template)
+        if self.store is None:
+            self.save_database()
         print(f"✓ Huella registrada para usuario: {user_id} ({name})")
     
     def identify_fingerprint(self, template: bytes, threshold: int = 40) -> Optional[str]:
@@ -758,24 +961,45 @@ class FingerprintDatabase:
         Returns:
             ID del usuario si se encuentra una coincidencia, None en caso contrario
         """
-        reader = FingerprintReader()
-        if not reader.is_sdk_loaded():
+        resultado = self.identify_candidates(template, threshold, top_k=1)
+        if resultado is None or not resultado['candidatos']:
             return None
+        return resultado['candidatos'][0]['user_id']
+    
+    def identify_candidates(self, template: bytes, threshold: int = 40, top_k: int = 5,
+                            stop_score: Optional[int] = None) -> Optional[dict]:
+        """
+        Busca los candidatos más parecidos a una huella (1:N en paralelo)
         
-        best_match = None
-        best_score = 0
-        
-        for user_id, user_data in self.fingerprints.items():
-            stored_template = user_data['template']
-            match, score = reader.compare_templates(template, stored_template)
+        Args:
+            template: Template de la huella a identificar
+            threshold: Umbral de similitud mínimo
+            top_k: Número máximo de candidatos
+            stop_score: Score con el que se detiene la búsqueda (None = toda la galería)
             
-            if match and score > best_score:
-                best_score = score
-                best_match = user_id
+        Returns:
+            Resultado de IdentificationEngine.identificar (con 'prefiltrados', el
+            tamaño de la lista corta, si hay prefiltro), o None si el SDK no está cargado
+        """
+        if not self._get_matcher().is_sdk_loaded():
+            return None
         
-        if best_match and best_score >= threshold:
-            return best_match
-        return None
+        engine = self._get_engine()
+        galeria = self._galeria()
+        elegidos = self.prefiltro.candidatos(template) if self.prefiltro is not None else None
+        if elegidos is None:
+            return engine.identificar(template, galeria, threshold, top_k, stop_score)
+        
+        corta = [(user_id, self._template(user_id)) for user_id in elegidos if user_id in self.fingerprints]
+        resultado = engine.identificar(template, corta, threshold, top_k, stop_score)
+        resultado['prefiltrados'] = len(corta)
+        resultado['total'] = len(galeria)
+        if self.auditoria > 0 and random.random() < self.auditoria:
+            # Comparar contra toda la galería para medir los fallos del prefiltro
+            completo = engine.identificar(template, galeria, threshold, top_k=1)
+            esperado = completo['candidatos'][0]['user_id'] if completo['candidatos'] else None
+            self.prefiltro.registrar_auditoria(esperado, elegidos)
+        return resultado
     
     def verify_fingerprint(self, user_id: str, template: bytes, threshold: int = 40) -> Tuple[bool, int]:
         """
@@ -792,12 +1016,12 @@ class FingerprintDatabase:
         if user_id not in self.fingerprints:
             return False, 0
         
-        reader = FingerprintReader()
-        if not reader.is_sdk_loaded():
+        matcher = self._get_matcher()
+        if not matcher.is_sdk_loaded():
             return False, 0
         
-        stored_template = self.fingerprints[user_id]['template']
-        match, score = reader.compare_templates(template, stored_template)
+        stored_template = self._template(user_id)
+        match, score = matcher.compare_templates(template, stored_template)
         
         return (match and score >= threshold, score)
     
@@ -824,7 +1048,12 @@ class FingerprintDatabase:
         """
         if user_id in self.fingerprints:
             del self.fingerprints[user_id]
-            self.save_database()
+            if self.prefiltro is not None:
+                self.prefiltro.quitar(user_id)
+            if self.store is not None:
+                self.store.borrar(user_id)
+            else:
+                self.save_database()
             print(f"✓ Usuario {user_id} eliminado")
             return True
         print(f"✗ Usuario {user_id} no encontrado")
@@ -0,0 +1,127 @@
+"""
+Identificación 1:N de huellas en paralelo
+La galería se reparte en bloques entre los hilos de un ThreadPoolExecutor (la
+comparación del SDK se hace por ctypes, que suelta el GIL mientras compara);
+cada hilo guarda sus k mejores candidatos y la búsqueda puede terminar en
+cuanto algún hilo encuentra un score suficientemente alto
+"""
+
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class IdentificationEngine:
+    """
+    Motor de identificación 1:N sobre un matcher
+
+    El matcher es cualquier objeto con compare_templates(t1, t2) -> (coincide, score)
+    que se pueda llamar desde varios hilos a la vez (ver matcher.Matcher); si
+    tiene compare_lote, cada hilo compara `lote_preferido` templates por llamada.
+    """
+
+    def __init__(self, matcher, hilos: Optional[int] = None, min_por_hilo: int = 64):
+        """
+        Args:
+            matcher: Objeto que compara dos templates
+            hilos: Hilos del pool (None = uno por núcleo)
+            min_por_hilo: Templates mínimos por hilo; las galerías pequeñas se
+                comparan en el hilo que llama para no pagar el reparto
+        """
+        self.matcher = matcher
+        self.hilos = max(1, hilos or os.cpu_count() or 1)
+        self.min_por_hilo = max(1, min_por_hilo)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.hilos,
+                                                thread_name_prefix='identificacion')
+            return self._pool
+
+    def _buscar(self, probe: bytes, bloque: Sequence[Tuple[str, bytes]], umbral: int,
+                top_k: int, parar_en: Optional[int],
+                encontrada: threading.Event) -> Tuple[List[Tuple[int, str]], int]:
+        """
+        Compara el probe contra un bloque de la galería
+
+        Returns:
+            (mejores (score, user_id) del bloque, número de comparaciones hechas)
+        """
+        mejores = []  # montículo de mínimos con los top_k del bloque
+        comparados = 0
+        # Los matchers vectorizados comparan varios templates por llamada
+        lote = max(1, getattr(self.matcher, 'lote_preferido', 1))
+        compare_lote = getattr(self.matcher, 'compare_lote', None)
+        for inicio in range(0, len(bloque), lote):
+            if encontrada.is_set():
+                break
+            parte = bloque[inicio:inicio + lote]
+            if compare_lote is not None:
+                resultados = compare_lote(probe, [template for _, template in parte])
+            else:
+                resultados = [self.matcher.compare_templates(probe, template) for _, template in parte]
+            comparados += len(parte)
+            for (user_id, _), (coincide, score) in zip(parte, resultados):
+                if not coincide or score < umbral:
+                    continue
+                if len(mejores) < top_k:
+                    heapq.heappush(mejores, (score, user_id))
+                elif (score, user_id) > mejores[0]:
+                    # Mismo criterio que el nlargest final: el resultado no depende del reparto
+                    heapq.heapreplace(mejores, (score, user_id))
+                if parar_en is not None and score >= parar_en:
+                    encontrada.set()
+        return mejores, comparados
+
+    def identificar(self, probe: bytes, galeria: Sequence[Tuple[str, bytes]], umbral: int = 40,
+                    top_k: int = 5, parar_en: Optional[int] = None) -> Dict:
+        """
+        Busca los candidatos más parecidos al probe en la galería
+
+        Args:
+            probe: Template de la huella a identificar
+            galeria: Lista de (user_id, template)
+            umbral: Score mínimo para que un template sea candidato
+            top_k: Número máximo de candidatos a devolver
+            parar_en: Score con el que se detiene la búsqueda en cuanto aparece
+                (None = recorrer toda la galería). Con parada temprana los
+                candidatos son los mejores de lo comparado hasta ese momento
+
+        Returns:
+            Diccionario con 'candidatos' ([{'user_id', 'score'}] de mayor a menor
+            score), 'comparados', 'total' y 'parada_temprana'
+        """
+        top_k = max(1, top_k)
+        encontrada = threading.Event()
+        hilos = min(self.hilos, len(galeria) // self.min_por_hilo)
+        if hilos <= 1:
+            resultados = [self._buscar(probe, galeria, umbral, top_k, parar_en, encontrada)]
+        else:
+            # Bloques intercalados: si la galería está ordenada por inscripción,
+            # todos los hilos recorren inscripciones antiguas y recientes
+            pool = self._get_pool()
+            futuros = [
+                pool.submit(self._buscar, probe, galeria[k::hilos], umbral, top_k, parar_en, encontrada)
+                for k in range(hilos)
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+
+        mejores = heapq.nlargest(top_k, (c for bloque, _ in resultados for c in bloque))
+        return {
+            'candidatos': [{'user_id': user_id, 'score': score} for score, user_id in mejores],
+            'comparados': sum(comparados for _, comparados in resultados),
+            'total': len(galeria),
+            'parada_temprana': encontrada.is_set()
+        }
+
+    def cerrar(self):
+        """Termina los hilos del pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
@@ -0,0 +1,57 @@
+"""
+Interfaz común de los matchers de huellas
+Un matcher compara templates y devuelve (coincide, score) con score de 0 a 100.
+Hay dos implementaciones: el SDK de DigitalPersona (a través del pool de
+lectores, solo en Windows) y un matcher de minucias ISO 19794-2 en NumPy
+que funciona en cualquier sistema
+"""
+
+from typing import List, Sequence, Tuple
+
+
+MATCHERS = ('sdk', 'minucias')
+
+
+class Matcher:
+    """
+    Interfaz de un matcher
+
+    Las implementaciones deben poder usarse desde varios hilos a la vez.
+    """
+
+    # Templates que conviene comparar por llamada a compare_lote (1 = de uno en uno)
+    lote_preferido = 1
+
+    def is_sdk_loaded(self) -> bool:
+        """Indica si el matcher puede comparar"""
+        raise NotImplementedError
+
+    def compare_templates(self, template1: bytes, template2: bytes) -> Tuple[bool, int]:
+        """
+        Compara dos templates
+
+        Returns:
+            Tupla (coincide, score) con score de 0 a 100
+        """
+        raise NotImplementedError
+
+    def compare_lote(self, probe: bytes, templates: Sequence[bytes]) -> List[Tuple[bool, int]]:
+        """Compara un probe contra varios templates (por defecto, de uno en uno)"""
+        return [self.compare_templates(probe, template) for template in templates]
+
+
+def crear_matcher(backend: str = 'sdk', **opciones) -> Matcher:
+    """
+    Crea el matcher de un backend
+
+    Args:
+        backend: 'sdk' (pool de lectores del proceso) o 'minucias' (NumPy)
+        **opciones: Parámetros del matcher de minucias (ver MinutiaeMatcher)
+    """
+    if backend == 'sdk':
+        from fingerprint_reader import get_reader_pool
+        return get_reader_pool()
+    if backend == 'minucias':
+        from minutiae_matcher import MinutiaeMatcher
+        return MinutiaeMatcher(**opciones)
+    raise ValueError(f"Matcher desconocido: {backend} (opciones: {', '.join(MATCHERS)})")
@@ -0,0 +1,276 @@
+"""
+Matcher de minucias ISO/IEC 19794-2:2005 en NumPy
+Lee las minucias de los templates (DPFP_FMD_FORMAT_ISO_19794_2_2005) y los
+compara sin el SDK: una transformada de Hough sobre todos los pares de
+minucias da la rotación y la traslación más votadas, y con esa alineación se
+emparejan las minucias por vecino más cercano mutuo. Todo se calcula con
+arreglos, y en modo lote un probe se compara contra una galería apilada en
+una sola llamada
+"""
+
+import math
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: solo lo necesita este matcher
+    np = None
+
+from matcher import Matcher
+
+
+ISO_FORMATO = b'FMR\x00'
+ISO_VERSION_2005 = b' 20\x00'
+ISO_CABECERA = 24        # Cabecera del registro
+ISO_CABECERA_VISTA = 4   # Cabecera de cada vista de dedo
+ISO_MINUCIA = 6          # Bytes por minucia
+
+# Galería apilada: arreglos (G, M) rellenos hasta la vista con más minucias
+GaleriaMinucias = namedtuple('GaleriaMinucias', ['x', 'y', 'angulo', 'valida', 'total'])
+
+
+def parse_iso_19794_2(template: bytes) -> 'np.ndarray':
+    """
+    Lee las minucias de la primera vista de un template ISO 19794-2:2005
+
+    Args:
+        template: Registro FMR completo
+
+    Returns:
+        Arreglo (n, 3) float32 con x e y en milímetros y el ángulo en radianes
+
+    Raises:
+        ValueError: si el template no es un registro ISO 19794-2:2005 válido
+    """
+    datos = memoryview(template).cast('B')
+    if len(datos) < ISO_CABECERA or datos[:4] != ISO_FORMATO or datos[4:8] != ISO_VERSION_2005:
+        raise ValueError("El template no es un registro ISO 19794-2:2005")
+    longitud, _, _, _, res_x, res_y, vistas, _ = struct.unpack_from('>IHHHHHBB', datos, 8)
+    if longitud > len(datos):
+        raise ValueError("Registro ISO 19794-2 truncado")
+    if vistas == 0:
+        return np.zeros((0, 3), dtype=np.float32)
+    n = datos[ISO_CABECERA + 3]
+    inicio = ISO_CABECERA + ISO_CABECERA_VISTA
+    if inicio + n * ISO_MINUCIA > len(datos):
+        raise ValueError("Registro ISO 19794-2 truncado")
+    crudo = np.frombuffer(datos, dtype=np.uint8, count=n * ISO_MINUCIA, offset=inicio)
+    crudo = crudo.reshape(n, ISO_MINUCIA).astype(np.int32)
+    # Resolución en píxeles por centímetro (0 = sin indicar: se asume 500 dpi)
+    mm_x = 10.0 / res_x if res_x else 25.4 / 500
+    mm_y = 10.0 / res_y if res_y else 25.4 / 500
+    minucias = np.empty((n, 3), dtype=np.float32)
+    minucias[:, 0] = (((crudo[:, 0] & 0x3F) << 8) | crudo[:, 1]) * mm_x
+    minucias[:, 1] = (((crudo[:, 2] & 0x3F) << 8) | crudo[:, 3]) * mm_y
+    minucias[:, 2] = crudo[:, 4] * (2 * math.pi / 256)
+    return minucias
+
+
+class MinutiaeMatcher(Matcher):
+    """
+    Matcher portable de templates ISO 19794-2
+
+    El score es 100 * pares / √(minucias del probe · minucias del template),
+    de 0 a 100, así que el umbral de 40 del SDK sigue siendo razonable. Los
+    templates que no se pueden leer puntúan 0.
+    """
+
+    lote_preferido = 512
+
+    def __init__(self, umbral: int = 40, tol_distancia: float = 0.8, tol_angulo: float = 22.5,
+                 max_rotacion: float = 60, min_pares: int = 6, celda: float = 1.5,
+                 max_elementos: int = 2_000_000, cache: int = 20000):
+        """
+        Args:
+            umbral: Score mínimo para considerar que dos huellas coinciden
+            tol_distancia: Milímetros máximos entre dos minucias emparejadas
+            tol_angulo: Grados máximos entre las direcciones de dos minucias emparejadas
+            max_rotacion: Grados máximos de rotación entre dos capturas
+            min_pares: Pares mínimos para dar un score distinto de 0
+            celda: Milímetros de cada celda de traslación en la transformada de Hough
+            max_elementos: Tamaño máximo de los arreglos intermedios (acota la memoria por lote)
+            cache: Templates leídos que se conservan en memoria
+        """
+        if np is None:
+            raise RuntimeError("El matcher de minucias requiere NumPy (pip install numpy)")
+        self.umbral = umbral
+        self.tol_distancia = tol_distancia
+        self.tol_angulo = math.radians(tol_angulo)
+        self.max_rotacion = math.radians(max_rotacion)
+        self.min_pares = min_pares
+        self.celda = celda
+        self.max_elementos = max_elementos
+        # Celdas de rotación del ancho de la tolerancia angular
+        self._celdas_angulo = max(1, int(round(2 * math.pi / self.tol_angulo)))
+        self._leer_cache = lru_cache(maxsize=cache)(self._leer_template)
+
+    def _leer(self, template: bytes) -> Optional['np.ndarray']:
+        # La caché se indexa con bytes: una clave memoryview mantendría vivo el mapa de la galería
+        if not isinstance(template, bytes):
+            template = bytes(template)
+        return self._leer_cache(template)
+
+    @staticmethod
+    def _leer_template(template: bytes) -> Optional['np.ndarray']:
+        try:
+            return parse_iso_19794_2(template)
+        except (ValueError, TypeError, struct.error):
+            return None
+
+    def is_sdk_loaded(self) -> bool:
+        """Siempre disponible (NumPy se comprueba al crear el matcher)"""
+        return True
+
+    def apilar(self, templates: Sequence[bytes]) -> GaleriaMinucias:
+        """Lee los templates y los apila en arreglos rellenos para compararlos en lote"""
+        leidas = [self._leer(template) for template in templates]
+        total = np.array([len(m) if m is not None else 0 for m in leidas], dtype=np.int32)
+        ancho = max(1, int(total.max())) if len(total) else 1
+        apiladas = np.zeros((len(leidas), ancho, 3), dtype=np.float32)
+        for g, minucias in enumerate(leidas):
+            if minucias is not None and len(minucias):
+                apiladas[g, :len(minucias)] = minucias
+        valida = np.arange(ancho)[None, :] < total[:, None]
+        return GaleriaMinucias(apiladas[:, :, 0], apiladas[:, :, 1], apiladas[:, :, 2], valida, total)
+
+    def puntuar(self, probe: bytes, galeria: GaleriaMinucias) -> 'np.ndarray':
+        """
+        Scores de un probe contra una galería apilada
+
+        Returns:
+            Arreglo (G,) int32 con el score de cada template de la galería
+        """
+        scores = np.zeros(len(galeria.total), dtype=np.int32)
+        p = self._leer(probe)
+        if p is None or len(p) < self.min_pares or not len(scores):
+            return scores
+        # Partir la galería para acotar los arreglos (G, n, M) intermedios
+        paso = max(1, self.max_elementos // (len(p) * galeria.x.shape[1]))
+        for inicio in range(0, len(scores), paso):
+            parte = slice(inicio, inicio + paso)
+            scores[parte] = self._puntuar_parte(
+                p, galeria.x[parte], galeria.y[parte], galeria.angulo[parte],
+                galeria.valida[parte], galeria.total[parte]
+            )
+        return scores
+
+    def _puntuar_parte(self, p, gx, gy, gt, valida, total) -> 'np.ndarray':
+        G, M = gx.shape
+        n = len(p)
+        # Centrar el probe: la traslación depende menos del error en la rotación
+        px, py, pt = p[:, 0] - p[:, 0].mean(), p[:, 1] - p[:, 1].mean(), p[:, 2]
+        dos_pi = 2 * math.pi
+
+        # 1. Transformada de Hough: cada par (i del probe, j del template) vota
+        #    por la rotación y la traslación que lleva i sobre j
+        rot = np.mod(gt[:, None, :] - pt[None, :, None], dos_pi)            # (G, n, M)
+        girada = np.minimum(rot, dos_pi - rot)
+        vota = valida[:, None, :] & (girada <= self.max_rotacion)
+        cos, sin = np.cos(rot), np.sin(rot)
+        tx = gx[:, None, :] - (cos * px[None, :, None] - sin * py[None, :, None])
+        ty = gy[:, None, :] - (sin * px[None, :, None] + cos * py[None, :, None])
+
+        g_idx = np.nonzero(vota)[0]
+        scores = np.zeros(G, dtype=np.int32)
+        if not len(g_idx):
+            return scores
+        rot_v, tx_v, ty_v = rot[vota], tx[vota], ty[vota]
+        ca = (rot_v * (self._celdas_angulo / dos_pi)).astype(np.int64) % self._celdas_angulo
+        cx = np.floor(tx_v / self.celda).astype(np.int64)
+        cy = np.floor(ty_v / self.celda).astype(np.int64)
+        cx -= cx.min()
+        cy -= cy.min()
+        nx, ny = int(cx.max()) + 1, int(cy.max()) + 1
+        celdas = self._celdas_angulo * nx * ny
+        claves = g_idx.astype(np.int64) * celdas + (ca * nx + cx) * ny + cy
+        unicas, inversa, votos = np.unique(claves, return_inverse=True, return_counts=True)
+        inversa = inversa.ravel()
+
+        # Celda más votada de cada template (las claves ya vienen agrupadas por template)
+        g_celda = unicas // celdas
+        orden = np.lexsort((votos, g_celda))
+        ultimas = np.r_[g_celda[orden][1:] != g_celda[orden][:-1], True]
+        mejor = orden[ultimas]
+        con_votos = g_celda[mejor]
+
+        # Alineación media de los votos de la celda ganadora
+        def suma(pesos):
+            return np.bincount(inversa, weights=pesos, minlength=len(unicas))[mejor]
+
+        cuenta = votos[mejor].astype(np.float64)
+        angulo = np.zeros(G)
+        mx, my = np.zeros(G), np.zeros(G)
+        angulo[con_votos] = np.arctan2(suma(np.sin(rot_v)), suma(np.cos(rot_v)))
+        mx[con_votos] = suma(tx_v) / cuenta
+        my[con_votos] = suma(ty_v) / cuenta
+
+        # 2. Emparejamiento con esa alineación, y una segunda pasada con la
+        #    alineación ajustada por mínimos cuadrados a los pares encontrados
+        pareada, j_mejor = self._emparejar(px, py, pt, gx, gy, gt, valida, angulo, mx, my)
+        pares = pareada.sum(axis=1)
+        angulo, mx, my = self._ajustar(px, py, gx, gy, pareada, j_mejor, angulo, mx, my)
+        pares = np.maximum(pares, self._emparejar(px, py, pt, gx, gy, gt, valida, angulo, mx, my)[0].sum(axis=1))
+
+        calculado = np.minimum(100, 100 * pares / np.sqrt(np.maximum(n * total, 1))).astype(np.int32)
+        scores[:] = np.where(pares >= self.min_pares, calculado, 0)
+        return scores
+
+    def _emparejar(self, px, py, pt, gx, gy, gt, valida, angulo, mx, my):
+        """
+        Empareja las minucias del probe alineado con las de cada template
+
+        Returns:
+            (pareada (G, n): la minucia i del probe tiene par, j_mejor (G, n): su par)
+        """
+        dos_pi = 2 * math.pi
+        c, s = np.cos(angulo)[:, None], np.sin(angulo)[:, None]
+        ax = c * px[None, :] - s * py[None, :] + mx[:, None]                  # (G, n)
+        ay = s * px[None, :] + c * py[None, :] + my[:, None]
+        at = pt[None, :] + angulo[:, None]
+        distancia = (gx[:, None, :] - ax[:, :, None]) ** 2 + (gy[:, None, :] - ay[:, :, None]) ** 2
+        diferencia = np.mod(gt[:, None, :] - at[:, :, None], dos_pi)
+        compatibles = (
+            valida[:, None, :]
+            & (distancia <= self.tol_distancia ** 2)
+            & (np.minimum(diferencia, dos_pi - diferencia) <= self.tol_angulo)
+        )
+        distancia = np.where(compatibles, distancia, np.inf)
+        # Vecino más cercano mutuo: cada minucia queda en a lo sumo un par
+        j_mejor = distancia.argmin(axis=2)                                   # (G, n)
+        i_mejor = distancia.argmin(axis=1)                                   # (G, M)
+        hay = np.take_along_axis(distancia, j_mejor[:, :, None], axis=2)[:, :, 0] < np.inf
+        mutuo = np.take_along_axis(i_mejor, j_mejor, axis=1) == np.arange(len(px))[None, :]
+        return hay & mutuo, j_mejor
+
+    @staticmethod
+    def _ajustar(px, py, gx, gy, pareada, j_mejor, angulo, mx, my):
+        """Rotación y traslación que mejor superponen los pares (Procrustes por template)"""
+        w = pareada.astype(np.float64)
+        peso = w.sum(axis=1)
+        ajustable = peso >= 2
+        peso = np.maximum(peso, 1)
+        qx = np.take_along_axis(gx, j_mejor, axis=1)
+        qy = np.take_along_axis(gy, j_mejor, axis=1)
+        cpx, cpy = (w * px).sum(axis=1) / peso, (w * py).sum(axis=1) / peso
+        cqx, cqy = (w * qx).sum(axis=1) / peso, (w * qy).sum(axis=1) / peso
+        ax, ay = px[None, :] - cpx[:, None], py[None, :] - cpy[:, None]
+        bx, by = qx - cqx[:, None], qy - cqy[:, None]
+        nuevo = np.arctan2((w * (ax * by - ay * bx)).sum(axis=1), (w * (ax * bx + ay * by)).sum(axis=1))
+        c, s = np.cos(nuevo), np.sin(nuevo)
+        return (
+            np.where(ajustable, nuevo, angulo),
+            np.where(ajustable, cqx - (c * cpx - s * cpy), mx),
+            np.where(ajustable, cqy - (s * cpx + c * cpy), my)
+        )
+
+    def compare_lote(self, probe: bytes, templates: Sequence[bytes]) -> List[Tuple[bool, int]]:
+        """Compara un probe contra varios templates en una sola pasada vectorizada"""
+        scores = self.puntuar(probe, self.apilar(templates))
+        return [(score >= self.umbral, score) for score in scores.tolist()]
+
+    def compare_templates(self, template1: bytes, template2: bytes) -> Tuple[bool, int]:
+        """Compara dos templates ISO 19794-2"""
+        return self.compare_lote(template1, [template2])[0]
@@ -0,0 +1,231 @@
+"""
+Sesiones de pase de lista
+Al abrir una sesión se calcula una sola vez la lista de credenciales del grupo
+(allowCredentials) y se entrega un lote de challenges; cada verificación dentro
+de la sesión se valida contra ese estado en memoria en lugar de recorrer la base
+de datos, y al cerrarla se obtiene la lista de ausentes. Los challenges se emiten
+en el almacén compartido (ChallengeStore), con su límite global
+"""
+
+import secrets
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from challenge_store import ChallengeStore
+
+
+class SesionesLlenas(RuntimeError):
+    """Hay demasiadas sesiones abiertas; el cliente debe reintentar más tarde"""
+
+
+class RollCallSessions:
+    """
+    Registro de sesiones de pase de lista abiertas
+
+    Los challenges de una sesión son de un solo uso y viven lo que la sesión;
+    una sesión sin actividad durante `ttl` segundos, o abierta hace más de
+    `duracion_max`, se descarta y sus challenges pendientes se retiran del
+    almacén. Las sesiones solo existen en este proceso.
+    """
+
+    def __init__(self, ttl: float = 3 * 3600, max_challenges: int = 200,
+                 challenges: Optional[ChallengeStore] = None, max_sesiones: int = 50,
+                 duracion_max: float = 12 * 3600):
+        """
+        Args:
+            ttl: Segundos sin actividad tras los que una sesión se descarta
+            max_challenges: Máximo de challenges pendientes por sesión
+            challenges: Almacén donde se emiten los challenges (por defecto, uno en memoria)
+            max_sesiones: Máximo de sesiones abiertas a la vez
+            duracion_max: Segundos tras los que una sesión se descarta aunque siga activa
+        """
+        self.ttl = ttl
+        self.max_challenges = max_challenges
+        self.challenges = challenges if challenges is not None else ChallengeStore(ttl)
+        self.max_sesiones = max_sesiones
+        self.duracion_max = duracion_max
+        self._lock = threading.Lock()
+        self._sesiones = {}  # sesion_id -> estado de la sesión
+
+    @staticmethod
+    def _contexto(sesion_id: str) -> str:
+        """Contexto con el que se emiten los challenges de una sesión"""
+        return f"sesion:{sesion_id}"
+
+    def _emitir(self, sesion_id: str, cantidad: int) -> List[str]:
+        """Emite challenges de la sesión en el almacén compartido (con el candado)"""
+        contexto = self._contexto(sesion_id)
+        return [self.challenges.emitir(contexto, self.ttl) for _ in range(cantidad)]
+
+    def _liberar(self, sesion_id: str, pendientes: Iterable[str]):
+        """Retira del almacén los challenges que la sesión no llegó a usar"""
+        contexto = self._contexto(sesion_id)
+        for challenge in pendientes:
+            self.challenges.consumir(challenge, contexto)
+
+    def _vencida(self, sesion: Dict, ahora: float) -> bool:
+        """Indica si una sesión pasó `ttl` sin actividad o `duracion_max` desde que se abrió"""
+        return ahora - sesion['actividad'] > self.ttl or ahora - sesion['abierta'] > self.duracion_max
+
+    def abrir(self, grupo_id: str, credenciales: Dict[str, str], miembros: List[str],
+              challenges: int) -> Dict:
+        """
+        Abre una sesión para un grupo
+
+        Args:
+            grupo_id: ID del grupo
+            credenciales: credential_id -> user_id de los alumnos del grupo
+            miembros: IDs de los alumnos del grupo al abrir la sesión
+            challenges: Número de challenges a emitir de inicio
+
+        Returns:
+            Copia del estado de la sesión, con 'challenges' (la lista recién emitida)
+
+        Raises:
+            SesionesLlenas: si ya hay max_sesiones sesiones abiertas
+        """
+        self.limpiar()
+        sesion_id = secrets.token_urlsafe(12)
+        ahora = time.time()
+        sesion = {
+            'sesion_id': sesion_id,
+            'grupo_id': grupo_id,
+            'credenciales': dict(credenciales),
+            # allowCredentials ya con el formato de WebAuthn, calculado una sola vez
+            'allowed_credentials': [
+                {'id': credential_id, 'type': 'public-key'} for credential_id in credenciales
+            ],
+            'miembros': list(miembros),
+            'challenges': set(),
+            'presentes': {},  # user_id -> asistencia
+            'abierta': ahora,
+            'actividad': ahora
+        }
+        with self._lock:
+            if len(self._sesiones) >= self.max_sesiones:
+                raise SesionesLlenas(f"Hay {len(self._sesiones)} sesiones de pase de lista abiertas")
+            emitidos = self._emitir(sesion_id, max(0, min(challenges, self.max_challenges)))
+            sesion['challenges'].update(emitidos)
+            self._sesiones[sesion_id] = sesion
+            resultado = self._copia(sesion)
+        resultado['challenges'] = emitidos
+        return resultado
+
+    @staticmethod
+    def _copia(sesion: Dict) -> Dict:
+        """Copia del estado de una sesión sin las estructuras internas (con el candado)"""
+        resultado = {
+            clave: valor for clave, valor in sesion.items()
+            if clave not in ('credenciales', 'challenges', 'presentes')
+        }
+        resultado['presentes'] = dict(sesion['presentes'])
+        resultado['challenges_pendientes'] = len(sesion['challenges'])
+        return resultado
+
+    def _obtener(self, sesion_id: str) -> Optional[Dict]:
+        """Sesión abierta y no vencida (con el candado); registra la actividad"""
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is None:
+            return None
+        ahora = time.time()
+        if self._vencida(sesion, ahora):
+            del self._sesiones[sesion_id]
+            self._liberar(sesion_id, sesion['challenges'])
+            return None
+        sesion['actividad'] = ahora
+        return sesion
+
+    def estado(self, sesion_id: str) -> Optional[Dict]:
+        """Copia del estado de una sesión (None si no existe o ya venció)"""
+        with self._lock:
+            sesion = self._obtener(sesion_id)
+            return self._copia(sesion) if sesion is not None else None
+
+    def emitir_challenges(self, sesion_id: str, cantidad: int) -> Optional[List[str]]:
+        """
+        Emite más challenges para una sesión, sin pasar del máximo pendiente
+
+        Returns:
+            Los challenges nuevos, o None si la sesión no existe
+        """
+        with self._lock:
+            sesion = self._obtener(sesion_id)
+            if sesion is None:
+                return None
+            cantidad = max(0, min(cantidad, self.max_challenges - len(sesion['challenges'])))
+            emitidos = self._emitir(sesion_id, cantidad)
+            sesion['challenges'].update(emitidos)
+        return emitidos
+
+    def resolver(self, sesion_id: str, credential_id: str,
+                 challenge: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        Consume el challenge y busca la credencial en el estado de la sesión
+
+        Args:
+            sesion_id: ID de la sesión
+            credential_id: Credencial presentada
+            challenge: Challenge firmado por el navegador (None = no comprobarlo)
+
+        Returns:
+            (estado, user_id): estado 'ok', 'no_encontrada' (la credencial no está
+            en la lista de la sesión), 'challenge_invalido' o 'sin_sesion'
+        """
+        with self._lock:
+            sesion = self._obtener(sesion_id)
+            if sesion is None:
+                return 'sin_sesion', None
+            if challenge is not None:
+                if challenge not in sesion['challenges']:
+                    return 'challenge_invalido', None
+                sesion['challenges'].discard(challenge)
+                # El almacén pudo descartarlo por su límite global
+                if not self.challenges.consumir(challenge, self._contexto(sesion_id)):
+                    return 'challenge_invalido', None
+            user_id = sesion['credenciales'].get(credential_id)
+        return ('ok', user_id) if user_id is not None else ('no_encontrada', None)
+
+    def agregar_credencial(self, sesion_id: str, credential_id: str, user_id: str):
+        """Agrega a la sesión una credencial registrada después de abrirla"""
+        with self._lock:
+            sesion = self._sesiones.get(sesion_id)
+            if sesion is not None and credential_id not in sesion['credenciales']:
+                sesion['credenciales'][credential_id] = user_id
+                sesion['allowed_credentials'].append({'id': credential_id, 'type': 'public-key'})
+                if user_id not in sesion['miembros']:
+                    sesion['miembros'].append(user_id)
+
+    def marcar_presente(self, sesion_id: str, user_id: str, asistencia: Dict):
+        """Registra en la sesión que el alumno ya pasó lista"""
+        with self._lock:
+            sesion = self._sesiones.get(sesion_id)
+            if sesion is not None:
+                sesion['presentes'].setdefault(user_id, asistencia)
+
+    def cerrar(self, sesion_id: str) -> Optional[Dict]:
+        """
+        Cierra una sesión
+
+        Returns:
+            Copia del estado final con 'ausentes' (miembros que no pasaron lista),
+            o None si la sesión no existe
+        """
+        with self._lock:
+            sesion = self._sesiones.pop(sesion_id, None)
+            if sesion is None:
+                return None
+            resultado = self._copia(sesion)
+            self._liberar(sesion_id, sesion['challenges'])
+        resultado['ausentes'] = [
+            user_id for user_id in resultado['miembros'] if user_id not in resultado['presentes']
+        ]
+        resultado['cerrada'] = time.time()
+        return resultado
+
+    def limpiar(self):
+        """Descarta las sesiones vencidas (sin actividad durante `ttl` o abiertas más de `duracion_max`)"""
+        ahora = time.time()
+        with self._lock:
+            for sesion_id in [s for s, sesion in self._sesiones.items() if self._vencida(sesion, ahora)]:
+                self._liberar(sesion_id, self._sesiones.pop(sesion_id)['challenges'])
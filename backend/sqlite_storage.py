@@ -0,0 +1,421 @@
+"""
+Motor de almacenamiento SQLite para la base de datos de alumnos
+Implementa la misma interfaz que WebAuthnDatabase usando sqlite3 (biblioteca estándar)
+con índices por grupo, credencial y fecha
+"""
+
+import os
+import sys
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+
+from attendance_log import AttendanceLog, asistencia_dict, timestamp_de_iso
+from attendance_matrix import AttendanceMatrix
+from checkin_index import CheckinIndex
+from stats_index import StatsIndex
+from webauthn_handler import WebAuthnDatabase, ReadWriteLock
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS grupos (
+    grupo_id TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    carrera_tecnica TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS alumnos (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    grupo_id TEXT,
+    registered_at TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_alumnos_grupo_id ON alumnos(grupo_id);
+
+CREATE TABLE IF NOT EXISTS credenciales (
+    credential_id TEXT NOT NULL,
+    user_id TEXT NOT NULL REFERENCES alumnos(user_id) ON DELETE CASCADE,
+    public_key TEXT NOT NULL,
+    registered_at TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_credenciales_credential_id ON credenciales(credential_id);
+CREATE INDEX IF NOT EXISTS idx_credenciales_user_id ON credenciales(user_id);
+
+CREATE TABLE IF NOT EXISTS asistencias (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES alumnos(user_id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    hora TEXT NOT NULL,
+    tipo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_asistencias_fecha ON asistencias(fecha);
+CREATE INDEX IF NOT EXISTS idx_asistencias_user_id ON asistencias(user_id, timestamp);
+"""
+
+
+class SQLiteWebAuthnDatabase(WebAuthnDatabase):
+    """
+    Base de datos de alumnos respaldada por SQLite
+
+    Mantiene el diccionario `fingerprints` en memoria con la misma forma que el
+    motor JSON (para no cambiar a quienes lo leen), pero cada modificación se
+    escribe como una sentencia puntual en lugar de reescribir todo el archivo,
+    y las consultas por grupo, credencial o fecha usan índices.
+    """
+
+    def __init__(self, db_file: str = "asistencia.db", dedupe: Optional[CheckinIndex] = None):
+        """
+        Inicializa la base de datos SQLite
+
+        Args:
+            db_file: Archivo SQLite donde se almacenan alumnos, grupos y asistencias
+            dedupe: Política para descartar asistencias repetidas (por defecto, ninguna)
+        """
+        self.db_file = db_file
+        self.fingerprints = {}
+        self.grupos = {}
+        self._version_grupos = 0  # Cambia con cada save_grupos
+        self._credential_index = {}
+        self._group_index = {}
+        self._matrix = AttendanceMatrix()
+        self._stats = StatsIndex()
+        self._roster = {}
+        self._claves = OrderedDict()
+        self._dedupe = dedupe or CheckinIndex()
+        self._init_generaciones()
+        self._lock = ReadWriteLock()
+        # La conexión solo se usa con el candado de escritura tomado: las lecturas
+        # se responden desde los datos en memoria, sin consultas
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.load_database()
+
+    def load_database(self):
+        """Carga alumnos, credenciales, asistencias y grupos desde SQLite"""
+        with self._lock.write():
+            try:
+                fingerprints = {}
+                for row in self.conn.execute(
+                    "SELECT user_id, name, grupo_id, registered_at FROM alumnos"
+                ):
+                    alumno = {
+                        'name': row['name'],
+                        'registered_at': row['registered_at'],
+                        'credentials': []
+                    }
+                    if row['grupo_id'] is not None:
+                        alumno['grupo_id'] = row['grupo_id']
+                    fingerprints[row['user_id']] = alumno
+
+                for row in self.conn.execute(
+                    "SELECT credential_id, user_id, public_key, registered_at "
+                    "FROM credenciales ORDER BY rowid"
+                ):
+                    fingerprints[row['user_id']]['credentials'].append({
+                        'credential_id': row['credential_id'],
+                        'public_key': row['public_key'],
+                        'registered_at': row['registered_at']
+                    })
+
+                for row in self.conn.execute(
+                    "SELECT user_id, timestamp, tipo FROM asistencias ORDER BY user_id, timestamp"
+                ):
+                    alumno = fingerprints[row['user_id']]
+                    log = alumno.get('asistencias')
+                    if log is None:
+                        log = alumno['asistencias'] = AttendanceLog()
+                    log.append(timestamp_de_iso(row['timestamp']), row['tipo'])
+
+                self.fingerprints = fingerprints
+                self._rebuild_indexes()
+                self.grupos = {
+                    row['grupo_id']: {
+                        'nombre': row['nombre'],
+                        'carrera_tecnica': row['carrera_tecnica'],
+                        'created_at': row['created_at']
+                    }
+                    for row in self.conn.execute(
+                        "SELECT grupo_id, nombre, carrera_tecnica, created_at FROM grupos"
+                    )
+                }
+                self._version_grupos += 1
+                print(f"✓ Base de datos SQLite cargada: {len(self.fingerprints)} usuarios registrados")
+            except Exception as e:
+                print(f"Error al cargar base de datos SQLite: {e}")
+                self.fingerprints = {}
+                self._credential_index = {}
+                self._group_index = {}
+                self._matrix = AttendanceMatrix()
+                self._stats = StatsIndex()
+                self._roster = {}
+                self._init_generaciones()
+                self.grupos = {}
+
+    def save_database(self):
+        """
+        Sincroniza todo el contenido en memoria con SQLite
+
+        Solo es necesario si alguien modificó `fingerprints` directamente;
+        los métodos de esta clase ya escriben cada cambio al momento.
+        """
+        with self._lock.write():
+            try:
+                with self.conn:
+                    self.conn.execute("DELETE FROM asistencias")
+                    self.conn.execute("DELETE FROM credenciales")
+                    self.conn.execute("DELETE FROM alumnos")
+                    self._insert_alumnos(self.fingerprints)
+                print(f"✓ Base de datos guardada")
+            except Exception as e:
+                print(f"Error al guardar base de datos SQLite: {e}")
+
+    def compact(self):
+        """SQLite no usa bitácora propia; no hay nada que compactar"""
+        pass
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Cada cambio ya se confirma en su propia transacción (WAL)"""
+        return True
+
+    def wait_durable(self, seq=None, timeout: float = 10.0) -> bool:
+        """Cada cambio ya se confirma en su propia transacción (WAL)"""
+        return True
+
+    def close(self):
+        """Cierra la conexión a SQLite"""
+        with self._lock.write():
+            self.conn.close()
+
+    def _insert_alumnos(self, fingerprints: Dict):
+        """Inserta alumnos, credenciales y asistencias (dentro de una transacción abierta)"""
+        self.conn.executemany(
+            "INSERT INTO alumnos (user_id, name, grupo_id, registered_at) VALUES (?, ?, ?, ?)",
+            [
+                (user_id, data.get('name', ''), data.get('grupo_id'), data.get('registered_at', ''))
+                for user_id, data in fingerprints.items()
+            ]
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO credenciales (credential_id, user_id, public_key, registered_at) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (c['credential_id'], user_id, c.get('public_key', ''), c.get('registered_at', ''))
+                for user_id, data in fingerprints.items()
+                for c in data.get('credentials', [])
+            ]
+        )
+        self.conn.executemany(
+            "INSERT INTO asistencias (user_id, timestamp, fecha, hora, tipo) VALUES (?, ?, ?, ?, ?)",
+            [
+                (user_id, a['timestamp'], a['fecha'], a['hora'], a.get('tipo'))
+                for user_id, data in fingerprints.items()
+                if data.get('asistencias')
+                for a in data['asistencias'].to_dicts(user_id, data.get('name', ''))
+            ]
+        )
+
+    def add_student(self, user_id: str, name: str, grupo_id: str, durable: bool = False):
+        """Registra (o actualiza) un alumno sin credenciales"""
+        with self._lock.write():
+            try:
+                with self.conn:
+                    registered_at = datetime.now().isoformat()
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO alumnos (user_id, name, grupo_id, registered_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (user_id, name, grupo_id, registered_at)
+                    )
+                    self.conn.execute(
+                        "UPDATE alumnos SET name = ?, grupo_id = ? WHERE user_id = ?",
+                        (name, grupo_id, user_id)
+                    )
+            except Exception as e:
+                print(f"Error al guardar alumno en SQLite: {e}")
+                return
+
+            self._registrar_alumno(user_id, name, grupo_id, registered_at)
+
+    def add_group_student(self, grupo_id: str, name: str, durable: bool = False) -> str:
+        """Registra un alumno nuevo en un grupo con el siguiente ID libre (<grupo_id>-NNN)"""
+        with self._lock.write():
+            user_id = self._siguiente_id(grupo_id)
+            self.add_student(user_id, name, grupo_id, durable)
+        return user_id
+
+    def add_credential(self, user_id: str, credential_id: str, public_key: str, name: str = "",
+                       durable: bool = False):
+        """Añade una credencial WebAuthn con una sola escritura indexada"""
+        with self._lock.write():
+            registered_at = datetime.now().isoformat()
+            anterior = self.find_user_by_credential_id(credential_id)
+            try:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO alumnos (user_id, name, registered_at) VALUES (?, ?, ?)",
+                        (user_id, name, registered_at)
+                    )
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO credenciales (credential_id, user_id, public_key, registered_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (credential_id, user_id, public_key, registered_at)
+                    )
+            except Exception as e:
+                print(f"Error al guardar credencial en SQLite: {e}")
+                return
+
+            if user_id not in self.fingerprints:
+                self.fingerprints[user_id] = {
+                    'name': name,
+                    'registered_at': registered_at,
+                    'credentials': []
+                }
+                self._stats.agregar(self.fingerprints[user_id])
+            # Un credential_id es único: quitarlo de quien lo tuviera antes
+            for uid in {anterior, user_id}:
+                if uid in self.fingerprints:
+                    self._stats.quitar(self.fingerprints[uid])
+                    self.fingerprints[uid]['credentials'] = [
+                        c for c in self.fingerprints[uid].get('credentials', [])
+                        if c['credential_id'] != credential_id
+                    ]
+            self.fingerprints[user_id]['credentials'].append({
+                'credential_id': credential_id,
+                'public_key': public_key,
+                'registered_at': registered_at
+            })
+            for uid in {anterior, user_id}:
+                if uid in self.fingerprints:
+                    self._stats.agregar(self.fingerprints[uid])
+                    self._tocar(self.fingerprints[uid].get('grupo_id'))
+            self._credential_index[credential_id] = user_id
+            print(f"✓ Credencial WebAuthn registrada para usuario: {user_id} ({name})")
+
+    def delete_user(self, user_id: str, durable: bool = False) -> bool:
+        """Elimina un alumno junto con sus credenciales y asistencias"""
+        with self._lock.write():
+            if user_id not in self.fingerprints:
+                print(f"✗ Usuario {user_id} no encontrado")
+                return False
+            try:
+                with self.conn:
+                    self.conn.execute("DELETE FROM alumnos WHERE user_id = ?", (user_id,))
+            except Exception as e:
+                print(f"Error al eliminar usuario en SQLite: {e}")
+                return False
+            self._unindex_user(user_id)
+            del self.fingerprints[user_id]
+            print(f"✓ Usuario {user_id} eliminado")
+            return True
+
+    def add_asistencias(self, registros: List[Tuple[str, float, Optional[str], Optional[str]]],
+                        durable: bool = False) -> List[Tuple[Dict, bool]]:
+        """Registra varias asistencias (ya sin las repetidas) en una sola transacción"""
+        with self._lock.write():
+            resultados, nuevos = self._filtrar_lote(registros)
+            filas = []
+            for user_id, ts, tipo, clave in nuevos:
+                asistencia = asistencia_dict(user_id, '', ts, tipo)
+                filas.append((user_id, asistencia['timestamp'], asistencia['fecha'], asistencia['hora'], tipo))
+            if filas:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT INTO asistencias (user_id, timestamp, fecha, hora, tipo) VALUES (?, ?, ?, ?, ?)",
+                        filas
+                    )
+            for user_id, ts, tipo, clave in nuevos:
+                self._append_asistencia(user_id, self.fingerprints[user_id], ts, tipo)
+                if clave is not None:
+                    self._recordar_clave(clave, user_id, ts)
+        return resultados
+
+    # ==================== GRUPOS ====================
+
+    def version_grupos(self) -> int:
+        """Versión del catálogo de grupos (para ETags)"""
+        return self._version_grupos
+
+    def load_grupos(self) -> Dict:
+        """Devuelve una copia del catálogo de grupos"""
+        with self._lock.read():
+            return {grupo_id: dict(data) for grupo_id, data in self.grupos.items()}
+
+    def save_grupos(self, grupos: Dict) -> bool:
+        """Sincroniza el catálogo de grupos con la tabla `grupos`"""
+        with self._lock.write():
+            try:
+                with self.conn:
+                    eliminados = set(self.grupos) - set(grupos)
+                    self.conn.executemany(
+                        "DELETE FROM grupos WHERE grupo_id = ?",
+                        [(grupo_id,) for grupo_id in eliminados]
+                    )
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO grupos (grupo_id, nombre, carrera_tecnica, created_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (grupo_id, data.get('nombre', ''), data.get('carrera_tecnica', ''),
+                             data.get('created_at', ''))
+                            for grupo_id, data in grupos.items()
+                            if self.grupos.get(grupo_id) != data
+                        ]
+                    )
+                self.grupos = {grupo_id: dict(data) for grupo_id, data in grupos.items()}
+                self._version_grupos += 1
+                return True
+            except Exception as e:
+                print(f"Error al guardar grupos en SQLite: {e}")
+                return False
+
+
+def importar_desde_json(db_file: str, alumnos_file: str = "alumnos.json",
+                        grupos_file: str = "grupos.json") -> SQLiteWebAuthnDatabase:
+    """
+    Importa una sola vez los archivos JSON existentes a una base de datos SQLite
+
+    Args:
+        db_file: Archivo SQLite de destino (debe estar vacío)
+        alumnos_file: Archivo JSON de alumnos (se reaplica su bitácora de asistencias)
+        grupos_file: Archivo JSON de grupos
+
+    Returns:
+        La base de datos SQLite ya cargada
+    """
+    import json
+
+    db = SQLiteWebAuthnDatabase(db_file)
+    if db.fingerprints or db.grupos:
+        raise ValueError(f"La base de datos {db_file} ya contiene datos; no se importa de nuevo")
+
+    origen = WebAuthnDatabase(db_file=alumnos_file)
+    grupos = {}
+    if os.path.exists(grupos_file):
+        with open(grupos_file, 'r', encoding='utf-8') as f:
+            grupos = json.load(f)
+
+    with db.write_lock():
+        with db.conn:
+            db._insert_alumnos(origen.fingerprints)
+        db.save_grupos(grupos)
+        db.load_database()
+
+    total_asistencias = sum(len(a.get('asistencias') or ()) for a in db.fingerprints.values())
+    print(f"✓ Importados {len(db.fingerprints)} alumnos, {len(db.grupos)} grupos "
+          f"y {total_asistencias} asistencias a {db_file}")
+    return db
+
+
+if __name__ == '__main__':
+    # Uso: python sqlite_storage.py [asistencia.db] [alumnos.json] [grupos.json]
+    args = sys.argv[1:]
+    importar_desde_json(
+        args[0] if len(args) > 0 else "asistencia.db",
+        args[1] if len(args) > 1 else "alumnos.json",
+        args[2] if len(args) > 2 else "grupos.json"
+    )
@@ -0,0 +1,104 @@
+"""
+Estadísticas de alumnos mantenidas de forma incremental
+Cada modificación de un alumno resta su aportación anterior y suma la nueva,
+así /api/estadisticas no necesita recorrer todos los alumnos
+"""
+
+from typing import Dict, Optional
+
+
+def aportacion(user_data: Dict) -> tuple:
+    """(grupo_id, tiene huella, número de asistencias) de un alumno"""
+    return (
+        user_data.get('grupo_id'),
+        1 if user_data.get('credentials') else 0,
+        len(user_data.get('asistencias') or ())
+    )
+
+
+class StatsIndex:
+    """
+    Totales globales y por grupo
+
+    Por grupo se guarda [alumnos, alumnos con huella, asistencias]; los
+    alumnos sin grupo solo cuentan en los totales globales.
+    """
+
+    def __init__(self):
+        self.total_alumnos = 0
+        self.alumnos_con_huella = 0
+        self.total_asistencias = 0
+        self.grupos = {}  # grupo_id -> [alumnos, con huella, asistencias]
+
+    def _aplicar(self, grupo_id: Optional[str], huella: int, asistencias: int, signo: int):
+        self.total_alumnos += signo
+        self.alumnos_con_huella += signo * huella
+        self.total_asistencias += signo * asistencias
+        if grupo_id is None:
+            return
+        totales = self.grupos.get(grupo_id)
+        if totales is None:
+            totales = self.grupos[grupo_id] = [0, 0, 0]
+        totales[0] += signo
+        totales[1] += signo * huella
+        totales[2] += signo * asistencias
+        if totales[0] == 0:
+            del self.grupos[grupo_id]
+
+    def agregar(self, user_data: Dict):
+        """Suma la aportación de un alumno"""
+        self._aplicar(*aportacion(user_data), 1)
+
+    def quitar(self, user_data: Dict):
+        """Resta la aportación de un alumno"""
+        self._aplicar(*aportacion(user_data), -1)
+
+    def agregar_asistencia(self, grupo_id: Optional[str]):
+        """Suma una asistencia de un alumno del grupo indicado"""
+        self.total_asistencias += 1
+        if grupo_id is not None:
+            self.grupos[grupo_id][2] += 1
+
+    def resumen(self) -> Dict:
+        """Copia de los totales con nombres de campo de la API"""
+        return {
+            'total_alumnos': self.total_alumnos,
+            'alumnos_con_huella': self.alumnos_con_huella,
+            'total_asistencias': self.total_asistencias,
+            'grupos': {
+                grupo_id: {
+                    'total_alumnos': totales[0],
+                    'alumnos_con_huella': totales[1],
+                    'total_asistencias': totales[2]
+                }
+                for grupo_id, totales in self.grupos.items()
+            }
+        }
+
+    @classmethod
+    def desde(cls, fingerprints: Dict) -> 'StatsIndex':
+        """Calcula los totales desde cero"""
+        stats = cls()
+        for user_data in fingerprints.values():
+            stats.agregar(user_data)
+        return stats
+
+
+def diferencias(esperado, obtenido, ruta: str = '') -> Dict:
+    """
+    Compara dos estructuras de estadísticas
+
+    Returns:
+        {ruta: (esperado, obtenido)} por cada valor distinto; vacío si coinciden
+    """
+    if isinstance(esperado, dict) and isinstance(obtenido, dict):
+        resultado = {}
+        for clave in set(esperado) | set(obtenido):
+            resultado.update(diferencias(
+                esperado.get(clave), obtenido.get(clave),
+                f"{ruta}.{clave}" if ruta else str(clave)
+            ))
+        return resultado
+    if esperado != obtenido:
+        return {ruta: (esperado, obtenido)}
+    return {}
@@ -0,0 +1,323 @@
+"""
+Galería binaria de templates de huellas mapeada en memoria
+El archivo tiene una cabecera fija, una tabla de posiciones de tamaño fijo y
+los registros con los bytes del template tal cual. Se lee con mmap: cada
+template se entrega como un memoryview de solo lectura sobre el archivo, sin
+copiarlo ni decodificarlo. Inscribir escribe solo el registro nuevo y su
+entrada en la tabla, en un archivo con espacio de sobra que se vuelve a mapear
+solo cuando se llena; borrar marca la entrada, y los registros borrados se
+eliminan compactando el archivo en segundo plano
+"""
+
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+MAGIA = b'HUELLAS\x00'
+VERSION = 2
+
+# Cabecera: magia, versión, capacidad de la tabla, entradas usadas, entradas vivas, fin de los datos
+CABECERA = struct.Struct('<8sHxxIIIQ')
+# Entrada de la tabla: posición del registro, longitud, estado
+ENTRADA = struct.Struct('<QIB3x')
+# Registro: longitudes de user_id, nombre, fecha y template (seguidos de sus bytes)
+REGISTRO = struct.Struct('<HHHI')
+
+LIBRE, VIVO, BORRADO = 0, 1, 2
+
+
+class TemplateStore:
+    """
+    Galería de templates en un archivo binario
+
+    Las escrituras van al archivo y las lecturas al mapa de solo lectura. El
+    archivo se agranda al doble cuando los datos no caben y solo entonces se
+    vuelve a mapear. El índice guarda posiciones, no vistas: cada lectura
+    corta el mapa actual, así que un memoryview entregado es para usarlo y
+    soltarlo (el mapa anterior se cierra en cuanto nadie usa sus vistas).
+    """
+
+    def __init__(self, ruta: str, capacidad_inicial: int = 1024, umbral_compactacion: float = 0.25,
+                 min_borrados: int = 64, durable: bool = False):
+        """
+        Args:
+            ruta: Archivo de la galería (se crea si no existe)
+            capacidad_inicial: Entradas de la tabla en un archivo nuevo
+            umbral_compactacion: Fracción de entradas borradas que dispara la compactación
+            min_borrados: Borrados mínimos antes de compactar
+            durable: Hacer fsync después de cada escritura
+        """
+        self.ruta = ruta
+        self.capacidad_inicial = max(1, capacidad_inicial)
+        self.umbral_compactacion = umbral_compactacion
+        self.min_borrados = min_borrados
+        self.durable = durable
+        self._lock = threading.RLock()
+        self._compactando = None
+        self._archivo = None
+        self._mapa = None
+        self._vista = None
+        self._viejos = []  # Mapas anteriores que aún tienen vistas en uso
+        if not os.path.exists(ruta):
+            self._escribir_archivo(ruta, [], self.capacidad_inicial)
+        self._abrir()
+
+    # ==================== ARCHIVO ====================
+
+    def _escribir_archivo(self, ruta: str, registros: List[bytes], capacidad: int):
+        """Escribe un archivo completo con los registros dados (todos vivos)"""
+        datos = CABECERA.size + capacidad * ENTRADA.size
+        fin = datos + sum(len(registro) for registro in registros)
+        with open(ruta, 'wb') as f:
+            f.write(CABECERA.pack(MAGIA, VERSION, capacidad, len(registros), len(registros), fin))
+            posicion = datos
+            for registro in registros:
+                f.write(ENTRADA.pack(posicion, len(registro), VIVO))
+                posicion += len(registro)
+            f.write(b'\x00' * ((capacidad - len(registros)) * ENTRADA.size))
+            for registro in registros:
+                f.write(registro)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _abrir(self):
+        """Abre y mapea el archivo y reconstruye el índice en memoria"""
+        self._archivo = open(self.ruta, 'r+b')
+        self._mapear()
+        magia, version, self._capacidad, self._usadas, self._vivas, self._fin = CABECERA.unpack_from(self._mapa, 0)
+        if magia != MAGIA or version != VERSION:
+            raise ValueError(f"{self.ruta} no es una galería de templates (versión {VERSION})")
+        self._indice = {}  # user_id -> (entrada, inicio del template, fin, nombre, fecha)
+        for entrada in range(self._usadas):
+            posicion, longitud, estado = ENTRADA.unpack_from(self._mapa, CABECERA.size + entrada * ENTRADA.size)
+            if estado == VIVO:
+                user_id, datos = self._leer_registro(posicion)
+                self._indice[user_id] = (entrada,) + datos
+        self._vivas = len(self._indice)
+
+    def _mapear(self):
+        """Mapea el archivo completo en solo lectura y suelta el mapa anterior"""
+        self._soltar_mapas()
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self._vista = memoryview(self._mapa)
+
+    def _soltar_mapas(self):
+        """
+        Cierra el mapa actual y los anteriores que ya no tienen vistas en uso
+
+        Un mapa con memoryviews vivos no se puede cerrar (BufferError): queda
+        en `_viejos` y se vuelve a intentar en el siguiente cambio de mapa.
+        """
+        if self._mapa is not None:
+            self._vista.release()
+            self._viejos.append(self._mapa)
+            self._mapa = self._vista = None
+        pendientes = []
+        for mapa in self._viejos:
+            try:
+                mapa.close()
+            except BufferError:
+                pendientes.append(mapa)
+        self._viejos = pendientes
+
+    def _reservar(self, fin: int):
+        """Agranda el archivo (al doble, como mínimo) si los datos no caben en el mapa"""
+        if fin > len(self._mapa):
+            self._archivo.truncate(max(fin, 2 * len(self._mapa)))
+            self._mapear()
+
+    def _leer_registro(self, posicion: int) -> Tuple[str, Tuple[int, int, str, str]]:
+        """Lee la cabecera de un registro: (user_id, (inicio, fin del template, nombre, fecha))"""
+        largo_id, largo_nombre, largo_fecha, largo_template = REGISTRO.unpack_from(self._mapa, posicion)
+        inicio = posicion + REGISTRO.size
+        user_id = bytes(self._vista[inicio:inicio + largo_id]).decode('utf-8')
+        inicio += largo_id
+        nombre = bytes(self._vista[inicio:inicio + largo_nombre]).decode('utf-8')
+        inicio += largo_nombre
+        fecha = bytes(self._vista[inicio:inicio + largo_fecha]).decode('utf-8')
+        inicio += largo_fecha
+        return user_id, (inicio, inicio + largo_template, nombre, fecha)
+
+    def _escribir(self, posicion: int, datos: bytes):
+        self._archivo.seek(posicion)
+        self._archivo.write(datos)
+
+    def _sincronizar(self):
+        self._archivo.flush()
+        if self.durable:
+            os.fsync(self._archivo.fileno())
+
+    def _escribir_cabecera(self):
+        self._escribir(0, CABECERA.pack(MAGIA, VERSION, self._capacidad, self._usadas, self._vivas, self._fin))
+
+    # ==================== LECTURA ====================
+
+    def __len__(self) -> int:
+        return len(self._indice)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._indice
+
+    def template(self, user_id: str) -> Optional[memoryview]:
+        """Template de un alumno como memoryview de solo lectura del mapa actual (None si no existe)"""
+        with self._lock:
+            datos = self._indice.get(user_id)
+            return self._vista[datos[1]:datos[2]] if datos is not None else None
+
+    def registro(self, user_id: str) -> Optional[Dict]:
+        """Datos de un alumno sin el template: {'name', 'registered_at'} (None si no existe)"""
+        with self._lock:
+            datos = self._indice.get(user_id)
+            if datos is None:
+                return None
+            return {'name': datos[3], 'registered_at': datos[4]}
+
+    def registros(self) -> Iterator[Tuple[str, Dict]]:
+        """(user_id, datos sin el template) de todos los alumnos, en orden de inscripción"""
+        with self._lock:
+            orden = sorted(self._indice.items(), key=lambda par: par[1][0])
+        for user_id, (_, _, _, nombre, fecha) in orden:
+            yield user_id, {'name': nombre, 'registered_at': fecha}
+
+    def galeria(self) -> List[Tuple[str, memoryview]]:
+        """(user_id, template) de toda la galería, sin copiar los templates (vistas del mapa actual)"""
+        with self._lock:
+            return [(user_id, self._vista[datos[1]:datos[2]]) for user_id, datos in self._indice.items()]
+
+    # ==================== ESCRITURA ====================
+
+    def agregar(self, user_id: str, template: bytes, name: str = "",
+                registered_at: Optional[str] = None):
+        """
+        Inscribe (o reemplaza) el template de un alumno
+
+        Escribe el registro después del último, su entrada en la tabla y la
+        cabecera; si la tabla está llena, antes compacta el archivo con el doble
+        de capacidad (si la compactación falla, la galería queda como estaba).
+        """
+        registered_at = registered_at or datetime.now().isoformat()
+        campos = [user_id.encode('utf-8'), name.encode('utf-8'), registered_at.encode('utf-8')]
+        registro = REGISTRO.pack(*(len(campo) for campo in campos), len(template)) + b''.join(campos)
+        with self._lock:
+            if self._usadas >= self._capacidad:
+                self._compactar(max(self.capacidad_inicial, 2 * (self._vivas + 1)))
+            if user_id in self._indice:
+                self._borrar(user_id)
+            posicion = self._fin
+            longitud = len(registro) + len(template)
+            self._reservar(posicion + longitud)
+            self._escribir(posicion, registro)
+            self._archivo.write(template)
+            entrada = self._usadas
+            self._escribir(CABECERA.size + entrada * ENTRADA.size, ENTRADA.pack(posicion, longitud, VIVO))
+            self._usadas += 1
+            self._vivas += 1
+            self._fin = posicion + longitud
+            self._escribir_cabecera()
+            self._sincronizar()
+            self._indice[user_id] = (entrada,) + self._leer_registro(posicion)[1]
+
+    def _borrar(self, user_id: str):
+        """Marca como borrada la entrada de un alumno (con el candado)"""
+        entrada = self._indice.pop(user_id)[0]
+        # El estado es el byte 12 de la entrada
+        self._escribir(CABECERA.size + entrada * ENTRADA.size + 12, bytes([BORRADO]))
+        self._vivas -= 1
+        self._escribir_cabecera()
+
+    def borrar(self, user_id: str) -> bool:
+        """
+        Borra el template de un alumno (marca su entrada; los bytes se liberan al compactar)
+
+        Returns:
+            True si se borró, False si no existía
+        """
+        with self._lock:
+            if user_id not in self._indice:
+                return False
+            self._borrar(user_id)
+            self._sincronizar()
+            borrados = self._usadas - self._vivas
+            compactar = (
+                borrados >= self.min_borrados
+                and borrados >= self._usadas * self.umbral_compactacion
+                and self._compactando is None
+            )
+            if compactar:
+                self._compactando = threading.Thread(target=self._compactar_en_segundo_plano, daemon=True)
+                self._compactando.start()
+        return True
+
+    # ==================== COMPACTACIÓN ====================
+
+    def _compactar(self, capacidad: Optional[int] = None):
+        """
+        Reescribe el archivo solo con los registros vivos (con el candado)
+
+        El archivo nuevo se escribe aparte y reemplaza al actual después de
+        cerrar los mapas (en Windows no se puede reemplazar un archivo
+        mapeado). Si el reemplazo falla, se vuelve a abrir el archivo original
+        y se relanza el error.
+        """
+        capacidad = max(capacidad or 0, self.capacidad_inicial, 2 * self._vivas)
+        registros = []
+        for _, (entrada, _, _, _, _) in sorted(self._indice.items(), key=lambda par: par[1][0]):
+            posicion, longitud, _ = ENTRADA.unpack_from(self._mapa, CABECERA.size + entrada * ENTRADA.size)
+            registros.append(self._vista[posicion:posicion + longitud])
+        temporal = self.ruta + '.tmp'
+        try:
+            self._escribir_archivo(temporal, registros, capacidad)
+        finally:
+            # Soltar las vistas antes de cerrar el mapa
+            for registro in registros:
+                registro.release()
+        try:
+            self._soltar_mapas()
+            self._archivo.close()
+            os.replace(temporal, self.ruta)
+        except OSError:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            self._abrir()
+            raise
+        self._abrir()
+
+    def _compactar_en_segundo_plano(self):
+        try:
+            with self._lock:
+                self._compactar()
+        except OSError as e:
+            # P. ej. en Windows, si una identificación aún usa vistas del mapa; se reintenta en el siguiente borrado
+            print(f"Error al compactar la galería: {e}")
+        finally:
+            self._compactando = None
+
+    def compactar(self):
+        """Compacta la galería ahora (espera a que termine una compactación en curso)"""
+        hilo = self._compactando
+        if hilo is not None:
+            hilo.join()
+        with self._lock:
+            self._compactar()
+
+    def sincronizar(self):
+        """Lleva a disco las escrituras pendientes"""
+        with self._lock:
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+
+    def cerrar(self):
+        """Espera a la compactación en curso y cierra los mapas y el archivo"""
+        hilo = self._compactando
+        if hilo is not None:
+            hilo.join()
+        with self._lock:
+            self._soltar_mapas()
+            if not self._archivo.closed:
+                self._archivo.close()
@@ -0,0 +1,59 @@
+"""
+Configuración común de las pruebas del backend
+Los módulos del backend se importan por nombre (from webauthn_handler import ...),
+igual que cuando se ejecuta app.py desde backend/
+"""
+
+import base64
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    """
+    Cliente de pruebas de la API con escritura inmediata y archivos temporales
+
+    Returns:
+        (cliente de Flask, base de datos), con el grupo 'G1' ya creado
+    """
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    import app as servidor
+    from webauthn_handler import WebAuthnDatabase
+
+    grupos_file = tmp_path / "grupos.json"
+    grupos_file.write_text(json.dumps({'G1': {'nombre': 'Grupo 1'}}), encoding='utf-8')
+    db = WebAuthnDatabase(db_file=str(tmp_path / "alumnos.json"), flush_interval_ms=0, compact_every=1,
+                          dedupe=servidor.crear_dedupe())
+    monkeypatch.setattr(servidor, 'FLUSH_INTERVAL_MS', 0)
+    monkeypatch.setattr(servidor, 'STORAGE_BACKEND', 'json')
+    monkeypatch.setattr(servidor, 'GRUPOS_FILE', str(grupos_file))
+    monkeypatch.setattr(servidor, '_grupos_cache', None)
+    monkeypatch.setattr(servidor, 'webauthn_db', db)
+    monkeypatch.setattr(servidor, 'sesiones', None)
+    yield servidor.app.test_client(), db
+    # Si una prueba dejó hilos bloqueados, close() también se bloquearía: no esperar de más
+    cerrar = threading.Thread(target=db.close, daemon=True)
+    cerrar.start()
+    cerrar.join(20.0)
+
+
+@pytest.fixture
+def client_data():
+    """
+    Pide un challenge de verificación y lo devuelve dentro de un clientDataJSON
+    (base64url), como lo firmaría el navegador
+    """
+    def crear(client, grupo_id=None):
+        challenge = client.post('/api/asistencia/verificar/challenge', json={'grupo_id': grupo_id}).get_json()['challenge']
+        datos = json.dumps({'type': 'webauthn.get', 'challenge': challenge}).encode('utf-8')
+        return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+    return crear
@@ -0,0 +1,73 @@
+"""
+Pruebas del registro de asistencias desde la API
+"""
+
+import time
+
+
+def test_asistencias_manuales_repetidas_se_registran_por_defecto(cliente):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+    for _ in range(2):
+        respuesta = client.post('/api/alumnos/G1-001/asistencias', json={'tipo': 'manual'})
+        assert respuesta.status_code == 201
+        assert respuesta.get_json()['repetida'] is False
+        time.sleep(0.05)  # Instantes distintos aun con un reloj de poca resolución
+    assert len(db.get_asistencias('G1-001')) == 2
+
+
+def test_tipo_de_asistencia_fuera_de_la_lista(cliente):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+    for tipo in (['manual'], {'a': 1}, 3, 'inventado'):
+        respuesta = client.post('/api/alumnos/G1-001/asistencias', json={'tipo': tipo})
+        assert respuesta.status_code == 400
+    assert db.get_asistencias('G1-001') == []
+    respuesta = client.post('/api/alumnos/G1-001/asistencias', json={'tipo': 'webauthn'})
+    assert respuesta.status_code == 201
+    assert respuesta.get_json()['asistencia']['tipo'] == 'webauthn'
+
+
+def test_lote_con_timestamps_invalidos_aplica_los_demas(cliente):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+    db.add_credential('G1-001', 'cred-1', 'clave', 'Ana')
+    ahora = time.time()
+    malos = ['nan', '-inf', 'inf', '-1e15', 0, '1e300', 'ayer']
+    verificaciones = [{'credential_id': 'cred-1', 'timestamp': ts} for ts in malos]
+    verificaciones.insert(3, {'credential_id': 'cred-1', 'timestamp': ahora - 3600, 'clave': 'buena-1'})
+    verificaciones.append({'credential_id': 'cred-1', 'timestamp': ahora - 60, 'clave': 'buena-2'})
+    respuesta = client.post('/api/asistencia/verificar/lote', json={'verificaciones': verificaciones})
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.get_json()
+    estados = [r['estado'] for r in cuerpo['resultados']]
+    assert estados == ['invalido'] * 3 + ['registrada'] + ['invalido'] * 4 + ['registrada']
+    assert cuerpo['registradas'] == 2
+    assert len(db.get_asistencias('G1-001')) == 2
+
+
+def test_verificacion_exige_el_challenge(cliente, client_data):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+    db.add_credential('G1-001', 'cred-1', 'clave', 'Ana')
+    respuesta = client.post('/api/asistencia/verificar', json={'grupo_id': 'G1', 'credential_id': 'cred-1'})
+    assert respuesta.status_code == 400
+    datos = client_data(client, 'G1')
+    cuerpo = {'grupo_id': 'G1', 'credential_id': 'cred-1', 'client_data_json': datos}
+    assert client.post('/api/asistencia/verificar', json=cuerpo).get_json()['encontrado'] is True
+    # El challenge es de un solo uso
+    assert client.post('/api/asistencia/verificar', json=cuerpo).status_code == 400
+    assert len(db.get_asistencias('G1-001')) == 1
+
+
+def test_asistencia_manual_en_sesion_de_otro_grupo(cliente):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+    db.add_student('G2-001', 'Beto', 'G2')
+    sesion = client.post('/api/sesiones', json={'grupo_id': 'G1'}).get_json()
+    respuesta = client.post('/api/alumnos/G2-001/asistencias', json={'sesion_id': sesion['sesion_id']})
+    assert respuesta.status_code == 403
+    assert db.get_asistencias('G2-001') == []
+    respuesta = client.post('/api/alumnos/G1-001/asistencias', json={'sesion_id': sesion['sesion_id']})
+    assert respuesta.status_code == 201
+    assert client.get(f"/api/sesiones/{sesion['sesion_id']}").get_json()['total_presentes'] == 1
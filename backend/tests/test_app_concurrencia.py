@@ -0,0 +1,88 @@
+"""
+Pruebas de concurrencia de los endpoints que escriben en la base de datos
+Con FLUSH_INTERVAL_MS = 0 (escritura inmediata) cada cambio se escribe en el
+hilo de la petición; si se hiciera con el candado de escritura tomado, un
+save_database en otro hilo (que toma _io_lock y luego el de lectura) quedaría
+bloqueado para siempre junto con la petición
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+REPETICIONES = 200
+ESPERA = 20.0  # Segundos antes de dar por bloqueados los hilos
+
+
+def _en_paralelo(*funciones):
+    """Ejecuta las funciones en hilos y falla si alguno no termina a tiempo"""
+    errores = []
+
+    def ejecutar(funcion):
+        try:
+            funcion()
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=ejecutar, args=(funcion,), daemon=True) for funcion in funciones]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(ESPERA)
+    assert not any(hilo.is_alive() for hilo in hilos), "Los hilos quedaron bloqueados (interbloqueo)"
+    assert not errores, errores
+
+
+def _guardar(db):
+    for _ in range(REPETICIONES):
+        db.save_database()
+
+
+def test_alta_de_alumnos_con_guardado_concurrente(cliente):
+    client, db = cliente
+
+    def registrar():
+        for i in range(REPETICIONES):
+            respuesta = client.post('/api/grupos/G1/alumnos', json={'name': f'Alumno {i}'})
+            assert respuesta.status_code == 201
+
+    _en_paralelo(registrar, lambda: _guardar(db))
+    assert db.count_group_students('G1') == REPETICIONES
+    assert len(db.fingerprints) == REPETICIONES
+
+
+def test_asistencia_manual_con_guardado_concurrente(cliente):
+    client, db = cliente
+    db.add_student('G1-001', 'Ana', 'G1')
+
+    def registrar():
+        for _ in range(REPETICIONES):
+            respuesta = client.post('/api/alumnos/G1-001/asistencias', json={'tipo': 'manual'})
+            assert respuesta.status_code in (200, 201)
+
+    _en_paralelo(registrar, lambda: _guardar(db))
+    assert not db.verificar_estadisticas()
+
+
+def test_verificacion_con_guardado_concurrente(cliente, client_data):
+    client, db = cliente
+    db.add_credential('G1-001', 'cred-1', 'clave', 'Ana')
+
+    def verificar():
+        for _ in range(REPETICIONES):
+            respuesta = client.post('/api/asistencia/verificar', json={
+                'credential_id': 'cred-1',
+                'client_data_json': client_data(client)
+            })
+            assert respuesta.get_json()['encontrado'] is True
+
+    _en_paralelo(verificar, lambda: _guardar(db))
+
+
+def test_asistencia_manual_de_alumno_inexistente(cliente):
+    client, _ = cliente
+    respuesta = client.post('/api/alumnos/NADIE/asistencias', json={})
+    assert respuesta.status_code == 404
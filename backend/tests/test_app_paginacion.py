@@ -0,0 +1,72 @@
+"""
+Pruebas de la paginación por cursor de la API (?limite=&cursor=)
+"""
+
+import base64
+import json
+
+import pytest
+
+LUNES = 1709560800.0  # 2024-03-04 14:00 UTC
+
+
+def _cursor(valor) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valor).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _recorrer(client, url, campo, limite):
+    elementos, cursor = [], None
+    while True:
+        respuesta = client.get(url, query_string={'limite': limite, **({'cursor': cursor} if cursor else {})})
+        assert respuesta.status_code == 200
+        datos = respuesta.get_json()
+        elementos.extend(datos[campo])
+        cursor = datos['siguiente']
+        if cursor is None:
+            return elementos
+
+
+def test_paginas_del_roster(cliente):
+    client, db = cliente
+    for nombre in ['Elena', 'ana', 'Diego', 'Beto', 'Carla']:
+        db.add_group_student('G1', nombre)
+    alumnos = _recorrer(client, '/api/grupos/G1/alumnos', 'alumnos', 2)
+    assert [a['name'] for a in alumnos] == ['ana', 'Beto', 'Carla', 'Diego', 'Elena']
+
+
+def test_paginas_de_asistencias(cliente):
+    client, db = cliente
+    user_id = db.add_group_student('G1', 'Ana')
+    db.add_asistencias([(user_id, LUNES + k * 60, None, None) for k in range(7)])
+    asistencias = _recorrer(client, f'/api/alumnos/{user_id}/asistencias', 'asistencias', 3)
+    assert [a['timestamp'] for a in asistencias] == [a['timestamp'] for a in db.get_asistencias(user_id)]
+
+
+@pytest.mark.parametrize('cursor', [
+    _cursor(['a', 'b']),
+    _cursor([LUNES, 'b']),
+    _cursor([True, 1]),
+    _cursor([LUNES, 1.5]),
+    _cursor([LUNES]),
+    _cursor({'ts': LUNES}),
+    'no-es-base64!',
+])
+def test_cursor_invalido_de_asistencias(cliente, cursor):
+    client, db = cliente
+    user_id = db.add_group_student('G1', 'Ana')
+    db.add_asistencias([(user_id, LUNES, None, None)])
+    respuesta = client.get(f'/api/alumnos/{user_id}/asistencias', query_string={'limite': 1, 'cursor': cursor})
+    assert respuesta.status_code == 400
+
+
+@pytest.mark.parametrize('cursor', [
+    _cursor([1, 2]),
+    _cursor(['ANA', None]),
+    _cursor([['ANA'], 'G1-001']),
+    _cursor(['ANA', 'G1-001', 'extra']),
+])
+def test_cursor_invalido_del_roster(cliente, cursor):
+    client, db = cliente
+    db.add_group_student('G1', 'Ana')
+    respuesta = client.get('/api/grupos/G1/alumnos', query_string={'limite': 1, 'cursor': cursor})
+    assert respuesta.status_code == 400
@@ -0,0 +1,61 @@
+"""
+Pruebas del historial compacto de asistencias
+"""
+
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import attendance_log
+from attendance_log import TIPO_OTRO, AttendanceLog, fin_de_fecha, inicio_de_fecha, tipo_code, tipo_de
+from webauthn_handler import WebAuthnDatabase
+
+LUNES = 1709560800.0
+
+
+def test_tipos_ilegibles_se_guardan_como_otro():
+    log = AttendanceLog.from_json([[LUNES, ['lista']], [LUNES + 1, 7], [LUNES + 2, 'manual'], [LUNES + 3]])
+    assert [tipo for _, tipo in log.records()] == [TIPO_OTRO, TIPO_OTRO, 'manual', None]
+
+
+def test_registro_de_tipos_lleno_no_falla(monkeypatch):
+    monkeypatch.setattr(attendance_log, '_TIPOS', list(attendance_log._TIPOS))
+    monkeypatch.setattr(attendance_log, '_TIPO_CODES', dict(attendance_log._TIPO_CODES))
+    for i in range(300):
+        tipo_code(f"tipo-{i}")
+    assert len(attendance_log._TIPOS) == 256
+    assert tipo_de(tipo_code("uno-mas")) == TIPO_OTRO
+    assert tipo_de(tipo_code("manual")) == 'manual'
+
+
+def test_snapshot_con_tipos_antiguos_se_carga(tmp_path):
+    datos = {'A-001': {'name': 'Ana', 'grupo_id': 'A', 'asistencias': [
+        {'timestamp': '2024-03-04T08:00:00', 'tipo': {'origen': 'kiosco'}},
+        [LUNES, ['x']],
+    ]}}
+    ruta = tmp_path / "alumnos.json"
+    ruta.write_text(json.dumps(datos), encoding='utf-8')
+    (tmp_path / "alumnos.json.journal").write_text(
+        json.dumps({'u': 'A-001', 't': LUNES + 60, 'k': [1, 2]}) + '\n', encoding='utf-8')
+    db = WebAuthnDatabase(str(ruta), flush_interval_ms=0)
+    try:
+        assert len(db.get_asistencias('A-001')) == 3
+        assert {a.get('tipo') for a in db.get_asistencias('A-001')} == {TIPO_OTRO}
+    finally:
+        db.close()
+
+
+@pytest.mark.skipif(not hasattr(time, 'tzset'), reason="requiere time.tzset")
+def test_fin_de_fecha_en_cambio_de_horario(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Madrid')
+    time.tzset()
+    try:
+        # El 31 de marzo de 2024 dura 23 h en Madrid
+        assert fin_de_fecha('2024-03-31') == datetime(2024, 4, 1).timestamp()
+        assert fin_de_fecha('2024-03-31') - inicio_de_fecha('2024-03-31') == 23 * 3600
+        assert fin_de_fecha('2024-03-04') == inicio_de_fecha('2024-03-05')
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,40 @@
+"""
+Pruebas de la caché en disco de los reportes exportados
+"""
+
+import os
+
+from export_cache import ExportCache, clave_exportacion
+
+
+def _guardar(cache, clave, contenido):
+    return b''.join(cache.guardar_stream(clave, [contenido]))
+
+
+def test_guarda_y_sirve_desde_disco(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=1000)
+    clave = clave_exportacion('asistencias-xlsx', 'G1', 'abcd-3', 'titulo')
+    assert cache.get(clave) is None
+    assert _guardar(cache, clave, b'x' * 10) == b'x' * 10
+    with open(cache.get(clave), 'rb') as f:
+        assert f.read() == b'x' * 10
+
+
+def test_descarta_los_menos_usados(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=25)
+    _guardar(cache, 'a', b'1' * 10)
+    _guardar(cache, 'b', b'2' * 10)
+    cache.get('a')
+    _guardar(cache, 'c', b'3' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_vacia_los_archivos_de_ejecuciones_anteriores(tmp_path):
+    anterior = ExportCache(str(tmp_path))
+    _guardar(anterior, 'a', b'datos')
+    (tmp_path / 'b.xlsx.123.tmp').write_bytes(b'parcial')
+
+    cache = ExportCache(str(tmp_path))
+    assert cache.get('a') is None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,54 @@
+"""
+Pruebas de las exportaciones en segundo plano
+"""
+
+import time
+import zipfile
+
+import pytest
+
+from export_jobs import ExportJobs, ExportQueueFull
+
+
+def _hojas(n: int = 2):
+    return [
+        {'nombre': f'G{k}', 'titulo': f'Grupo {k}', 'columnas': [('2024-03-04', 0), ('2024-03-05', 1)],
+         'alumnos': [('Ana', 0b01), ('Beto', 0b11)]}
+        for k in range(n)
+    ]
+
+
+def _esperar(jobs, job_id, limite=60.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        estado = jobs.estado(job_id)
+        if estado['estado'] in ('listo', 'error'):
+            return estado
+        time.sleep(0.05)
+    raise AssertionError("La exportación no terminó")
+
+
+def test_genera_el_libro_en_procesos_spawn(tmp_path):
+    jobs = ExportJobs(str(tmp_path), procesos=2)
+    try:
+        estado = _esperar(jobs, jobs.enviar('asistencias.xlsx', _hojas()))
+        assert estado['estado'] == 'listo', estado['error']
+        assert estado['progreso'] == 100
+        assert jobs._pool._mp_context.get_start_method() == 'spawn'
+        with zipfile.ZipFile(estado['archivo']) as libro:
+            assert 'xl/workbook.xml' in libro.namelist()
+    finally:
+        jobs.close()
+
+
+def test_rechaza_trabajos_con_la_cola_llena(tmp_path):
+    jobs = ExportJobs(str(tmp_path), procesos=1, max_pendientes=1)
+    try:
+        primero = jobs.enviar('uno.xlsx', _hojas())
+        with pytest.raises(ExportQueueFull):
+            jobs.enviar('dos.xlsx', _hojas())
+        _esperar(jobs, primero)
+        # Al terminar el primero se admite otro
+        _esperar(jobs, jobs.enviar('dos.xlsx', _hojas()))
+    finally:
+        jobs.close()
@@ -0,0 +1,46 @@
+"""
+Pruebas de las sesiones de pase de lista
+"""
+
+import time
+
+import pytest
+
+from challenge_store import ChallengeStore
+from roll_call import RollCallSessions, SesionesLlenas
+
+CREDENCIALES = {'cred-1': 'A-001', 'cred-2': 'A-002'}
+
+
+def test_challenges_en_el_almacen_compartido():
+    almacen = ChallengeStore(ttl=120, max_challenges=100)
+    sesiones = RollCallSessions(challenges=almacen)
+    sesion = sesiones.abrir('A', CREDENCIALES, ['A-001', 'A-002'], 3)
+    assert len(almacen) == 3
+    # Un challenge de la sesión no sirve para otra operación
+    assert not almacen.consumir(sesion['challenges'][0], 'verificacion:*')
+    assert sesiones.resolver(sesion['sesion_id'], 'cred-1', sesion['challenges'][0]) == ('ok', 'A-001')
+    assert sesiones.resolver(sesion['sesion_id'], 'cred-1', sesion['challenges'][0])[0] == 'challenge_invalido'
+    assert len(almacen) == 2
+    # Al cerrar se retiran los que no se usaron
+    sesiones.cerrar(sesion['sesion_id'])
+    assert len(almacen) == 0
+
+
+def test_maximo_de_sesiones_abiertas():
+    sesiones = RollCallSessions(max_sesiones=2)
+    primera = sesiones.abrir('A', CREDENCIALES, [], 1)
+    sesiones.abrir('B', {}, [], 1)
+    with pytest.raises(SesionesLlenas):
+        sesiones.abrir('C', {}, [], 1)
+    sesiones.cerrar(primera['sesion_id'])
+    sesiones.abrir('C', {}, [], 1)
+
+
+def test_sesion_vence_por_duracion_aunque_siga_activa():
+    almacen = ChallengeStore()
+    sesiones = RollCallSessions(ttl=60, challenges=almacen, duracion_max=0.05)
+    sesion = sesiones.abrir('A', CREDENCIALES, [], 2)
+    time.sleep(0.1)
+    assert sesiones.estado(sesion['sesion_id']) is None
+    assert len(almacen) == 0
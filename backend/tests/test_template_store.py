@@ -0,0 +1,75 @@
+"""
+Pruebas de la galería binaria de templates (TemplateStore)
+"""
+
+import os
+from unittest import mock
+
+import pytest
+
+from template_store import TemplateStore
+
+
+def _template(i: int) -> bytes:
+    return bytes([i % 256]) * (100 + i % 50)
+
+
+@pytest.fixture
+def store(tmp_path):
+    galeria = TemplateStore(str(tmp_path / "huellas.bin"), capacidad_inicial=16, min_borrados=4)
+    yield galeria
+    galeria.cerrar()
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason="requiere /proc/self/fd")
+def test_inscribir_no_acumula_mapas_abiertos(tmp_path):
+    pytest.importorskip("numpy")
+    from fingerprint_reader import FingerprintDatabase
+    from minutiae_matcher import MinutiaeMatcher
+
+    db = FingerprintDatabase(str(tmp_path / "huellas.bin"), matcher=MinutiaeMatcher(), formato='binario')
+    antes = len(os.listdir('/proc/self/fd'))
+    for i in range(1500):
+        db.add_fingerprint(f"u{i}", _template(i), f"Alumno {i}")
+        if i % 100 == 0:
+            # La caché del matcher no debe retener vistas de mapas anteriores
+            db.identify_candidates(_template(i))
+    assert len(os.listdir('/proc/self/fd')) - antes <= 2
+    assert bytes(db.store.template("u7")) == _template(7)
+    db.store.cerrar()
+
+
+def test_reabrir_despues_de_inscribir_borrar_y_compactar(store, tmp_path):
+    for i in range(40):
+        store.agregar(f"u{i}", _template(i), name=f"Alumno {i}")
+    for i in range(0, 40, 2):
+        assert store.borrar(f"u{i}")
+    store.agregar("u1", b"nuevo", name="Reemplazo")
+    store.compactar()
+    store.agregar("extra", b"xyz")
+    store.cerrar()
+
+    reabierta = TemplateStore(store.ruta)
+    try:
+        assert len(reabierta) == 21
+        assert bytes(reabierta.template("u1")) == b"nuevo"
+        assert bytes(reabierta.template("u3")) == _template(3)
+        assert bytes(reabierta.template("extra")) == b"xyz"
+        assert reabierta.registro("u1") == {'name': "Reemplazo", 'registered_at': mock.ANY}
+        assert reabierta.template("u2") is None
+    finally:
+        reabierta.cerrar()
+
+
+def test_compactacion_fallida_deja_la_galeria_usable(store):
+    for i in range(16):
+        store.agregar(f"u{i}", _template(i))
+    # Con la tabla llena, inscribir compacta; el reemplazo falla como en Windows con el archivo en uso
+    with mock.patch('template_store.os.replace', side_effect=PermissionError("en uso")):
+        with pytest.raises(PermissionError):
+            store.agregar("u0", b"reemplazo")
+    assert bytes(store.template("u0")) == _template(0)
+    assert len(store) == 16
+    assert not os.path.exists(store.ruta + '.tmp')
+    store.agregar("u0", b"reemplazo")
+    assert bytes(store.template("u0")) == b"reemplazo"
@@ -0,0 +1,316 @@
+"""
+Pruebas de la capa de datos (WebAuthnDatabase y SQLiteWebAuthnDatabase)
+Estadísticas incrementales, idempotencia y deduplicación de asistencias y
+paginación por cursor; cada prueba se ejecuta con los dos motores
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from checkin_index import CheckinIndex
+from sqlite_storage import SQLiteWebAuthnDatabase
+from webauthn_handler import WebAuthnDatabase
+
+LUNES = datetime(2024, 3, 4, 8, 0).timestamp()
+DIA = 86400
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def abrir(request, tmp_path):
+    """Abre (o vuelve a abrir) la base de datos del motor indicado sobre los mismos archivos"""
+    abiertas = []
+
+    def abrir_db(politica: str = 'ninguna', **opciones):
+        dedupe = CheckinIndex(politica, **opciones)
+        if request.param == 'sqlite':
+            db = SQLiteWebAuthnDatabase(str(tmp_path / "asistencia.db"), dedupe=dedupe)
+        else:
+            db = WebAuthnDatabase(str(tmp_path / "alumnos.json"), flush_interval_ms=0, dedupe=dedupe)
+        abiertas.append(db)
+        return db
+
+    yield abrir_db
+    for db in abiertas:
+        db.close()
+
+
+def _poblar(db):
+    for i, nombre in enumerate(['Carla', 'ana', 'Beto', 'Diego', 'Elena']):
+        db.add_student(f"A-{i + 1:03d}", nombre, 'A')
+    db.add_student('B-001', 'Fer', 'B')
+    db.add_credential('A-001', 'cred-1', 'clave-1', 'Carla')
+    db.add_credential('B-001', 'cred-2', 'clave-2', 'Fer')
+    db.add_asistencias([
+        ('A-001', LUNES, None, None),
+        ('A-002', LUNES + 60, 'manual', None),
+        ('A-001', LUNES + DIA, None, None),
+        ('B-001', LUNES + 2 * DIA, None, None),
+    ])
+
+
+# ==================== ESTADÍSTICAS ====================
+
+def test_estadisticas_incrementales_coinciden_al_agregar(abrir):
+    db = abrir()
+    assert db.verificar_estadisticas() == {}
+    _poblar(db)
+    assert db.verificar_estadisticas() == {}
+    estadisticas = db.get_estadisticas()
+    assert estadisticas['total_alumnos'] == 6
+    assert estadisticas['alumnos_con_huella'] == 2
+    assert estadisticas['total_asistencias'] == 4
+
+
+def test_estadisticas_incrementales_coinciden_al_modificar_y_borrar(abrir):
+    db = abrir()
+    _poblar(db)
+    db.add_student('A-002', 'Ana María', 'B')  # Cambio de grupo
+    assert db.verificar_estadisticas() == {}
+    assert db.delete_user('A-001')
+    assert not db.delete_user('A-001')
+    assert db.verificar_estadisticas() == {}
+    estadisticas = db.get_estadisticas()
+    assert estadisticas['total_alumnos'] == 5
+    assert estadisticas['alumnos_con_huella'] == 1
+    assert estadisticas['total_asistencias'] == 2
+
+
+def test_estadisticas_incrementales_coinciden_al_recargar(abrir):
+    db = abrir()
+    _poblar(db)
+    db.delete_user('A-003')
+    antes = db.get_estadisticas()
+    db.close()
+
+    recargada = abrir()
+    assert recargada.verificar_estadisticas() == {}
+    assert recargada.get_estadisticas() == antes
+
+
+def test_alta_en_grupo_no_reutiliza_ids(abrir):
+    db = abrir()
+    primero = db.add_group_student('A', 'Ana')
+    segundo = db.add_group_student('A', 'Beto')
+    db.delete_user(primero)
+    tercero = db.add_group_student('A', 'Carla')
+    assert (primero, segundo) == ('A-001', 'A-002')
+    assert tercero not in (primero, segundo)
+    assert db.fingerprints[segundo]['name'] == 'Beto'
+
+
+# ==================== CREDENCIALES ====================
+
+def test_reasignar_credencial_reiniciar_y_borrar(abrir):
+    db = abrir()
+    db.add_student('A-001', 'Ana', 'A')
+    db.add_student('B-001', 'Beto', 'B')
+    db.add_credential('A-001', 'cred-1', 'clave', 'Ana')
+    generacion_a = db.generacion('A')
+    db.add_credential('B-001', 'cred-1', 'clave', 'Beto')
+    # La credencial pasa a B y A deja de tenerla
+    assert db.find_user_by_credential_id('cred-1') == 'B-001'
+    assert db.get_user_credentials('A-001') == []
+    assert not db.has_credentials('A-001')
+    assert db.generacion('A') != generacion_a
+    assert db.verificar_estadisticas() == {}
+    db.close()
+
+    recargada = abrir()
+    assert recargada.find_user_by_credential_id('cred-1') == 'B-001'
+    assert recargada.get_user_credentials('A-001') == []
+    assert recargada.delete_user('B-001')
+    assert recargada.find_user_by_credential_id('cred-1') is None
+    assert recargada.verificar_estadisticas() == {}
+
+
+def test_borrar_al_dueno_de_una_credencial_repetida_en_datos_antiguos(tmp_path):
+    import json
+    datos = {
+        'A-001': {'name': 'Ana', 'grupo_id': 'A', 'credentials': [{'credential_id': 'cred-1'}]},
+        'B-001': {'name': 'Beto', 'grupo_id': 'B', 'credentials': [{'credential_id': 'cred-1'}]},
+    }
+    (tmp_path / "alumnos.json").write_text(json.dumps(datos), encoding='utf-8')
+    db = WebAuthnDatabase(str(tmp_path / "alumnos.json"), flush_interval_ms=0)
+    try:
+        assert db.find_user_by_credential_id('cred-1') == 'A-001'
+        db.delete_user('A-001')
+        # Igual que el recorrido lineal: B todavía tiene la credencial
+        assert db.find_user_by_credential_id('cred-1') == 'B-001'
+    finally:
+        db.close()
+
+
+# ==================== IDEMPOTENCIA Y DEDUPLICACIÓN ====================
+
+def test_reenviar_un_lote_no_duplica(abrir):
+    db = abrir()
+    _poblar(db)
+    lote = [('A-003', LUNES + 5, None, 'k1'), ('A-004', LUNES + 6, None, 'k2')]
+    assert [nueva for _, nueva in db.add_asistencias(lote)] == [True, True]
+    repetido = db.add_asistencias(lote)
+    assert [nueva for _, nueva in repetido] == [False, False]
+    assert [a['user_id'] for a, _ in repetido] == ['A-003', 'A-004']
+    assert db.get_estadisticas()['total_asistencias'] == 6
+    assert db.verificar_estadisticas() == {}
+
+
+def test_clave_de_idempotencia_devuelve_la_asistencia_original(abrir):
+    db = abrir()
+    _poblar(db)
+    [(original, nueva)] = db.add_asistencias([('A-003', LUNES + 5, None, 'k1')])
+    assert nueva
+    # Reintento con otra hora del cliente: la clave ya se aplicó
+    [(reintento, nueva)] = db.add_asistencias([('A-003', LUNES + 90, None, 'k1')])
+    assert not nueva
+    assert reintento['timestamp'] == original['timestamp']
+    # Misma clave dos veces dentro del mismo lote
+    resultados = db.add_asistencias([('A-004', LUNES + 7, None, 'k2'), ('A-004', LUNES + 8, None, 'k2')])
+    assert [nueva for _, nueva in resultados] == [True, False]
+    assert len(db.get_asistencias('A-004')) == 1
+
+
+def test_reenviar_despues_de_recargar_no_duplica(abrir):
+    db = abrir()
+    _poblar(db)
+    db.add_asistencias([('A-003', LUNES + 5, None, None)])
+    db.close()
+
+    recargada = abrir()
+    [(_, nueva)] = recargada.add_asistencias([('A-003', LUNES + 5, None, None)])
+    assert not nueva
+    assert len(recargada.get_asistencias('A-003')) == 1
+
+
+def test_asistencia_de_alumno_inexistente(abrir):
+    db = abrir()
+    assert db.add_asistencias([('NADIE', LUNES, None, None)]) == [(None, False)]
+
+
+def test_sin_politica_se_registran_todas(abrir):
+    db = abrir('ninguna')
+    db.add_student('A-001', 'Ana', 'A')
+    resultados = db.add_asistencias([('A-001', LUNES, None, None), ('A-001', LUNES + 3600, 'manual', None)])
+    assert [nueva for _, nueva in resultados] == [True, True]
+
+
+def test_politica_diaria(abrir):
+    db = abrir('diaria')
+    db.add_student('A-001', 'Ana', 'A')
+    [(primera, nueva)] = db.add_asistencias([('A-001', LUNES, None, None)])
+    assert nueva
+    # Otro toque el mismo día devuelve la asistencia ya registrada
+    [(repetida, nueva)] = db.add_asistencias([('A-001', LUNES + 3600, None, None)])
+    assert not nueva
+    assert repetida['timestamp'] == primera['timestamp']
+    # Dentro de un mismo lote y al día siguiente
+    resultados = db.add_asistencias([
+        ('A-001', LUNES + DIA, None, None),
+        ('A-001', LUNES + DIA + 60, None, None),
+    ])
+    assert [nueva for _, nueva in resultados] == [True, False]
+    assert len(db.get_asistencias('A-001')) == 2
+    assert db.verificar_estadisticas() == {}
+
+
+def test_politica_diaria_despues_de_recargar(abrir):
+    db = abrir('diaria')
+    db.add_student('A-001', 'Ana', 'A')
+    db.add_asistencias([('A-001', LUNES, None, None)])
+    db.close()
+
+    recargada = abrir('diaria')
+    [(_, nueva)] = recargada.add_asistencias([('A-001', LUNES + 600, None, None)])
+    assert not nueva
+
+
+def test_politica_intervalo_cruza_la_medianoche(abrir):
+    db = abrir('intervalo', intervalo=60)
+    db.add_student('A-001', 'Ana', 'A')
+    noche = datetime(2024, 3, 4, 23, 59, 50).timestamp()
+    [(primera, nueva)] = db.add_asistencias([('A-001', noche, None, None)])
+    assert nueva
+    # 15 s después, ya en otro día
+    [(repetida, nueva)] = db.add_asistencias([('A-001', noche + 15, None, None)])
+    assert not nueva
+    assert repetida['timestamp'] == primera['timestamp']
+    # Dentro de un mismo lote
+    resultados = db.add_asistencias([('A-001', noche + 120, None, None), ('A-001', noche + 150, None, None)])
+    assert [nueva for _, nueva in resultados] == [True, False]
+    db.close()
+
+    recargada = abrir('intervalo', intervalo=60)
+    # Fuera de orden, un día antes de la más reciente
+    [(_, nueva)] = recargada.add_asistencias([('A-001', noche + 30, None, None)])
+    assert not nueva
+    [(_, nueva)] = recargada.add_asistencias([('A-001', noche + 200, None, None)])
+    assert nueva
+    assert len(recargada.get_asistencias('A-001')) == 3
+
+
+# ==================== PAGINACIÓN ====================
+
+def _recorrer_roster(db, grupo_id, limite):
+    ids, cursor, paginas = [], None, 0
+    while True:
+        pagina, cursor = db.get_roster(grupo_id, cursor, limite)
+        ids.extend(pagina)
+        paginas += 1
+        if cursor is None:
+            return ids, paginas
+
+
+def test_paginacion_del_roster(abrir):
+    db = abrir()
+    _poblar(db)
+    completo, _ = db.get_roster('A')
+    # Ordenado por nombre sin distinguir mayúsculas
+    assert [db.fingerprints[user_id]['name'] for user_id in completo] == ['ana', 'Beto', 'Carla', 'Diego', 'Elena']
+    for limite in (1, 2, 3, 5, 10):
+        ids, paginas = _recorrer_roster(db, 'A', limite)
+        assert ids == completo
+        assert paginas == max(1, -(-len(completo) // limite))
+    assert db.get_roster('NINGUNO') == ([], None)
+
+
+def test_cursor_del_roster_sobrevive_altas(abrir):
+    db = abrir()
+    _poblar(db)
+    pagina, cursor = db.get_roster('A', None, 2)
+    # Un alta antes del cursor no se repite ni desplaza la página siguiente
+    db.add_student('A-010', 'Aarón', 'A')
+    siguiente, _ = db.get_roster('A', cursor, 2)
+    assert siguiente == ['A-001', 'A-004']
+    assert not set(pagina) & set(siguiente)
+
+
+def test_paginacion_de_asistencias(abrir):
+    db = abrir()
+    db.add_student('A-001', 'Ana', 'A')
+    instantes = [LUNES + k * 3600 for k in range(10)]
+    db.add_asistencias([('A-001', ts, None, None) for ts in instantes])
+    for limite in (1, 3, 4, 10):
+        vistos, cursor = [], None
+        while True:
+            pagina = db.get_asistencias_rango('A-001', cursor=cursor, limite=limite)
+            assert pagina['total'] == 10
+            vistos.extend(a['timestamp'] for a in pagina['asistencias'])
+            cursor = pagina['siguiente']
+            if cursor is None:
+                break
+        assert vistos == [a['timestamp'] for a in db.get_asistencias('A-001')]
+
+
+def test_paginacion_de_asistencias_en_un_rango(abrir):
+    db = abrir()
+    db.add_student('A-001', 'Ana', 'A')
+    db.add_asistencias([('A-001', LUNES + k * DIA, None, None) for k in range(7)])
+    desde = (datetime.fromtimestamp(LUNES) + timedelta(days=2)).timestamp()
+    hasta = desde + 3 * DIA
+    primera = db.get_asistencias_rango('A-001', desde, hasta, limite=2)
+    assert primera['total'] == 3
+    assert len(primera['asistencias']) == 2
+    segunda = db.get_asistencias_rango('A-001', desde, hasta, cursor=primera['siguiente'], limite=2)
+    assert len(segunda['asistencias']) == 1
+    assert segunda['siguiente'] is None
+    assert db.get_asistencias_rango('NADIE') is None
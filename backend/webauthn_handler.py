@@ -6,49 +6,895 @@ Permite usar el lector de huellas del teléfono móvil
 import json
 import os
 import base64
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterator, List, Tuple
 import secrets
 
+from attendance_log import AttendanceLog, asistencia_dict, fecha_de, timestamp_de_iso
+from attendance_matrix import AttendanceMatrix
+from challenge_store import ChallengeStore
+from checkin_index import CheckinIndex
+from stats_index import StatsIndex, diferencias
+
+
+class ReadWriteLock:
+    """
+    Candado de lectores/escritor
+    
+    Varias lecturas pueden ejecutarse a la vez; una escritura es exclusiva.
+    Los escritores en espera tienen prioridad para que las lecturas continuas
+    no los dejen sin turno. Es reentrante: un hilo que ya escribe puede volver
+    a leer o escribir, y un hilo que ya lee puede volver a leer.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # Identificador del hilo que escribe
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+    
+    def _read_depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+    
+    def acquire_read(self):
+        """Toma el candado en modo lectura"""
+        depth = self._read_depth()
+        if depth == 0:
+            # Solo este mismo hilo puede haberse registrado como escritor
+            if self._writer == threading.get_ident():
+                self._local.counted = False
+            else:
+                with self._cond:
+                    while self._writer is not None or self._writers_waiting:
+                        self._cond.wait()
+                    self._readers += 1
+                self._local.counted = True
+        self._local.depth = depth + 1
+    
+    def release_read(self):
+        """Libera el candado de lectura"""
+        depth = self._read_depth() - 1
+        self._local.depth = depth
+        if depth == 0 and getattr(self._local, 'counted', False):
+            self._local.counted = False
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+    
+    def acquire_write(self):
+        """Toma el candado en modo escritura (exclusivo)"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if self._read_depth() > 0:
+                raise RuntimeError("No se puede escribir mientras el mismo hilo mantiene una lectura")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers > 0:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+    
+    def release_write(self):
+        """Libera el candado de escritura"""
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+    
+    @contextmanager
+    def read(self):
+        """Contexto de lectura: `with lock.read(): ...`"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write(self):
+        """Contexto de escritura: `with lock.write(): ...`"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
 
 class WebAuthnDatabase:
     """Clase para gestionar credenciales WebAuthn"""
     
-    def __init__(self, db_file: str = "alumnos.json"):
+    # Claves de idempotencia de asistencias recordadas (las más antiguas se olvidan)
+    MAX_CLAVES_IDEMPOTENCIA = 10000
+    
+    def __init__(self, db_file: str = "alumnos.json", journal_file: Optional[str] = None,
+                 compact_every: int = 500, flush_interval_ms: int = 0,
+                 flush_max_mutations: int = 50, dedupe: Optional[CheckinIndex] = None):
         """
         Inicializa la base de datos de credenciales WebAuthn
         
         Args:
             db_file: Archivo JSON donde se almacenan las credenciales
+            journal_file: Bitácora de asistencias (por defecto <db_file>.journal)
+            compact_every: Número de asistencias en la bitácora que dispara una compactación
+            flush_interval_ms: Si es mayor que 0, los cambios se escriben en segundo plano
+                agrupados como máximo cada tantos milisegundos (0 = escritura inmediata)
+            flush_max_mutations: Cambios pendientes que fuerzan una escritura antes del intervalo
+            dedupe: Política para descartar asistencias repetidas (por defecto, ninguna)
         """
         self.db_file = db_file
+        self.journal_file = journal_file or f"{db_file}.journal"
+        self.compact_every = compact_every
+        self.journal_entries = 0
+        self._journal_fp = None
         self.fingerprints = {}
+        self._credential_index = {}  # credential_id -> user_id
+        self._group_index = {}  # grupo_id -> set(user_id)
+        self._matrix = AttendanceMatrix()  # alumno × fecha
+        self._stats = StatsIndex()  # totales globales y por grupo
+        self._roster = {}  # grupo_id -> lista ordenada de (NOMBRE, user_id)
+        self._claves = OrderedDict()  # clave de idempotencia -> (user_id, ts)
+        self._dedupe = dedupe or CheckinIndex()  # (alumno, fecha) -> última asistencia
+        self._init_generaciones()
+        self._lock = ReadWriteLock()  # Protege fingerprints y los índices
+        
+        # Escritura diferida (write-behind)
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_max_mutations = flush_max_mutations
+        # Serializa las escrituras a disco. Se toma antes que el candado de lectura
+        # (_write_snapshot), así que nunca se espera con el de escritura tomado
+        self._io_lock = threading.Lock()
+        self._flush_cond = threading.Condition()
+        self._pending_journal = []  # Líneas de bitácora aún no escritas
+        self._pending_count = 0
+        self._dirty = False  # Hay cambios que requieren reescribir el snapshot
+        self._flush_requested = False
+        self._mutation_seq = 0
+        self._durable_seq = 0
+        self._closed = False
+        self._flusher = None
+        
         self.load_database()
+        if flush_interval_ms > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="webauthn-db-flusher", daemon=True
+            )
+            self._flusher.start()
     
     def load_database(self):
-        """Carga la base de datos desde el archivo"""
-        if os.path.exists(self.db_file):
-            try:
-                with open(self.db_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+        """Carga la base de datos desde el archivo y reaplica la bitácora de asistencias"""
+        with self._lock.write():
+            if os.path.exists(self.db_file):
+                try:
+                    with open(self.db_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    # Historiales de asistencia a su representación compacta
+                    for user_data in data.values():
+                        if 'asistencias' in user_data:
+                            user_data['asistencias'] = AttendanceLog.from_json(user_data['asistencias'])
                     self.fingerprints = data
-                print(f"✓ Base de datos cargada: {len(self.fingerprints)} usuarios registrados")
-            except Exception as e:
-                print(f"Error al cargar base de datos: {e}")
+                    print(f"✓ Base de datos cargada: {len(self.fingerprints)} usuarios registrados")
+                except Exception as e:
+                    print(f"Error al cargar base de datos: {e}")
+                    self.fingerprints = {}
+            else:
                 self.fingerprints = {}
-        else:
-            self.fingerprints = {}
+            self._replay_journal()
+            self._rebuild_indexes()
     
-    def save_database(self):
-        """Guarda la base de datos en el archivo"""
+    def read_lock(self):
+        """
+        Contexto para leer `fingerprints` de forma consistente desde otros módulos
+        
+        Las lecturas pueden ejecutarse en paralelo; las modificaciones esperan.
+        """
+        return self._lock.read()
+    
+    def write_lock(self):
+        """Contexto para modificar `fingerprints` de forma exclusiva"""
+        return self._lock.write()
+    
+    def _init_generaciones(self):
+        """Inicializa los contadores de generación de los datos"""
+        # Distingue esta instancia de otras (p. ej. tras reiniciar el proceso)
+        self._epoca = secrets.token_hex(4)
+        self._generacion = 0
+        self._generacion_base = 0
+        self._generaciones_grupo = {}  # grupo_id -> generación de su último cambio
+    
+    def _tocar(self, *grupos: Optional[str]):
+        """Avanza la generación global y la de los grupos indicados (con el candado de escritura)"""
+        self._generacion += 1
+        for grupo_id in grupos:
+            if grupo_id is not None:
+                self._generaciones_grupo[grupo_id] = self._generacion
+    
+    def generacion(self, grupo_id: Optional[str] = None) -> str:
+        """
+        Versión de los datos de un grupo (o de todos los alumnos si no se indica)
+        
+        Cambia con cualquier modificación de los alumnos o asistencias del grupo;
+        sirve como clave de caché y ETag. Incluye una época aleatoria del proceso:
+        no se repite entre reinicios, así que no debe guardarse para el siguiente.
+        """
+        if grupo_id is None:
+            return f"{self._epoca}-{self._generacion}"
+        return f"{self._epoca}-{self._generaciones_grupo.get(grupo_id, self._generacion_base)}"
+    
+    def _rebuild_indexes(self):
+        """Reconstruye los índices en memoria a partir de `fingerprints`"""
+        # Todo se recarga: cualquier versión anterior deja de ser válida
+        self._tocar()
+        self._generacion_base = self._generacion
+        self._generaciones_grupo = {}
+        self._credential_index = {}
+        self._group_index = {}
+        self._matrix = AttendanceMatrix()
+        self._stats = StatsIndex.desde(self.fingerprints)
+        self._roster = {}
+        for user_id, user_data in self.fingerprints.items():
+            if user_data.get('grupo_id') is not None:
+                self._roster.setdefault(user_data['grupo_id'], []).append(self._clave_roster(user_id, user_data))
+            for cred in user_data.get('credentials', []):
+                # Igual que el recorrido lineal: gana el primer usuario con la credencial
+                self._credential_index.setdefault(cred.get('credential_id'), user_id)
+            self._index_group(user_id, None, user_data.get('grupo_id'))
+            if user_data.get('asistencias'):
+                self._matrix.add_log(user_id, user_data['asistencias'])
+        for lista in self._roster.values():
+            lista.sort()
+        self._dedupe.construir(self.fingerprints)
+    
+    def _index_group(self, user_id: str, grupo_anterior: Optional[str], grupo_nuevo: Optional[str]):
+        """Mueve a un alumno entre grupos en el índice de pertenencia"""
+        if grupo_anterior is not None:
+            miembros = self._group_index.get(grupo_anterior)
+            if miembros is not None:
+                miembros.discard(user_id)
+                if not miembros:
+                    del self._group_index[grupo_anterior]
+        if grupo_nuevo is not None:
+            self._group_index.setdefault(grupo_nuevo, set()).add(user_id)
+    
+    @staticmethod
+    def _clave_roster(user_id: str, user_data: Dict) -> tuple:
+        """Clave de orden de un alumno en la lista de su grupo (por nombre, luego por ID)"""
+        return (user_data.get('name', '').upper(), user_id)
+    
+    def _roster_agregar(self, user_id: str, user_data: Dict):
+        """Inserta a un alumno en la lista ordenada de su grupo"""
+        if user_data.get('grupo_id') is not None:
+            lista = self._roster.setdefault(user_data['grupo_id'], [])
+            bisect.insort(lista, self._clave_roster(user_id, user_data))
+    
+    def _roster_quitar(self, user_id: str, user_data: Dict):
+        """Quita a un alumno de la lista ordenada de su grupo"""
+        lista = self._roster.get(user_data.get('grupo_id'))
+        if not lista:
+            return
+        clave = self._clave_roster(user_id, user_data)
+        i = bisect.bisect_left(lista, clave)
+        if i < len(lista) and lista[i] == clave:
+            del lista[i]
+            if not lista:
+                del self._roster[user_data['grupo_id']]
+    
+    def _replay_journal(self):
+        """Aplica sobre el snapshot las asistencias pendientes de la bitácora"""
+        self.journal_entries = 0
+        if not os.path.exists(self.journal_file):
+            return
+        
+        # Instantes ya presentes por usuario, para no duplicar asistencias si el
+        # proceso se detuvo entre la escritura del snapshot y el truncado de la bitácora
+        vistos = {}
+        aplicadas = 0
         try:
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.fingerprints, f, indent=2, ensure_ascii=False)
-            print(f"✓ Base de datos guardada")
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    linea = linea.strip()
+                    if not linea:
+                        continue
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        # Última línea incompleta por una caída durante la escritura
+                        print("⚠ Línea inválida en la bitácora de asistencias, se ignora")
+                        continue
+                    
+                    self.journal_entries += 1
+                    if 'u' in entrada:
+                        user_id, ts, tipo = entrada['u'], entrada.get('t'), entrada.get('k')
+                        if entrada.get('i') is not None and ts is not None:
+                            self._recordar_clave(entrada['i'], user_id, ts)
+                    else:
+                        # Formato anterior: {"user_id": ..., "asistencia": {...}}
+                        user_id = entrada.get('user_id')
+                        asistencia = entrada.get('asistencia') or {}
+                        ts = timestamp_de_iso(asistencia['timestamp']) if asistencia.get('timestamp') else None
+                        tipo = asistencia.get('tipo')
+                    if user_id not in self.fingerprints or ts is None:
+                        continue
+                    
+                    log = self.fingerprints[user_id].get('asistencias')
+                    if log is None:
+                        log = self.fingerprints[user_id]['asistencias'] = AttendanceLog()
+                    if user_id not in vistos:
+                        vistos[user_id] = set(log.ts)
+                    if ts in vistos[user_id]:
+                        continue
+                    
+                    log.append(ts, tipo)
+                    vistos[user_id].add(ts)
+                    aplicadas += 1
+            if aplicadas:
+                print(f"✓ Bitácora aplicada: {aplicadas} asistencias recuperadas")
         except Exception as e:
-            print(f"Error al guardar base de datos: {e}")
+            print(f"Error al leer bitácora de asistencias: {e}")
+    
+    def save_database(self):
+        """
+        Guarda la base de datos completa en el archivo (compactación)
+        
+        El snapshot ya contiene todas las asistencias en memoria, así que
+        la bitácora se trunca después de escribirlo.
+        """
+        with self._io_lock:
+            with self._flush_cond:
+                # Lo pendiente queda incluido en este snapshot
+                self._pending_journal = []
+                self._pending_count = 0
+                self._dirty = False
+                seq = self._mutation_seq
+            try:
+                self._write_snapshot()
+                print(f"✓ Base de datos guardada")
+            except Exception as e:
+                print(f"Error al guardar base de datos: {e}")
+                return
+            self._mark_durable(seq)
+    
+    def _serialize_snapshot(self) -> str:
+        """
+        Serializa `fingerprints` con un alumno por línea
+        
+        Los historiales de asistencia se escriben en su formato compacto
+        ([ts] o [ts, tipo]) en lugar de un diccionario por asistencia.
+        """
+        lineas = [
+            f"  {json.dumps(user_id, ensure_ascii=False)}: "
+            + json.dumps(user_data, separators=(',', ':'), ensure_ascii=False, default=AttendanceLog.to_json)
+            for user_id, user_data in self.fingerprints.items()
+        ]
+        if not lineas:
+            return "{}\n"
+        return "{\n" + ",\n".join(lineas) + "\n}\n"
+    
+    def compact(self):
+        """Reescribe el snapshot completo y vacía la bitácora de asistencias"""
+        self.save_database()
+    
+    def _write_snapshot(self):
+        """
+        Escribe el snapshot de forma atómica: archivo temporal + fsync + rename
+        
+        Si el proceso se cae a mitad de la escritura, alumnos.json conserva
+        la versión anterior completa.
+        """
+        with self._lock.read():
+            contenido = self._serialize_snapshot()
+        
+        temp_file = f"{self.db_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.db_file)
+        self._truncate_journal()
+    
+    def _truncate_journal(self):
+        """Vacía la bitácora de asistencias"""
+        if self._journal_fp is not None:
+            self._journal_fp.close()
+            self._journal_fp = None
+        if os.path.exists(self.journal_file):
+            open(self.journal_file, 'w', encoding='utf-8').close()
+        self.journal_entries = 0
+    
+    def _write_journal_lines(self, lineas: List[str], sync: bool = False):
+        """Agrega líneas compactas a la bitácora de asistencias"""
+        if self._journal_fp is None:
+            self._journal_fp = open(self.journal_file, 'a', encoding='utf-8')
+        self._journal_fp.write(''.join(lineas))
+        self._journal_fp.flush()
+        if sync:
+            os.fsync(self._journal_fp.fileno())
+        self.journal_entries += len(lineas)
+    
+    @staticmethod
+    def _journal_line(entrada: Dict) -> str:
+        """Serializa una entrada de bitácora como una línea JSON compacta"""
+        return json.dumps(entrada, separators=(',', ':'), ensure_ascii=False) + '\n'
+    
+    # ==================== ESCRITURA DIFERIDA ====================
+    
+    def _schedule_save(self, durable: bool = False):
+        """Marca el snapshot como pendiente de escribir (o lo escribe ya, sin write-behind)"""
+        if self._flusher is None:
+            self.save_database()
+            return
+        with self._flush_cond:
+            self._dirty = True
+            seq = self._register_mutation()
+        if durable:
+            self.wait_durable(seq)
+    
+    def _schedule_journal_lote(self, entradas: List[Dict], durable: bool = False):
+        """Encola varias líneas de bitácora que se escriben juntas, con un solo fsync si es durable"""
+        lineas = [self._journal_line(entrada) for entrada in entradas]
+        if not lineas:
+            return
+        if self._flusher is None:
+            with self._io_lock:
+                try:
+                    self._write_journal_lines(lineas, sync=durable)
+                except Exception as e:
+                    print(f"Error al escribir bitácora de asistencias: {e}")
+                    escribir_snapshot = True
+                else:
+                    escribir_snapshot = bool(self.compact_every and self.journal_entries >= self.compact_every)
+            if escribir_snapshot:
+                self.compact()
+            return
+        with self._flush_cond:
+            self._pending_journal.extend(lineas)
+            seq = self._register_mutation()
+        if durable:
+            self.wait_durable(seq)
+    
+    def _register_mutation(self) -> int:
+        """Cuenta un cambio pendiente (llamar con _flush_cond tomado)"""
+        self._mutation_seq += 1
+        self._pending_count += 1
+        if self._pending_count == 1 or self._pending_count >= self.flush_max_mutations:
+            self._flush_cond.notify_all()
+        return self._mutation_seq
+    
+    def _mark_durable(self, seq: int):
+        """Registra que los cambios hasta `seq` ya están en disco"""
+        with self._flush_cond:
+            if seq > self._durable_seq:
+                self._durable_seq = seq
+            self._flush_cond.notify_all()
     
-    def add_credential(self, user_id: str, credential_id: str, public_key: str, name: str = ""):
+    def wait_durable(self, seq: Optional[int] = None, timeout: float = 10.0) -> bool:
+        """
+        Espera a que los cambios hasta `seq` (por defecto, todos) estén en disco
+        
+        Returns:
+            True si se escribieron antes del timeout
+        """
+        limite = time.monotonic() + timeout
+        with self._flush_cond:
+            if seq is None:
+                seq = self._mutation_seq
+            if self._flusher is None or not self._flusher.is_alive():
+                return self._durable_seq >= seq
+            self._flush_requested = True
+            self._flush_cond.notify_all()
+            while self._durable_seq < seq:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self._flush_cond.wait(restante)
+            return True
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Fuerza la escritura de todos los cambios pendientes y espera a que terminen"""
+        if self._flusher is None:
+            return True
+        return self.wait_durable(timeout=timeout)
+    
+    def _flush_loop(self):
+        """Hilo escritor: agrupa los cambios y los escribe como máximo cada flush_interval_ms"""
+        intervalo = self.flush_interval_ms / 1000.0
+        while True:
+            with self._flush_cond:
+                while not self._closed and self._pending_count == 0:
+                    self._flush_cond.wait()
+                # Esperar a que se junten más cambios, salvo que alguien pida escritura inmediata
+                limite = time.monotonic() + intervalo
+                while (not self._closed and not self._flush_requested
+                       and self._pending_count < self.flush_max_mutations):
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._flush_cond.wait(restante)
+                self._flush_requested = False
+                cerrar = self._closed
+            self._flush_pending()
+            if cerrar:
+                return
+    
+    def _flush_pending(self):
+        """Escribe de una sola vez todo lo pendiente: bitácora o snapshot completo"""
+        with self._io_lock:
+            with self._flush_cond:
+                lineas, self._pending_journal = self._pending_journal, []
+                dirty = self._dirty
+                self._dirty = False
+                self._pending_count = 0
+                seq = self._mutation_seq
+            if not lineas and not dirty:
+                self._mark_durable(seq)
+                return
+            
+            if not dirty and self.compact_every:
+                dirty = self.journal_entries + len(lineas) >= self.compact_every
+            try:
+                if dirty:
+                    # El snapshot ya incluye las asistencias de las líneas pendientes
+                    self._write_snapshot()
+                else:
+                    self._write_journal_lines(lineas, sync=True)
+            except Exception as e:
+                print(f"Error al escribir base de datos en segundo plano: {e}")
+                with self._flush_cond:
+                    # Reintentar con un snapshot completo en la siguiente vuelta
+                    self._dirty = True
+                    self._pending_count += 1
+                return
+            self._mark_durable(seq)
+    
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo escritor"""
+        if self._flusher is not None:
+            with self._flush_cond:
+                self._closed = True
+                self._flush_cond.notify_all()
+            self._flusher.join()
+            self._flusher = None
+        with self._io_lock:
+            if self._journal_fp is not None:
+                self._journal_fp.close()
+                self._journal_fp = None
+    
+    def add_asistencia(self, user_id: str, ts: Optional[float] = None, tipo: Optional[str] = None,
+                       durable: bool = False) -> Dict:
+        """
+        Registra una asistencia sin reescribir toda la base de datos
+        
+        La asistencia se agrega en memoria y como una línea en la bitácora;
+        el snapshot completo solo se reescribe al compactar. Si la política de
+        deduplicación la considera repetida, no se escribe nada y se devuelve
+        la asistencia que ya estaba registrada.
+        
+        Args:
+            user_id: ID del alumno
+            ts: Instante de la asistencia en segundos epoch (por defecto, ahora)
+            tipo: Tipo de asistencia (None para verificación con huella, 'manual', ...)
+            durable: Esperar a que la asistencia esté escrita en disco
+            
+        Returns:
+            El registro de asistencia con el formato de la API
+        """
+        if ts is None:
+            ts = time.time()
+        if user_id not in self.fingerprints:
+            raise KeyError(user_id)
+        return self.add_asistencias([(user_id, ts, tipo, None)], durable)[0][0]
+    
+    def add_asistencias(self, registros: List[Tuple[str, float, Optional[str], Optional[str]]],
+                        durable: bool = False) -> List[Tuple[Dict, bool]]:
+        """
+        Registra varias asistencias con una sola escritura a disco
+        
+        Un registro se omite si su clave de idempotencia ya se aplicó, si el
+        alumno ya tiene una asistencia en exactamente ese instante (así reenviar
+        el mismo lote no duplica asistencias) o si la política de deduplicación
+        lo considera repetido; en esos casos se devuelve la asistencia previa.
+        
+        Args:
+            registros: Lista de (user_id, ts, tipo, clave de idempotencia o None)
+            durable: Esperar a que el lote esté escrito en disco
+            
+        Returns:
+            Por cada registro, (asistencia con el formato de la API, True si es nueva);
+            (None, False) si el alumno ya no existe
+        """
+        with self._lock.write():
+            resultados, nuevos = self._filtrar_lote(registros)
+            for user_id, ts, tipo, clave in nuevos:
+                self._append_asistencia(user_id, self.fingerprints[user_id], ts, tipo)
+                if clave is not None:
+                    self._recordar_clave(clave, user_id, ts)
+        
+        entradas = []
+        for user_id, ts, tipo, clave in nuevos:
+            entrada = {'u': user_id, 't': ts}
+            if tipo is not None:
+                entrada['k'] = tipo
+            if clave is not None:
+                entrada['i'] = clave
+            entradas.append(entrada)
+        self._schedule_journal_lote(entradas, durable)
+        return resultados
+    
+    def _filtrar_lote(self, registros: List[Tuple[str, float, Optional[str], Optional[str]]]):
+        """
+        Separa los registros de un lote que ya estaban aplicados (con el candado de escritura)
+        
+        Returns:
+            (resultados por registro, lista de registros nuevos a aplicar)
+        """
+        resultados = []
+        nuevos = []
+        en_lote = set()  # (user_id, ts) ya aplicados en este mismo lote
+        claves_lote = {}  # clave -> (user_id, ts) dentro de este mismo lote
+        pendientes = {}  # user_id -> instantes aceptados en este lote
+        for user_id, ts, tipo, clave in registros:
+            alumno_data = self.fingerprints.get(user_id)
+            if alumno_data is None:
+                # Se eliminó después de resolver su credencial
+                resultados.append((None, False))
+                continue
+            name = alumno_data.get('name', '')
+            previa = None
+            if clave is not None:
+                previa = self._claves.get(clave) or claves_lote.get(clave)
+            if previa is not None:
+                uid, ts_previo = previa
+                nombre_previo = self.fingerprints.get(uid, {}).get('name', '')
+                resultados.append((asistencia_dict(uid, nombre_previo, ts_previo, tipo), False))
+                continue
+            log = alumno_data.get('asistencias')
+            if (user_id, ts) in en_lote or (log is not None and log.contiene(ts)):
+                resultados.append((asistencia_dict(user_id, name, ts, tipo), False))
+                continue
+            previo = self._dedupe.repetida(user_id, ts, log, pendientes.get(user_id, ()))
+            if previo is not None:
+                tipo_previo = log.tipo_en(previo) if log is not None and log.contiene(previo) else tipo
+                resultados.append((asistencia_dict(user_id, name, previo, tipo_previo), False))
+                continue
+            en_lote.add((user_id, ts))
+            pendientes.setdefault(user_id, []).append(ts)
+            if clave is not None:
+                claves_lote[clave] = (user_id, ts)
+            nuevos.append((user_id, ts, tipo, clave))
+            resultados.append((asistencia_dict(user_id, name, ts, tipo), True))
+        return resultados, nuevos
+    
+    def _recordar_clave(self, clave: str, user_id: str, ts: float):
+        """Guarda una clave de idempotencia aplicada, olvidando las más antiguas"""
+        self._claves[clave] = (user_id, ts)
+        self._claves.move_to_end(clave)
+        while len(self._claves) > self.MAX_CLAVES_IDEMPOTENCIA:
+            self._claves.popitem(last=False)
+    
+    def _append_asistencia(self, user_id: str, alumno_data: Dict, ts: float, tipo: Optional[str]):
+        """Agrega la asistencia al historial del alumno y a la matriz (con el candado de escritura)"""
+        log = alumno_data.get('asistencias')
+        if log is None:
+            log = alumno_data['asistencias'] = AttendanceLog()
+        log.append(ts, tipo)
+        self._dedupe.registrar(user_id, ts)
+        self._matrix.add(user_id, ts)
+        self._stats.agregar_asistencia(alumno_data.get('grupo_id'))
+        self._tocar(alumno_data.get('grupo_id'))
+    
+    def get_asistencias(self, user_id: str) -> Optional[List[Dict]]:
+        """
+        Obtiene el historial de asistencias de un alumno con el formato de la API
+        
+        Returns:
+            Lista de asistencias, o None si el alumno no existe
+        """
+        with self._lock.read():
+            alumno_data = self.fingerprints.get(user_id)
+            if alumno_data is None:
+                return None
+            log = alumno_data.get('asistencias')
+            if not log:
+                return []
+            return log.to_dicts(user_id, alumno_data.get('name', ''))
+    
+    def iter_asistencias(self, user_ids: Optional[List[str]] = None, desde: Optional[float] = None,
+                         hasta: Optional[float] = None, despues_de: Optional[float] = None,
+                         lote: int = 100) -> Iterator[Tuple[str, str, Optional[str], float, Optional[str]]]:
+        """
+        Recorre las asistencias de varios alumnos sin bloquear las escrituras todo el tiempo
+        
+        El candado de lectura se toma por lotes de `lote` alumnos, así que la
+        memoria usada no depende del tamaño total del historial.
+        
+        Args:
+            user_ids: Alumnos a recorrer (por defecto, todos, ordenados por ID)
+            desde, hasta, despues_de: Rango de instantes (ver AttendanceLog.indices)
+            lote: Alumnos copiados en cada toma del candado
+            
+        Returns:
+            Iterador de (user_id, name, grupo_id, ts, tipo) en orden de alumno y cronológico
+        """
+        if user_ids is None:
+            with self._lock.read():
+                user_ids = sorted(self.fingerprints)
+        for inicio in range(0, len(user_ids), lote):
+            filas = []
+            with self._lock.read():
+                for user_id in user_ids[inicio:inicio + lote]:
+                    alumno_data = self.fingerprints.get(user_id)
+                    log = alumno_data.get('asistencias') if alumno_data else None
+                    if not log:
+                        continue
+                    name = alumno_data.get('name', '')
+                    grupo_id = alumno_data.get('grupo_id')
+                    filas.extend(
+                        (user_id, name, grupo_id, ts, tipo)
+                        for ts, tipo in log.rango(desde, hasta, despues_de)
+                    )
+            for fila in filas:
+                yield fila
+    
+    def get_asistencias_rango(self, user_id: str, desde: Optional[float] = None,
+                              hasta: Optional[float] = None, despues_de: Optional[float] = None,
+                              cursor: Optional[tuple] = None,
+                              limite: Optional[int] = None) -> Optional[Dict]:
+        """
+        Página del historial de un alumno dentro de un rango de instantes
+        
+        El rango se localiza por búsqueda binaria sobre el historial ordenado.
+        
+        Args:
+            user_id: ID del alumno
+            desde: Instante mínimo (incluido)
+            hasta: Instante máximo (excluido)
+            despues_de: Solo asistencias posteriores a este instante
+            cursor: `siguiente` de la página anterior
+            limite: Máximo de asistencias en la página (None = todas)
+            
+        Returns:
+            {'asistencias', 'total' (en el rango), 'siguiente' (cursor o None)},
+            o None si el alumno no existe
+        """
+        with self._lock.read():
+            alumno_data = self.fingerprints.get(user_id)
+            if alumno_data is None:
+                return None
+            log = alumno_data.get('asistencias') or AttendanceLog()
+            i, j = log.indices(desde, hasta, despues_de)
+            total = j - i
+            if cursor is not None:
+                i = max(i, log.posicion(cursor))
+            fin = j if limite is None else min(j, i + limite)
+            return {
+                'asistencias': log.to_dicts(user_id, alumno_data.get('name', ''), i, fin),
+                'total': total,
+                'siguiente': log.cursor(fin) if fin < j and fin > i else None
+            }
+    
+    def get_roster(self, grupo_id: str, despues_de: Optional[tuple] = None,
+                   limite: Optional[int] = None) -> Tuple[List[str], Optional[tuple]]:
+        """
+        IDs de los alumnos de un grupo ordenados por nombre, por páginas
+        
+        Args:
+            grupo_id: ID del grupo
+            despues_de: `siguiente` de la página anterior
+            limite: Máximo de alumnos en la página (None = todos)
+            
+        Returns:
+            (IDs de la página, cursor de la siguiente página o None)
+        """
+        with self._lock.read():
+            lista = self._roster.get(grupo_id, [])
+            i = 0 if despues_de is None else bisect.bisect_right(lista, tuple(despues_de))
+            j = len(lista) if limite is None else min(len(lista), i + limite)
+            pagina = lista[i:j]
+        siguiente = pagina[-1] if pagina and j < len(lista) else None
+        return [user_id for _, user_id in pagina], siguiente
+    
+    def get_fechas_asistencia(self, user_id: str) -> set:
+        """Conjunto de fechas en las que el alumno registró asistencia"""
+        with self._lock.read():
+            return self._matrix.fechas_de(user_id)
+    
+    def get_bits_asistencia(self, user_id: str) -> int:
+        """Bits de las columnas (fechas) de la matriz en las que asistió el alumno"""
+        return self._matrix.bits_alumno(user_id)
+    
+    def columnas_asistencia(self, bits: int) -> List[tuple]:
+        """Lista ordenada de (fecha, columna) para los bits de `get_bits_asistencia`"""
+        with self._lock.read():
+            return self._matrix.columnas(bits)
+    
+    def get_presentes(self, fecha: str, grupo_id: Optional[str] = None) -> List[str]:
+        """Alumnos (del grupo, o todos) que asistieron en una fecha"""
+        with self._lock.read():
+            user_ids = self._group_index.get(grupo_id, ()) if grupo_id else None
+            return self._matrix.presentes(fecha, user_ids)
+    
+    def get_ausentes(self, fecha: str, grupo_id: Optional[str] = None) -> List[str]:
+        """Alumnos (del grupo, o todos) que no asistieron en una fecha"""
+        with self._lock.read():
+            user_ids = self._group_index.get(grupo_id, ()) if grupo_id else self.fingerprints.keys()
+            return self._matrix.ausentes(fecha, user_ids)
+    
+    def add_student(self, user_id: str, name: str, grupo_id: str, durable: bool = False):
+        """
+        Registra un alumno sin credenciales (o actualiza su nombre y grupo)
+        
+        Args:
+            user_id: ID único del alumno
+            name: Nombre del alumno
+            grupo_id: ID del grupo al que pertenece
+            durable: Esperar a que el cambio esté escrito en disco
+        """
+        with self._lock.write():
+            self._registrar_alumno(user_id, name, grupo_id)
+        
+        self._schedule_save(durable)
+    
+    def add_group_student(self, grupo_id: str, name: str, durable: bool = False) -> str:
+        """
+        Registra un alumno nuevo en un grupo con el siguiente ID libre (<grupo_id>-NNN)
+        
+        El ID se elige y el alumno se agrega en el mismo candado de escritura;
+        la escritura a disco se hace después de soltarlo.
+        
+        Returns:
+            ID asignado al alumno
+        """
+        with self._lock.write():
+            user_id = self._siguiente_id(grupo_id)
+            self._registrar_alumno(user_id, name, grupo_id)
+        
+        self._schedule_save(durable)
+        return user_id
+    
+    def _siguiente_id(self, grupo_id: str) -> str:
+        """Primer ID <grupo_id>-NNN sin usar a partir del número de alumnos del grupo (con el candado)"""
+        numero = len(self._group_index.get(grupo_id, ())) + 1
+        while f"{grupo_id}-{numero:03d}" in self.fingerprints:
+            numero += 1
+        return f"{grupo_id}-{numero:03d}"
+    
+    def _registrar_alumno(self, user_id: str, name: str, grupo_id: str,
+                          registered_at: Optional[str] = None):
+        """Agrega o actualiza un alumno en memoria y en los índices (con el candado de escritura)"""
+        if user_id not in self.fingerprints:
+            self.fingerprints[user_id] = {
+                'name': name,
+                'registered_at': registered_at or datetime.now().isoformat(),
+                'credentials': [],
+                'grupo_id': grupo_id
+            }
+            self._index_group(user_id, None, grupo_id)
+        else:
+            self._stats.quitar(self.fingerprints[user_id])
+            self._roster_quitar(user_id, self.fingerprints[user_id])
+            self._tocar(self.fingerprints[user_id].get('grupo_id'))
+            self._index_group(user_id, self.fingerprints[user_id].get('grupo_id'), grupo_id)
+            self.fingerprints[user_id]['name'] = name
+            self.fingerprints[user_id]['grupo_id'] = grupo_id
+        self._stats.agregar(self.fingerprints[user_id])
+        self._roster_agregar(user_id, self.fingerprints[user_id])
+        self._tocar(grupo_id)
+    
+    def add_credential(self, user_id: str, credential_id: str, public_key: str, name: str = "",
+                       durable: bool = False):
         """
         Añade una credencial WebAuthn a la base de datos
         
@@ -57,44 +903,53 @@ class WebAuthnDatabase:
             credential_id: ID de la credencial WebAuthn (base64)
             public_key: Clave pública de la credencial (base64)
             name: Nombre del usuario
+            durable: Esperar a que el cambio esté escrito en disco
         """
-        if user_id not in self.fingerprints:
-            self.fingerprints[user_id] = {
-                'name': name,
-                'registered_at': datetime.now().isoformat(),
-                'credentials': []
+        with self._lock.write():
+            if user_id not in self.fingerprints:
+                self.fingerprints[user_id] = {
+                    'name': name,
+                    'registered_at': datetime.now().isoformat(),
+                    'credentials': []
+                }
+                self._stats.agregar(self.fingerprints[user_id])
+            
+            # Agregar nueva credencial
+            credential_data = {
+                'credential_id': credential_id,
+                'public_key': public_key,
+                'registered_at': datetime.now().isoformat()
             }
-        
-        # Agregar nueva credencial
-        credential_data = {
-            'credential_id': credential_id,
-            'public_key': public_key,
-            'registered_at': datetime.now().isoformat()
-        }
-        
-        # Verificar que no exista ya esta credencial
-        if 'credentials' not in self.fingerprints[user_id]:
-            self.fingerprints[user_id]['credentials'] = []
-        
-        # Eliminar credenciales duplicadas
-        self.fingerprints[user_id]['credentials'] = [
-            c for c in self.fingerprints[user_id]['credentials']
-            if c['credential_id'] != credential_id
-        ]
-        
-        self.fingerprints[user_id]['credentials'].append(credential_data)
-        self.save_database()
+            
+            # Un credential_id es único: quitarlo de quien lo tuviera antes (y los duplicados propios)
+            anterior = self._credential_index.get(credential_id)
+            for uid in {anterior, user_id}:
+                if uid in self.fingerprints:
+                    self._stats.quitar(self.fingerprints[uid])
+                    self.fingerprints[uid]['credentials'] = [
+                        c for c in self.fingerprints[uid].get('credentials', [])
+                        if c['credential_id'] != credential_id
+                    ]
+            
+            self.fingerprints[user_id]['credentials'].append(credential_data)
+            for uid in {anterior, user_id}:
+                if uid in self.fingerprints:
+                    self._stats.agregar(self.fingerprints[uid])
+                    self._tocar(self.fingerprints[uid].get('grupo_id'))
+            self._credential_index[credential_id] = user_id
+        self._schedule_save(durable)
         print(f"✓ Credencial WebAuthn registrada para usuario: {user_id} ({name})")
     
     def get_user_credentials(self, user_id: str) -> List[Dict]:
         """Obtiene todas las credenciales de un usuario"""
-        if user_id not in self.fingerprints:
-            return []
-        return self.fingerprints[user_id].get('credentials', [])
+        with self._lock.read():
+            if user_id not in self.fingerprints:
+                return []
+            return list(self.fingerprints[user_id].get('credentials', []))
     
     def find_user_by_credential_id(self, credential_id: str) -> Optional[str]:
         """
-        Encuentra el usuario que tiene una credencial específica
+        Encuentra el usuario que tiene una credencial específica (O(1) por índice)
         
         Args:
             credential_id: ID de la credencial a buscar
@@ -102,12 +957,68 @@ class WebAuthnDatabase:
         Returns:
             user_id si se encuentra, None en caso contrario
         """
-        for user_id, user_data in self.fingerprints.items():
-            credentials = user_data.get('credentials', [])
-            for cred in credentials:
-                if cred.get('credential_id') == credential_id:
-                    return user_id
-        return None
+        return self._credential_index.get(credential_id)
+    
+    def get_group_user_ids(self, grupo_id: str) -> List[str]:
+        """Obtiene los IDs de los alumnos que pertenecen a un grupo (por índice)"""
+        with self._lock.read():
+            return list(self._group_index.get(grupo_id, ()))
+    
+    def get_group_credentials(self, grupo_id: str) -> Dict[str, str]:
+        """credential_id -> user_id de todas las credenciales de los alumnos de un grupo"""
+        with self._lock.read():
+            return {
+                cred['credential_id']: user_id
+                for user_id in self._group_index.get(grupo_id, ())
+                for cred in self.fingerprints[user_id].get('credentials', [])
+            }
+    
+    def count_group_students(self, grupo_id: str) -> int:
+        """Cuenta los alumnos de un grupo sin recorrer la base de datos"""
+        return len(self._group_index.get(grupo_id, ()))
+    
+    def group_counts(self) -> Dict[str, int]:
+        """Devuelve el número de alumnos de cada grupo"""
+        with self._lock.read():
+            return {grupo_id: len(miembros) for grupo_id, miembros in self._group_index.items()}
+    
+    def count_asistencias_por_fecha(self) -> Dict[str, int]:
+        """Cuenta las asistencias registradas en cada fecha (desde la matriz)"""
+        with self._lock.read():
+            return self._matrix.conteo_por_fecha()
+    
+    def get_estadisticas(self) -> Dict:
+        """
+        Totales globales, por grupo y por fecha, mantenidos de forma incremental
+        
+        Returns:
+            Diccionario con total_alumnos, alumnos_con_huella, total_asistencias,
+            grupos ({grupo_id: totales}) y asistencias_por_fecha
+        """
+        with self._lock.read():
+            estadisticas = self._stats.resumen()
+            estadisticas['asistencias_por_fecha'] = self._matrix.conteo_por_fecha()
+        return estadisticas
+    
+    def verificar_estadisticas(self) -> Dict:
+        """
+        Recalcula las estadísticas desde cero y las compara con las incrementales
+        
+        Returns:
+            {campo: (recalculado, incremental)} por cada diferencia; vacío si coinciden
+        """
+        with self._lock.read():
+            esperado = StatsIndex.desde(self.fingerprints).resumen()
+            por_fecha = {}
+            for user_data in self.fingerprints.values():
+                for ts in (user_data.get('asistencias') or AttendanceLog()).ts:
+                    fecha = fecha_de(ts)
+                    por_fecha[fecha] = por_fecha.get(fecha, 0) + 1
+            esperado['asistencias_por_fecha'] = por_fecha
+            resultado = diferencias(esperado, self.get_estadisticas())
+        if resultado:
+            print(f"⚠ Estadísticas incrementales desfasadas: {resultado}")
+        return resultado
     
     def has_credentials(self, user_id: str) -> bool:
         """Verifica si un usuario tiene credenciales registradas"""
@@ -116,19 +1027,44 @@ class WebAuthnDatabase:
         credentials = self.fingerprints[user_id].get('credentials', [])
         return len(credentials) > 0
     
-    def delete_user(self, user_id: str) -> bool:
+    def _unindex_user(self, user_id: str):
+        """Quita de los índices las entradas de un usuario que se va a eliminar"""
+        for cred in self.fingerprints[user_id].get('credentials', []):
+            credential_id = cred.get('credential_id')
+            if self._credential_index.get(credential_id) == user_id:
+                del self._credential_index[credential_id]
+                # Datos guardados antes de quitar las reasignaciones pueden repetir la
+                # credencial en otro alumno: igual que el recorrido lineal, pasa al siguiente
+                for uid, user_data in self.fingerprints.items():
+                    if uid != user_id and any(c.get('credential_id') == credential_id
+                                              for c in user_data.get('credentials', [])):
+                        self._credential_index[credential_id] = uid
+                        break
+        self._index_group(user_id, self.fingerprints[user_id].get('grupo_id'), None)
+        self._matrix.remove_user(user_id, self.fingerprints[user_id].get('asistencias'))
+        self._stats.quitar(self.fingerprints[user_id])
+        self._roster_quitar(user_id, self.fingerprints[user_id])
+        self._dedupe.quitar(user_id)
+        self._tocar(self.fingerprints[user_id].get('grupo_id'))
+    
+    def delete_user(self, user_id: str, durable: bool = False) -> bool:
         """
         Elimina un usuario de la base de datos
         
         Args:
             user_id: ID del usuario a eliminar
+            durable: Esperar a que el cambio esté escrito en disco
             
         Returns:
             True si se eliminó, False si no existe
         """
-        if user_id in self.fingerprints:
-            del self.fingerprints[user_id]
-            self.save_database()
+        with self._lock.write():
+            existe = user_id in self.fingerprints
+            if existe:
+                self._unindex_user(user_id)
+                del self.fingerprints[user_id]
+        if existe:
+            self._schedule_save(durable)
             print(f"✓ Usuario {user_id} eliminado")
             return True
         print(f"✗ Usuario {user_id} no encontrado")
@@ -138,31 +1074,55 @@ class WebAuthnDatabase:
 class WebAuthnHandler:
     """Manejador para operaciones WebAuthn"""
     
-    def __init__(self, db_file: str = "alumnos.json"):
-        self.db = WebAuthnDatabase(db_file)
+    def __init__(self, db_file: str = "alumnos.json", db: Optional[WebAuthnDatabase] = None,
+                 challenges=None):
+        """
+        Args:
+            db_file: Archivo de la base de datos (solo si no se pasa `db`)
+            db: Base de datos ya cargada para compartirla en lugar de abrir otra copia
+            challenges: Almacén de challenges emitidos (por defecto, uno en memoria)
+        """
+        self.db = db if db is not None else WebAuthnDatabase(db_file)
+        self.challenges = challenges if challenges is not None else ChallengeStore()
     
-    def create_challenge(self) -> str:
+    def create_challenge(self, contexto: Optional[str] = None) -> str:
         """
-        Crea un challenge aleatorio para la autenticación WebAuthn
+        Crea un challenge aleatorio para la autenticación WebAuthn y lo registra
         
+        Args:
+            contexto: Operación para la que se emite; verify_challenge exige el mismo
+            
         Returns:
             Challenge codificado en base64
         """
-        challenge = secrets.token_bytes(32)
-        return base64.urlsafe_b64encode(challenge).decode('utf-8').rstrip('=')
+        return self.challenges.emitir(contexto)
     
-    def verify_challenge(self, challenge: str) -> bool:
+    def verify_challenge(self, challenge: str, contexto: Optional[str] = None) -> bool:
         """
-        Verifica que un challenge sea válido (básico, en producción usar cache)
+        Verifica y consume un challenge emitido por este servidor
         
         Args:
             challenge: Challenge a verificar
+            contexto: Contexto con el que debió emitirse (None = cualquiera)
             
         Returns:
-            True si el formato es válido
+            True si estaba pendiente y no había caducado; después ya no es válido
         """
-        try:
-            decoded = base64.urlsafe_b64decode(challenge + '==')
-            return len(decoded) >= 16
-        except:
+        if not challenge:
             return False
+        return self.challenges.consumir(challenge, contexto)
+    
+    @staticmethod
+    def challenge_de_client_data(client_data_json: str) -> Optional[str]:
+        """
+        Extrae el challenge del clientDataJSON (base64url) que envía el navegador
+        
+        Returns:
+            El challenge, o None si el clientDataJSON no es válido
+        """
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(client_data_json + '=' * (-len(client_data_json) % 4)))
+            challenge = datos.get('challenge')
+        except (ValueError, TypeError, AttributeError):
+            return None
+        return challenge if isinstance(challenge, str) else None
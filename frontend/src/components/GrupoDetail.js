@@ -66,7 +66,8 @@ function GrupoDetail({ grupo, onBack, onRefresh }) {
       // Enviar credencial al servidor
       await ApiService.registrarHuella(alumnoId, {
         credential_id: credentialData.credential_id,
-        public_key: credentialData.public_key
+        public_key: credentialData.public_key,
+        client_data_json: credentialData.client_data_json
       });
       
       alert(`✓ Huella registrada exitosamente para ${alumnoName}`);
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import ApiService from '../services/api';
 import WebAuthnService from '../services/webauthn';
 
@@ -8,12 +8,48 @@ function PasarLista({ grupo, alumnos, onFinalizar, onCambiarGrupo }) {
   const [capturandoHuella, setCapturandoHuella] = useState(false);
   const [error, setError] = useState(null);
   const [mensaje, setMensaje] = useState(null);
+  // Sesión de pase de lista: credenciales del grupo y challenges calculados una sola vez
+  const sesionRef = useRef(null);
+  const challengesRef = useRef([]);
 
   const alumnoActual = alumnos[indiceActual];
   const totalAlumnos = alumnos.length;
   const alumnosConAsistencia = asistenciasRegistradas.size;
   const progreso = ((indiceActual + 1) / totalAlumnos) * 100;
 
+  useEffect(() => {
+    let cancelada = false;
+    ApiService.abrirSesion(grupo.grupo_id)
+      .then(sesion => {
+        if (cancelada) {
+          ApiService.cerrarSesion(sesion.sesion_id).catch(() => {});
+          return;
+        }
+        sesionRef.current = sesion;
+        challengesRef.current = [...sesion.challenges];
+      })
+      .catch(err => {
+        // Sin sesión se usa un challenge por verificación
+        console.error('No se pudo abrir la sesión de pase de lista:', err);
+      });
+
+    return () => {
+      cancelada = true;
+      if (sesionRef.current) {
+        ApiService.cerrarSesion(sesionRef.current.sesion_id).catch(() => {});
+        sesionRef.current = null;
+      }
+    };
+  }, [grupo.grupo_id]);
+
+  const siguienteChallenge = async () => {
+    if (challengesRef.current.length === 0) {
+      const data = await ApiService.obtenerChallengesSesion(sesionRef.current.sesion_id);
+      challengesRef.current = [...data.challenges];
+    }
+    return challengesRef.current.shift();
+  };
+
   useEffect(() => {
     // Verificar si el alumno actual ya tiene asistencia registrada
     if (alumnoActual && asistenciasRegistradas.has(alumnoActual.user_id)) {
@@ -49,19 +85,31 @@ function PasarLista({ grupo, alumnos, onFinalizar, onCambiarGrupo }) {
     setMensaje(null);
 
     try {
-      // Obtener challenge del servidor
-      const challengeData = await ApiService.obtenerChallengeVerificacion(grupo.grupo_id);
-      
-      // Verificar credencial usando WebAuthn
-      const credentialData = await WebAuthnService.verifyCredential(
-        challengeData.challenge,
-        challengeData.allowed_credentials
-      );
-      
-      // Enviar verificación al servidor
-      const response = await ApiService.verificarAsistencia(grupo.grupo_id, {
-        credential_id: credentialData.credential_id
-      });
+      const sesion = sesionRef.current;
+      let response;
+      if (sesion) {
+        // Challenge y credenciales permitidas ya entregados por la sesión
+        const credentialData = await WebAuthnService.verifyCredential(
+          await siguienteChallenge(),
+          sesion.allowed_credentials
+        );
+        response = await ApiService.verificarEnSesion(sesion.sesion_id, credentialData);
+      } else {
+        // Obtener challenge del servidor
+        const challengeData = await ApiService.obtenerChallengeVerificacion(grupo.grupo_id);
+        
+        // Verificar credencial usando WebAuthn
+        const credentialData = await WebAuthnService.verifyCredential(
+          challengeData.challenge,
+          challengeData.allowed_credentials
+        );
+        
+        // Enviar verificación al servidor
+        response = await ApiService.verificarAsistencia(grupo.grupo_id, {
+          credential_id: credentialData.credential_id,
+          client_data_json: credentialData.client_data_json
+        });
+      }
       
       if (response.encontrado) {
         if (response.alumno.user_id === alumnoActual.user_id) {
@@ -93,7 +141,10 @@ function PasarLista({ grupo, alumnos, onFinalizar, onCambiarGrupo }) {
 
     if (window.confirm(`¿Registrar asistencia manual para ${alumnoActual.name}?`)) {
       try {
-        await ApiService.registrarAsistenciaManual(alumnoActual.user_id);
+        await ApiService.registrarAsistenciaManual(
+          alumnoActual.user_id,
+          sesionRef.current ? sesionRef.current.sesion_id : null
+        );
         
         setAsistenciasRegistradas(prev => new Set([...prev, alumnoActual.user_id]));
         setMensaje({ 
@@ -126,9 +177,18 @@ function PasarLista({ grupo, alumnos, onFinalizar, onCambiarGrupo }) {
     }
   };
 
-  const handleFinalizar = () => {
+  const handleFinalizar = async () => {
     if (window.confirm(`¿Finalizar el registro de asistencia?\n\nAlumnos con asistencia: ${alumnosConAsistencia} de ${totalAlumnos}`)) {
-      onFinalizar();
+      let resumen = null;
+      if (sesionRef.current) {
+        try {
+          resumen = await ApiService.cerrarSesion(sesionRef.current.sesion_id);
+        } catch (err) {
+          console.error('Error al cerrar la sesión de pase de lista:', err);
+        }
+        sesionRef.current = null;
+      }
+      onFinalizar(resumen);
     }
   };
 
@@ -81,7 +81,8 @@ function RegistrarAlumno({ grupoId, onSuccess, onCancel }) {
       // Enviar credencial al servidor
       await ApiService.registrarHuella(alumnoId, {
         credential_id: credentialData.credential_id,
-        public_key: credentialData.public_key
+        public_key: credentialData.public_key,
+        client_data_json: credentialData.client_data_json
       });
       
       alert(`✓ Alumno y huella registrados exitosamente`);
@@ -96,7 +96,8 @@ function RegistroRapido() {
       
       // Enviar verificación al servidor (identifica automáticamente al alumno)
       const response = await ApiService.verificarAsistencia(grupoSeleccionado.grupo_id, {
-        credential_id: credentialData.credential_id
+        credential_id: credentialData.credential_id,
+        client_data_json: credentialData.client_data_json
       });
       
       if (response.encontrado) {
@@ -140,15 +140,13 @@ class ApiService {
     return await response.json();
   }
 
-  async registrarAsistenciaManual(alumnoId) {
+  async registrarAsistenciaManual(alumnoId, sesionId = null) {
     const response = await fetch(`${API_BASE_URL}/alumnos/${alumnoId}/asistencias`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({
-        tipo: 'manual'
-      })
+      body: JSON.stringify(sesionId ? { tipo: 'manual', sesion_id: sesionId } : { tipo: 'manual' })
     });
     if (!response.ok) {
       const error = await response.json();
@@ -194,6 +192,67 @@ class ApiService {
     return await response.json();
   }
 
+  // ==================== SESIONES DE PASE DE LISTA ====================
+
+  async abrirSesion(grupoId) {
+    const response = await fetch(`${API_BASE_URL}/sesiones`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ grupo_id: grupoId })
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Error al abrir la sesión de pase de lista');
+    }
+    return await response.json();
+  }
+
+  async obtenerChallengesSesion(sesionId, cantidad = 10) {
+    const response = await fetch(`${API_BASE_URL}/sesiones/${sesionId}/challenges`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ cantidad })
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Error al obtener challenges');
+    }
+    return await response.json();
+  }
+
+  async verificarEnSesion(sesionId, credentialData) {
+    const response = await fetch(`${API_BASE_URL}/sesiones/${sesionId}/verificar`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        credential_id: credentialData.credential_id,
+        client_data_json: credentialData.client_data_json
+      })
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Error al verificar asistencia');
+    }
+    return await response.json();
+  }
+
+  async cerrarSesion(sesionId) {
+    const response = await fetch(`${API_BASE_URL}/sesiones/${sesionId}`, {
+      method: 'DELETE',
+    });
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Error al cerrar la sesión de pase de lista');
+    }
+    return await response.json();
+  }
+
   // ==================== ESTADÍSTICAS ====================
 
   async getEstadisticas() {